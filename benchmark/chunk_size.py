@@ -0,0 +1,70 @@
+"""Size and speed of chunk storage
+
+Compress a voltage-like signal, pack the archived points into chunks
+of Config.CHUNK_SECONDS and report the bytes per archived point,
+compared with the column data of a row (id INT, DATETIME, DOUBLE)
+which excludes the row and index overhead of InnoDB. No server is
+needed.
+
+Usage: python -m benchmark.chunk_size [num_points]
+"""
+import datetime
+import math
+import random
+import sys
+import time
+
+from connector import chunk
+from connector.compression import Compression
+from connector.data_structure import ChunkBuffer, DataPoint
+from connector.settings import Config
+
+NUM_POINTS = 1_000_000
+DEV_MARGIN = 0.3
+ROW_BYTES = 4 + 5 + 8
+
+TIME_START = datetime.datetime(2022, 6, 1)
+TIME_STEP = datetime.timedelta(seconds=1)
+
+
+def archived_points(num_points: int):
+    random.seed(0)
+    comp = Compression(dev_margin=DEV_MARGIN)
+    for idx in range(num_points):
+        value = round(120 + 2 * math.sin(idx / 600)
+                      + random.gauss(0, 0.2), 1)
+        point = comp.insert_checker(
+            DataPoint(TIME_START + idx * TIME_STEP, value))
+        if point:
+            yield point
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_POINTS
+    points = list(archived_points(num_points))
+    chunk_buffer = ChunkBuffer(Config.CHUNK_SECONDS)
+    chunks_points = chunk_buffer.push_points(points)
+    chunks_points.append(chunk_buffer.pop_points())
+
+    time_begin = time.perf_counter()
+    chunks_data = [chunk.encode(chunk_points)
+                   for chunk_points in chunks_points]
+    seconds_encode = time.perf_counter() - time_begin
+
+    time_begin = time.perf_counter()
+    num_decoded = sum(len(chunk.decode(data)) for data in chunks_data)
+    seconds_decode = time.perf_counter() - time_begin
+    assert num_decoded == len(points)
+
+    num_bytes = sum(len(data) for data in chunks_data)
+    print(f"{num_points} points, {len(points)} archived, "
+          f"{len(chunks_data)} chunks")
+    print(f"row: {ROW_BYTES} bytes/point of column data")
+    print(f"chunk: {num_bytes / len(points):.2f} bytes/point, "
+          f"{ROW_BYTES * len(points) / num_bytes:.1f}x smaller")
+    print(f"encode: {len(points) / seconds_encode / 1e3:.0f} K points/s, "
+          f"decode: {len(points) / seconds_decode / 1e3:.0f} K points/s")
+
+
+if __name__ == '__main__':
+    main()
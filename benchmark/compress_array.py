@@ -0,0 +1,77 @@
+"""Compression.compress_array against insert_checker point by point
+
+Smooth, voltage-like and random-walk signals of 1 Hz points are
+compressed both ways, the archived points are checked to be the same.
+compress_array falls back to insert_checker where the segments are
+short, see Compression.COMPRESS_MIN_SEGMENT, so it should never be much
+slower. No server is needed.
+
+Usage: python -m benchmark.compress_array [num_points]
+"""
+import sys
+import time
+
+import numpy as np
+
+from benchmark.compressors import voltage_points
+from connector.compression import Compression
+from connector.data_structure import DataPoint
+
+NUM_POINTS = 300_000
+NUM_REPEAT = 3
+
+TIME_START = np.datetime64('2022-06-01T00:00:00', 'us')
+
+
+def signals(num_points: int) -> dict:
+    """{name: (values, dev_margin)}"""
+    rng = np.random.default_rng(0)
+    return {
+        'smooth': (10 * np.sin(np.arange(num_points) / 3000), 0.3),
+        'voltage': (np.array([pnt.value for pnt
+                              in voltage_points(num_points)]), 0.15),
+        'random walk': (np.cumsum(rng.normal(0, 0.3, num_points)), 0.3),
+    }
+
+
+def scalar(timestamps: np.ndarray, values: np.ndarray, dev_margin: float):
+    comp = Compression(dev_margin)
+    saved_points = []
+    for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+        save_point = comp.insert_checker(DataPoint(timestamp, value))
+        if save_point:
+            saved_points.append(save_point)
+    return saved_points
+
+
+def vectorized(timestamps: np.ndarray, values: np.ndarray,
+               dev_margin: float):
+    return Compression(dev_margin).compress_array(timestamps, values)
+
+
+def best_seconds(compress, *args) -> tuple:
+    """shortest time of NUM_REPEAT runs, and the archived points"""
+    seconds = []
+    for _ in range(NUM_REPEAT):
+        time_begin = time.perf_counter()
+        saved_points = compress(*args)
+        seconds.append(time.perf_counter() - time_begin)
+    return min(seconds), saved_points
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_POINTS
+    timestamps = TIME_START + np.arange(num_points) * np.timedelta64(1, 's')
+    print(f"{'signal':>12} {'ratio':>8} {'scalar':>8} {'array':>8}")
+    for name, (values, dev_margin) in signals(num_points).items():
+        scalar_seconds, scalar_points = best_seconds(
+            scalar, timestamps, values, dev_margin)
+        array_seconds, array_points = best_seconds(
+            vectorized, timestamps, values, dev_margin)
+        assert array_points == scalar_points, name
+        print(f"{name:>12} {num_points / len(scalar_points):8.1f} "
+              f"{scalar_seconds:7.2f}s {array_seconds:7.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Compression ratio and ingest throughput of every compression engine
+
+The same signal is inserted into every engine of compression.ENGINES,
+with and without a dead-band filter of a quarter of the precision, for
+the precisions of the table in README.md. The max error is measured on
+the line between the archived points, the way a SELECT reconstructs
+them. No server is needed.
+
+By default the signal is voltage-like. The README table was measured on
+the voltage of Electricity_B1E.csv of the AMPds2 dataset, which is read
+if given, with unix time in the first column.
+
+Usage: python -m benchmark.compressors [num_points | csv_file [column]]
+"""
+import csv
+import datetime
+import math
+import random
+import sys
+import time
+
+import numpy as np
+
+from connector.compression import ENGINES, new_compression
+from connector.data_structure import DataPoint
+
+NUM_POINTS = 1_000_000
+PRECISIONS = (0.15, 0.2, 0.25, 0.3, 0.5, 0.75)
+# dead-band of the filtered runs, relative to the precision
+DEADBAND_RATIO = 0.25
+
+TIME_START = datetime.datetime(2022, 6, 1)
+TIME_STEP = datetime.timedelta(seconds=1)
+
+
+def voltage_points(num_points: int):
+    random.seed(0)
+    value = 120.0
+    points = []
+    for idx in range(num_points):
+        value += random.gauss(0, 0.05)
+        points.append(DataPoint(
+            TIME_START + idx * TIME_STEP,
+            round(value + 2 * math.sin(idx / 600) + random.gauss(0, 0.1),
+                  1)))
+    return points
+
+
+def csv_points(path: str, column: str):
+    with open(path, newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        time_column = reader.fieldnames[0]
+        return [DataPoint(datetime.datetime.utcfromtimestamp(
+                    int(row[time_column])), float(row[column]))
+                for row in reader]
+
+
+def max_error(points, archived_points) -> float:
+    """Max distance of points to the line between archived_points"""
+    point_times = np.array([(pnt.timestamp - TIME_START).total_seconds()
+                            for pnt in archived_points])
+    point_values = np.array([pnt.value for pnt in archived_points])
+    times = np.array([(pnt.timestamp - TIME_START).total_seconds()
+                      for pnt in points])
+    values = np.array([pnt.value for pnt in points])
+    return float(np.max(np.abs(
+        np.interp(times, point_times, point_values) - values)))
+
+
+def run(points, engine: str, precision: float, deadband: float) -> tuple:
+    comp = new_compression(engine, precision, deadband)
+    time_begin = time.perf_counter()
+    archived_points = comp.insert_points(points)
+    seconds = time.perf_counter() - time_begin
+    # the points after the last archived one are read up to the snapshot
+    tail_points = [comp.buffer.snapshot_point]
+    if comp.held_point:
+        tail_points.append(comp.held_point)
+    error = max_error(points, archived_points + tail_points)
+    return (len(points) / (len(archived_points) + len(tail_points)),
+            error, len(points) / seconds)
+
+
+def main():
+    if len(sys.argv) > 1 and not sys.argv[1].isdigit():
+        points = csv_points(sys.argv[1],
+                            sys.argv[2] if len(sys.argv) > 2 else 'V')
+    else:
+        points = voltage_points(
+            int(sys.argv[1]) if len(sys.argv) > 1 else NUM_POINTS)
+    print(f"{len(points)} points")
+    print("| precision | compressor    | deadband | ratio  | max error "
+          "| points/s |")
+    print("| --------- | ------------- | -------- | :----- | :-------- "
+          "| :------- |")
+    for precision in PRECISIONS:
+        for engine in ENGINES:
+            for deadband in (0.0, precision * DEADBAND_RATIO):
+                ratio, error, throughput = run(points, engine, precision,
+                                               deadband)
+                print(f"| {precision:<9} | {engine:<13} | {deadband:<8.4g} "
+                      f"| {ratio:<6.2f} | {error:<9.3f} "
+                      f"| {throughput:<8.0f} |")
+
+
+if __name__ == '__main__':
+    main()
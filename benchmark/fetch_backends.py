@@ -0,0 +1,99 @@
+"""Row fetch throughput of the pure Python and the C extension driver
+
+The archived rows are fetched by a cursor of mysql-connector, and the
+reconstructed rows by a cursor of the connector, with use_pure=True
+and use_pure=False.
+
+Usage: python -m benchmark.fetch_backends [num_points]
+The server is given by config.py (sql_host, sql_user, sql_passwd), the
+same as example.ipynb.
+"""
+import datetime
+import random
+import sys
+import time
+
+import mysql.connector
+
+import connector
+import config
+
+NUM_POINTS = 500_000
+BATCH_SIZE = 10000
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def prepare_table(ourcursor, num_points: int) -> datetime.datetime:
+    ourcursor.execute('DROP TABLE IF EXISTS voltage')
+    ourcursor.execute(
+        "CREATE TABLE voltage ("
+        "  id int NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+        "  timestamp DATETIME,"
+        "  value DOUBLE dev_margin=0.3"
+        ");")
+    value = 120.0
+    for idx_start in range(0, num_points, BATCH_SIZE):
+        rows = []
+        for idx in range(idx_start, min(idx_start + BATCH_SIZE, num_points)):
+            value += random.gauss(0, 0.2)
+            rows.append((TIME_START + datetime.timedelta(seconds=idx), value))
+        ourcursor.executemany(
+            "INSERT INTO voltage (timestamp, value) VALUES (%s, %s)", rows)
+    return TIME_START + datetime.timedelta(seconds=num_points - 1)
+
+
+def report(name: str, num_rows: int, seconds: float) -> None:
+    print(f"{name}: {num_rows} rows, {seconds:.2f} s, "
+          f"{num_rows / seconds:,.0f} rows/s")
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_POINTS
+    connect_kwargs = dict(host=config.sql_host, user=config.sql_user,
+                          passwd=config.sql_passwd)
+    ourdb = connector.connect(**connect_kwargs)
+    ourcursor = ourdb.cursor()
+    ourcursor.execute('CREATE DATABASE IF NOT EXISTS benchmark_connector')
+    ourcursor.execute('USE benchmark_connector')
+    time_end = prepare_table(ourcursor, num_points)
+    ourdb.commit()
+    connect_kwargs['database'] = 'benchmark_connector'
+
+    for use_pure in (True, False):
+        name = 'pure' if use_pure else 'C extension'
+        try:
+            db = mysql.connector.connect(use_pure=use_pure, **connect_kwargs)
+            backend_db = connector.connect(use_pure=use_pure,
+                                           **connect_kwargs)
+        except ImportError as error:
+            print(f"{name}: {error}")
+            continue
+
+        cursor = db.cursor()
+        tic = time.perf_counter()
+        cursor.execute("SELECT timestamp, value FROM voltage")
+        num_rows = len(cursor.fetchall())
+        report(f"{name}, archived rows", num_rows,
+               time.perf_counter() - tic)
+        cursor.close()
+        db.close()
+
+        backend_cursor = backend_db.cursor(fetch_chunk_size=10000)
+        tic = time.perf_counter()
+        backend_cursor.execute(
+            "SELECT timestamp, value FROM voltage "
+            "WHERE timestamp BETWEEN %s AND %s", (TIME_START, time_end))
+        num_rows = len(backend_cursor.fetchall())
+        report(f"{name}, reconstructed rows", num_rows,
+               time.perf_counter() - tic)
+        backend_cursor.close()
+        backend_db.close()
+
+    ourcursor.execute('DROP DATABASE benchmark_connector')
+    ourcursor.close()
+    ourdb.close()
+
+
+if __name__ == '__main__':
+    main()
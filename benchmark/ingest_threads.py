@@ -0,0 +1,92 @@
+"""Throughput of multi-threaded ingest
+
+Every thread has its own connection and inserts batches of points into
+its own table, so the tables are compressed in parallel through the
+shared compressor registry.
+
+Usage: python -m benchmark.ingest_threads [max_threads]
+The server is given by config.py (sql_host, sql_user, sql_passwd), the
+same as example.ipynb.
+"""
+import datetime
+import random
+import sys
+import threading
+import time
+
+import connector
+import config
+
+NUM_POINTS = 20000
+BATCH_SIZE = 100
+MAX_THREADS = 8
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def connect():
+    return connector.connect(host=config.sql_host, user=config.sql_user,
+                             passwd=config.sql_passwd,
+                             database='benchmark_connector')
+
+
+def create_tables(num_threads: int):
+    ourdb = connect()
+    ourcursor = ourdb.cursor()
+    for idx in range(num_threads):
+        ourcursor.execute(f'DROP TABLE IF EXISTS voltage_{idx}')
+        ourcursor.execute(
+            f"CREATE TABLE voltage_{idx} ("
+            "  id int NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+            "  timestamp DATETIME,"
+            "  value DOUBLE dev_margin=0.3"
+            ");")
+    ourcursor.close()
+    ourdb.close()
+
+
+def ingest(table_name: str):
+    rng = random.Random(table_name)
+    ourdb = connect()
+    ourcursor = ourdb.cursor()
+    for idx_start in range(0, NUM_POINTS, BATCH_SIZE):
+        rows = [(TIME_START + datetime.timedelta(seconds=idx),
+                 120 + rng.gauss(0, 0.5))
+                for idx in range(idx_start, idx_start + BATCH_SIZE)]
+        ourcursor.executemany(
+            f"INSERT INTO {table_name} (timestamp, value) VALUES (%s, %s)",
+            rows)
+        ourdb.commit()
+    ourcursor.close()
+    ourdb.close()
+
+
+def main():
+    max_threads = int(sys.argv[1]) if len(sys.argv) > 1 else MAX_THREADS
+    setup_db = connector.connect(host=config.sql_host, user=config.sql_user,
+                                 passwd=config.sql_passwd)
+    setup_cursor = setup_db.cursor()
+    setup_cursor.execute('CREATE DATABASE IF NOT EXISTS benchmark_connector')
+
+    num_threads = 1
+    while num_threads <= max_threads:
+        create_tables(num_threads)
+        threads = [threading.Thread(target=ingest, args=(f'voltage_{idx}',))
+                   for idx in range(num_threads)]
+        tic = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - tic
+        print(f"{num_threads} threads: "
+              f"{num_threads * NUM_POINTS / seconds:.0f} points/s")
+        num_threads *= 2
+
+    setup_cursor.execute('DROP DATABASE benchmark_connector')
+    setup_cursor.close()
+    setup_db.close()
+
+
+if __name__ == '__main__':
+    main()
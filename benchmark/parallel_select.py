@@ -0,0 +1,86 @@
+"""Latency of a long range SELECT, sequential and in parallel
+
+The same range is fetched by fetch_numpy after a SELECT, and after
+select_parallel with 2 to 8 partitions.
+
+Usage: python -m benchmark.parallel_select [num_points]
+The server is given by config.py (sql_host, sql_user, sql_passwd), the
+same as example.ipynb.
+"""
+import datetime
+import functools
+import random
+import sys
+import time
+
+import numpy as np
+
+import connector
+import config
+
+NUM_POINTS = 2_000_000
+BATCH_SIZE = 10000
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def prepare_table(ourcursor, num_points: int) -> datetime.datetime:
+    ourcursor.execute('DROP TABLE IF EXISTS voltage')
+    ourcursor.execute(
+        "CREATE TABLE voltage ("
+        "  id int NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+        "  timestamp DATETIME,"
+        "  value DOUBLE dev_margin=0.3"
+        ");")
+    value = 120.0
+    for idx_start in range(0, num_points, BATCH_SIZE):
+        rows = []
+        for idx in range(idx_start, min(idx_start + BATCH_SIZE, num_points)):
+            value += random.gauss(0, 0.2)
+            rows.append((TIME_START + datetime.timedelta(seconds=idx), value))
+        ourcursor.executemany(
+            "INSERT INTO voltage (timestamp, value) VALUES (%s, %s)", rows)
+    return TIME_START + datetime.timedelta(seconds=num_points - 1)
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_POINTS
+    connect = functools.partial(
+        connector.connect, host=config.sql_host, user=config.sql_user,
+        passwd=config.sql_passwd, database='benchmark_connector')
+    setup_db = connector.connect(host=config.sql_host, user=config.sql_user,
+                                 passwd=config.sql_passwd)
+    setup_cursor = setup_db.cursor()
+    setup_cursor.execute('CREATE DATABASE IF NOT EXISTS benchmark_connector')
+    setup_cursor.close()
+    setup_db.close()
+
+    ourdb = connect()
+    ourcursor = ourdb.cursor()
+    time_end = prepare_table(ourcursor, num_points)
+    ourdb.commit()
+
+    tic = time.perf_counter()
+    ourcursor.execute(
+        "SELECT timestamp, value FROM voltage "
+        "WHERE timestamp BETWEEN %s AND %s", (TIME_START, time_end))
+    timestamps, values = ourcursor.fetch_numpy()
+    print(f"sequential: {time.perf_counter() - tic:.2f} s, "
+          f"{len(timestamps)} points")
+
+    for num_partitions in (2, 4, 8):
+        tic = time.perf_counter()
+        ourcursor.select_parallel('voltage', TIME_START, time_end, connect,
+                                  num_partitions=num_partitions)
+        result = ourcursor.fetch_numpy()
+        print(f"{num_partitions} partitions: "
+              f"{time.perf_counter() - tic:.2f} s, "
+              f"same: {np.array_equal(result[1], values)}")
+
+    ourcursor.execute('DROP DATABASE benchmark_connector')
+    ourcursor.close()
+    ourdb.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Parse cost per statement
+
+Time spent by the cursor to preprocess, classify and parse INSERT and
+SELECT statements before any round trip to the server, so no server is
+needed.
+
+Usage: python -m benchmark.parse_cost
+"""
+import datetime
+import timeit
+
+from connector import stmt_parser
+
+NUM_REPEAT = 20000
+NUM_ROWS = 100
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def str_time(seconds: int) -> str:
+    specified_time = TIME_START + datetime.timedelta(seconds=seconds)
+    return specified_time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def parse_insert(operation: str, params=None):
+    stmt = stmt_parser.preprocessing(operation)
+    assert stmt_parser.classify(stmt) == 'insert'
+    template, rows = stmt_parser.parse_insert(stmt, params)
+    return template.table_name, [
+        (stmt_parser.to_datetime(time_stamp), float(val))
+        for time_stamp, val in rows]
+
+
+def parse_select(operation: str, params=None):
+    stmt = stmt_parser.preprocessing(operation)
+    assert stmt_parser.classify(stmt) == 'select'
+    template, times = stmt_parser.parse_select(stmt, params)
+    return template.table_name, [stmt_parser.to_datetime(time_value)
+                                 for time_value in times]
+
+
+def main():
+    operations = {
+        'insert 1 row': (parse_insert, [
+            ("INSERT INTO voltage (timestamp, value) "
+             f"VALUES ('{str_time(i)}', {120 + i % 7 * 0.1:.3f});", None)
+            for i in range(NUM_REPEAT)]),
+        'insert params': (parse_insert, [
+            ("INSERT INTO voltage (timestamp, value) VALUES (%s, %s)",
+             (TIME_START + datetime.timedelta(seconds=i), 120 + i % 7 * 0.1))
+            for i in range(NUM_REPEAT)]),
+        f'insert {NUM_ROWS} rows': (parse_insert, [
+            ("INSERT INTO voltage (timestamp, value) VALUES "
+             + ", ".join(f"('{str_time(i + j)}', 120.5)"
+                         for j in range(NUM_ROWS)) + ";", None)
+            for i in range(NUM_REPEAT // NUM_ROWS)]),
+        'select range': (parse_select, [
+            ("SELECT timestamp, value FROM voltage\n"
+             f"WHERE timestamp >= '{str_time(i)}'\n"
+             f"AND timestamp <= '{str_time(i + 60)}';", None)
+            for i in range(NUM_REPEAT)]),
+        'select params': (parse_select, [
+            ("SELECT timestamp, value FROM voltage "
+             "WHERE timestamp >= %s AND timestamp <= %s",
+             (TIME_START + datetime.timedelta(seconds=i),
+              TIME_START + datetime.timedelta(seconds=i + 60)))
+            for i in range(NUM_REPEAT)]),
+        'select one': (parse_select, [
+            ("SELECT timestamp, value FROM voltage "
+             f"WHERE timestamp = '{str_time(i)}';", None)
+            for i in range(NUM_REPEAT)]),
+    }
+
+    for name, (parse, stmts) in operations.items():
+        seconds = timeit.timeit(
+            lambda: [parse(stmt, params) for stmt, params in stmts],
+            number=1)
+        print(f"{name:>16}: {seconds / len(stmts) * 1e6:8.2f} us/stmt")
+    print("insert templates:", stmt_parser.insert_template.cache_info())
+    print("select templates:", stmt_parser.select_template.cache_info())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Latency of short requests, with and without connector.pool
+
+Every request gets a connection, inserts a point, selects the latest
+minute and closes the connection. Without the pool the connection is
+opened and closed, with the pool it is taken from and returned to it.
+
+Usage: python -m benchmark.pool_latency [num_requests]
+The server is given by config.py (sql_host, sql_user, sql_passwd), the
+same as example.ipynb.
+"""
+import datetime
+import statistics
+import sys
+import time
+
+import connector
+import config
+
+NUM_REQUESTS = 500
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def request(connection, idx: int) -> None:
+    timestamp = TIME_START + datetime.timedelta(seconds=idx)
+    ourcursor = connection.cursor()
+    ourcursor.execute("INSERT INTO voltage (timestamp, value) VALUES (%s, %s)",
+                      (timestamp, 120.0 + idx % 10))
+    ourcursor.execute(
+        "SELECT timestamp, value FROM voltage "
+        "WHERE timestamp BETWEEN %s AND %s",
+        (timestamp - datetime.timedelta(minutes=1), timestamp))
+    ourcursor.fetchall()
+    ourcursor.close()
+    connection.commit()
+    connection.close()
+
+
+def report(name: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    print(f"{name}: mean {statistics.mean(latencies) * 1000:.2f} ms, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+def main():
+    num_requests = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS
+    connect_kwargs = dict(host=config.sql_host, user=config.sql_user,
+                          passwd=config.sql_passwd)
+    ourdb = connector.connect(**connect_kwargs)
+    ourcursor = ourdb.cursor()
+    ourcursor.execute('CREATE DATABASE IF NOT EXISTS benchmark_connector')
+    ourcursor.execute('USE benchmark_connector')
+    ourcursor.execute('DROP TABLE IF EXISTS voltage')
+    ourcursor.execute(
+        "CREATE TABLE voltage ("
+        "  id int NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+        "  timestamp DATETIME,"
+        "  value DOUBLE dev_margin=0.3"
+        ");")
+    ourdb.commit()
+    connect_kwargs['database'] = 'benchmark_connector'
+
+    latencies = []
+    for idx in range(num_requests):
+        tic = time.perf_counter()
+        request(connector.connect(**connect_kwargs), idx)
+        latencies.append(time.perf_counter() - tic)
+    report('without pool', latencies)
+
+    latencies = []
+    with connector.pool(pool_size=1, **connect_kwargs) as ourpool:
+        for idx in range(num_requests, 2 * num_requests):
+            tic = time.perf_counter()
+            request(ourpool.get_connection(), idx)
+            latencies.append(time.perf_counter() - tic)
+        print(ourpool.info())
+    report('with pool', latencies)
+
+    ourcursor.execute('DROP DATABASE benchmark_connector')
+    ourcursor.close()
+    ourdb.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Memory of DataPoint and throughput of reconstruction
+
+Reconstruct NUM_POINTS points from archived points one segment every
+SEGMENT_SECONDS, the way fetchmany does, without a server. The same
+range is also aggregated from the archived points directly.
+
+Usage: python -m benchmark.reconstruct [num_points]
+"""
+import datetime
+import itertools
+import sys
+import time
+import tracemalloc
+
+from connector.compression import Compression
+from connector.data_structure import DataPoint
+
+NUM_POINTS = 10_000_000
+NUM_ALLOCATED = 1_000_000
+SEGMENT_SECONDS = 10
+CHUNK_SIZE = 1000
+
+TIME_START = datetime.datetime(2022, 6, 1)
+TIME_STEP = datetime.timedelta(seconds=1)
+
+
+def archived_points(num_points: int):
+    for idx in range(num_points // SEGMENT_SECONDS + 1):
+        yield DataPoint(
+            TIME_START + idx * SEGMENT_SECONDS * TIME_STEP,
+            120 + (idx % 17) * 0.25)
+
+
+def bytes_per_point() -> float:
+    tracemalloc.start()
+    points = [DataPoint(TIME_START, float(idx))
+              for idx in range(NUM_ALLOCATED)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del points
+    # the timestamp is shared, the value and the list slot are counted
+    return size / NUM_ALLOCATED
+
+
+def reconstruct(num_points: int) -> int:
+    comp = Compression(dev_margin=0.5)
+    comp.time_step = TIME_STEP
+    time_end = TIME_START + (num_points - 1) * TIME_STEP
+    point_generator = comp.select_interpolation(
+        [TIME_START, time_end], archived_points(num_points))
+
+    num_fetched = 0
+    while True:
+        rows = [(pnt.timestamp, pnt.value)
+                for pnt in itertools.islice(point_generator, CHUNK_SIZE)]
+        if not rows:
+            return num_fetched
+        num_fetched += len(rows)
+
+
+def aggregate(num_points: int) -> tuple:
+    comp = Compression(dev_margin=0.5)
+    comp.time_step = TIME_STEP
+    time_end = TIME_START + (num_points - 1) * TIME_STEP
+    return comp.aggregate([TIME_START, time_end], archived_points(num_points),
+                          ('count', 'avg', 'min', 'max', 'integral'))
+
+
+def main():
+    num_points = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_POINTS
+    print(f"DataPoint: {bytes_per_point():.1f} bytes/point")
+
+    time_begin = time.perf_counter()
+    num_fetched = reconstruct(num_points)
+    seconds = time.perf_counter() - time_begin
+    print(f"reconstruct {num_fetched} points: {seconds:.2f} s, "
+          f"{num_fetched / seconds / 1e6:.2f} M points/s")
+
+    time_begin = time.perf_counter()
+    result = aggregate(num_points)
+    seconds = time.perf_counter() - time_begin
+    print(f"aggregate {result[0]} points: {seconds:.2f} s, "
+          f"(count, avg, min, max, integral) = {result}")
+
+
+if __name__ == '__main__':
+    main()
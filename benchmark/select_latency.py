@@ -0,0 +1,124 @@
+"""Latency of small range SELECTs
+
+Compare the single statement fetching the archived points of a range
+and its boundary points, used by the cursor, with the three round
+trips (previous point, next point, range) used before. Both are run on
+the same plain mysql-connector cursor, without reconstruction.
+
+Usage: python -m benchmark.select_latency
+The server is given by config.py (sql_host, sql_user, sql_passwd), the
+same as example.ipynb.
+"""
+import datetime
+import random
+import time
+
+import mysql.connector as mysql_connector
+
+import connector
+import config
+
+NUM_POINTS = 20000
+NUM_SELECT = 500
+RANGE_SECONDS = 60
+
+
+def prepare_table(ourcursor):
+    ourcursor.execute('CREATE DATABASE IF NOT EXISTS benchmark_connector')
+    ourcursor.execute('USE benchmark_connector;')
+    ourcursor.execute('DROP TABLE IF EXISTS voltage')
+    ourcursor.execute(
+        "CREATE TABLE voltage ("
+        "  id int NOT NULL AUTO_INCREMENT PRIMARY KEY,"
+        "  timestamp DATETIME,"
+        "  value DOUBLE dev_margin=0.3"
+        ");")
+
+    time_start = datetime.datetime(2022, 6, 1)
+    rows = [(time_start + datetime.timedelta(seconds=i),
+             120 + random.gauss(0, 0.5))
+            for i in range(NUM_POINTS)]
+    ourcursor.executemany(
+        "INSERT INTO voltage (timestamp, value) VALUES (%s, %s)", rows)
+    return time_start
+
+
+def random_ranges(time_start):
+    ranges = []
+    for _ in range(NUM_SELECT):
+        start = time_start + datetime.timedelta(
+            seconds=random.randint(0, NUM_POINTS - RANGE_SECONDS))
+        end = start + datetime.timedelta(seconds=RANGE_SECONDS)
+        ranges.append((start, end))
+    return ranges
+
+
+def select_three_round_trips(mysql_cursor, time_start, time_end):
+    mysql_cursor.execute(
+        "SELECT timestamp, value FROM voltage "
+        "WHERE timestamp <= %s ORDER BY timestamp DESC LIMIT 1",
+        (time_start, ))
+    mysql_cursor.fetchall()
+    mysql_cursor.execute(
+        "SELECT timestamp, value FROM voltage "
+        "WHERE timestamp >= %s ORDER BY timestamp ASC LIMIT 1",
+        (time_end, ))
+    mysql_cursor.fetchall()
+    mysql_cursor.execute(
+        "SELECT timestamp, value FROM voltage "
+        "WHERE timestamp >= %s AND timestamp <= %s "
+        "ORDER BY timestamp ASC", (time_start, time_end))
+    mysql_cursor.fetchall()
+
+
+def select_one_round_trip(mysql_cursor, stmt_select, params):
+    mysql_cursor.execute(stmt_select, params)
+    mysql_cursor.fetchall()
+
+
+def time_per_select(select, args_list):
+    for args in args_list[:10]:  # warm up the buffer pool
+        select(*args)
+    tic = time.perf_counter()
+    for args in args_list:
+        select(*args)
+    return (time.perf_counter() - tic) / len(args_list)
+
+
+def main():
+    ourdb = connector.connect(host=config.sql_host, user=config.sql_user,
+                              passwd=config.sql_passwd)
+    ourcursor = ourdb.cursor()
+    time_start = prepare_table(ourcursor)
+    ourdb.commit()
+
+    mysql_db = mysql_connector.connect(
+        host=config.sql_host, user=config.sql_user,
+        passwd=config.sql_passwd, database='benchmark_connector')
+    mysql_cursor = mysql_db.cursor()
+
+    ranges = random_ranges(time_start)
+    # the statement and params the cursor runs for every range
+    stmts_select = [
+        ourcursor._stmt_select_with_boundaries('voltage', *time_range)
+        for time_range in ranges]
+
+    latency_three = time_per_select(
+        select_three_round_trips,
+        [(mysql_cursor, *time_range) for time_range in ranges])
+    latency_one = time_per_select(
+        select_one_round_trip,
+        [(mysql_cursor, *stmt_select) for stmt_select in stmts_select])
+
+    print(f"3 round trips: {latency_three * 1e3:.3f} ms")
+    print(f"1 round trip: {latency_one * 1e3:.3f} ms")
+
+    ourcursor.execute('DROP DATABASE benchmark_connector')
+    mysql_cursor.close()
+    mysql_db.close()
+    ourcursor.close()
+    ourdb.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
-from .connection import Connection
+from .connection import CConnection, Connection, connect
+from .ingest import AsyncIngestor
+from .pooling import ConnectionPool, PooledConnection
 
-def connect(*args, **kwargs):
-    return Connection(*args, **kwargs)
-    
\ No newline at end of file
+
+def pool(pool_size: int = None, health_check_interval: float = None,
+         **kwargs):
+    """ConnectionPool of connections made by connect(**kwargs), see
+    pooling.ConnectionPool"""
+    return ConnectionPool(pool_size, health_check_interval, **kwargs)
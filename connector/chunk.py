@@ -0,0 +1,166 @@
+"""Packed binary chunks of archived points
+
+A chunk keeps the archived points of one time bucket in a BLOB:
+    header: number of points, time unit in microseconds, first
+            timestamp (microseconds since epoch), first value (bits)
+    timestamps: delta of delta in time units, see DOD_RANGES
+    values: XOR with the previous value, the same as Gorilla
+            (Pelkonen et al., VLDB 2015)
+The time unit is the gcd of the intervals, e.g. 1 second, so regular
+timestamps take 1 bit each and irregular ones a few bits.
+Break markers, points of value None, are packed as NaN.
+"""
+import datetime
+import functools
+import math
+import struct
+from array import array
+from typing import Iterable, Iterator, List, Optional
+
+from .data_structure import DataPoint
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+HEADER = struct.Struct('<IqqQ')
+# (prefix, bits) of delta of delta from small to large, otherwise
+# '1111' and 64 bits
+DOD_RANGES = (('10', 7), ('110', 9), ('1110', 12))
+
+
+def encode(points: List[DataPoint]) -> bytes:
+    """Pack points in ascending order of timestamp"""
+    timestamps = [(pnt.timestamp - EPOCH) // MICROSECOND for pnt in points]
+    value_bits = array('Q')
+    value_bits.frombytes(array('d', [
+        math.nan if pnt.value is None else pnt.value
+        for pnt in points]).tobytes())
+
+    intervals = [time_next - time_prev for time_prev, time_next
+                 in zip(timestamps, timestamps[1:])]
+    time_unit = functools.reduce(math.gcd, intervals, 0) or 1
+    header = HEADER.pack(len(points), time_unit, timestamps[0],
+                         value_bits[0])
+
+    bit_strings = []
+    interval_prev = 0
+    for interval in intervals:
+        interval //= time_unit
+        bit_strings.append(_encode_dod(interval - interval_prev))
+        interval_prev = interval
+
+    leading_prev, trailing_prev = 65, 65
+    for bits_prev, bits in zip(value_bits, value_bits[1:]):
+        xor = bits ^ bits_prev
+        if not xor:
+            bit_strings.append('0')
+            continue
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+        if leading >= leading_prev and trailing >= trailing_prev:
+            # inside the window of the previous value
+            length = 64 - leading_prev - trailing_prev
+            bit_strings.append(
+                '10' + format(xor >> trailing_prev, f'0{length}b'))
+        else:
+            length = 64 - leading - trailing
+            bit_strings.append(
+                '11' + format(leading, '05b') + format(length - 1, '06b')
+                + format(xor >> trailing, f'0{length}b'))
+            leading_prev, trailing_prev = leading, trailing
+
+    body = ''.join(bit_strings)
+    if not body:
+        return header
+    body += '0' * (-len(body) % 8)
+    return header + int(body, 2).to_bytes(len(body) // 8, 'big')
+
+
+def decode(data: bytes) -> List[DataPoint]:
+    """Unpack the points of a chunk"""
+    num_points, time_unit, time_first, bits_first = HEADER.unpack_from(data)
+    body = data[HEADER.size:]
+    bit_string = format(int.from_bytes(body, 'big'), f'0{len(body) * 8}b')
+
+    pos = 0
+    timestamps = [time_first]
+    interval = 0
+    for _ in range(num_points - 1):
+        dod, pos = _decode_dod(bit_string, pos)
+        interval += dod
+        timestamps.append(timestamps[-1] + interval * time_unit)
+
+    value_bits = array('Q', [bits_first])
+    leading, length = 0, 64
+    for _ in range(num_points - 1):
+        if bit_string[pos] == '0':
+            value_bits.append(value_bits[-1])
+            pos += 1
+            continue
+        if bit_string[pos + 1] == '1':
+            leading = int(bit_string[pos + 2:pos + 7], 2)
+            length = int(bit_string[pos + 7:pos + 13], 2) + 1
+            pos += 13
+        else:
+            pos += 2
+        xor = int(bit_string[pos:pos + length], 2) << (64 - leading - length)
+        value_bits.append(value_bits[-1] ^ xor)
+        pos += length
+
+    values = array('d')
+    values.frombytes(value_bits.tobytes())
+    return [DataPoint(EPOCH + datetime.timedelta(microseconds=time_stamp),
+                      None if math.isnan(value) else value)
+            for time_stamp, value in zip(timestamps, values)]
+
+
+def points_in_range(points: Iterable[DataPoint],
+                    time_start: Optional[datetime.datetime],
+                    time_end: Optional[datetime.datetime]
+                    ) -> Iterator[DataPoint]:
+    """Points in [time_start, time_end] and the closest points outside,
+    the same as the select of archived rows
+
+    points: in ascending order of timestamp
+    None means no limit on that side.
+    """
+    point_before = None
+    for pnt in points:
+        if time_start and pnt.timestamp <= time_start:
+            point_before = pnt
+            continue
+        if point_before:
+            yield point_before
+            if time_end and point_before.timestamp >= time_end:
+                return
+            point_before = None
+        yield pnt
+        if time_end and pnt.timestamp >= time_end:
+            return
+    if point_before:
+        yield point_before
+
+
+def _encode_dod(dod: int) -> str:
+    if dod == 0:
+        return '0'
+    for prefix, num_bits in DOD_RANGES:
+        if -(1 << (num_bits - 1)) <= dod < (1 << (num_bits - 1)):
+            return prefix + format(dod & ((1 << num_bits) - 1),
+                                   f'0{num_bits}b')
+    return '1111' + format(dod & ((1 << 64) - 1), '064b')
+
+
+def _decode_dod(bit_string: str, pos: int) -> tuple:
+    """return: delta of delta, position after it"""
+    num_ones = 0
+    while num_ones < 4 and bit_string[pos + num_ones] == '1':
+        num_ones += 1
+    if num_ones == 0:
+        return 0, pos + 1
+    num_bits = DOD_RANGES[num_ones - 1][1] if num_ones < 4 else 64
+    pos += num_ones + (num_ones < 4)
+    dod = int(bit_string[pos:pos + num_bits], 2)
+    if dod >= 1 << (num_bits - 1):
+        dod -= 1 << num_bits
+    return dod, pos + num_bits
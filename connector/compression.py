@@ -1,19 +1,171 @@
+import bisect
+import collections
 import datetime
-from typing import Optional, Tuple, Generator
+from typing import Callable, Iterable, Optional, Tuple, Generator, List
+
+import numpy as np
 
 from .data_structure import DataPoint, Buffer
 
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+SECOND = datetime.timedelta(seconds=1)
+# relative margin of segment_envelope
+ENVELOPE_MARGIN = 1e-9
+VALUE_OPERATORS = {'>': np.greater, '>=': np.greater_equal,
+                   '<': np.less, '<=': np.less_equal}
+
 
 class Compression:
+    """Swinging door compression, the default engine
+
+    The archived points are inserted points, and every inserted point is
+    within dev_margin of the line between the archived points around it.
+    Other engines subclass it and only change which points are archived,
+    see PLACompression and ENGINES.
+    """
+    # name of the engine in CREATE TABLE ... compressor=<ENGINE>
+    ENGINE = 'swinging_door'
+    # number of points checked at once by compress_array at first
+    COMPRESS_WINDOW = 32
+    # compress_array runs insert_checker instead while the segments of
+    # the last COMPRESS_BLOCK points are shorter than COMPRESS_MIN_SEGMENT
+    # points on average, as every segment costs a few array operations
+    COMPRESS_MIN_SEGMENT = 10
+    COMPRESS_BLOCK = 1024
+    DOWNSAMPLE_MODES = ('linear', 'minmax')
+
     def __init__(self, dev_margin: float,
                  archieved_point: DataPoint = None,
-                 snapshot_point: DataPoint = None) -> None:
+                 snapshot_point: DataPoint = None,
+                 deadband: float = 0.0,
+                 max_gap: Optional[datetime.timedelta] = None) -> None:
         self.dev_margin = dev_margin
         self.buffer = Buffer(archieved_point=archieved_point,
                              snapshot_point=snapshot_point)
+        # time_step of the current run of points, and (start, time_step)
+        # of every run whose time_step differs from the run before
         self.time_step: Optional[datetime.timedelta] = None
+        self.time_steps: List[Tuple[datetime.datetime,
+                                    datetime.timedelta]] = []
         self.slope_min = None
         self.slope_max = None
+        # points within deadband of the last point passed to
+        # insert_checker are held back, see insert_points
+        self.deadband = deadband
+        self.reported_value: Optional[float] = None
+        self.held_point: Optional[DataPoint] = None
+        # a gap longer than max_gap between two inserted points ends the
+        # run with a break marker, see insert_points
+        self.max_gap = max_gap
+
+    def insert_points(self, points: Iterable[DataPoint]) -> List[DataPoint]:
+        """insert_checker of every point after the dead-band filter
+
+        Like exception reporting of PI, a point within deadband of the
+        last point passed to insert_checker is held back. When a point
+        gets out of the band, the last held point is passed before it,
+        so the inserted points are within dev_margin + 2 * deadband of
+        the reconstruction.
+        A point more than max_gap after the last inserted point starts a
+        new run, see _break_run.
+        return: the archived points
+        """
+        saved_points = []
+        for new_point in points:
+            if self._is_gap(new_point):
+                saved_points.extend(self._break_run(new_point))
+            for checked_point in self._deadband_filter(new_point):
+                save_point = self.insert_checker(checked_point)
+                if save_point:
+                    saved_points.append(save_point)
+                self.reported_value = checked_point.value
+        return saved_points
+
+    def _is_gap(self, new_point: DataPoint) -> bool:
+        """Whether new_point is more than max_gap after the last
+        inserted point"""
+        last_point = (self.held_point or self.buffer.snapshot_point
+                      or self.buffer.archieved_point)
+        return bool(self.max_gap and last_point
+                    and new_point.timestamp - last_point.timestamp
+                    > self.max_gap)
+
+    def _break_run(self, new_point: DataPoint) -> List[DataPoint]:
+        """End the run of points before a gap
+
+        The held point and the snapshot point are archived, then a break
+        marker, a point of value None in the middle of the gap. Nothing
+        is reconstructed across the marker, and the buffer is emptied,
+        so new_point starts the next run like the first point.
+        CREATE TABLE keeps max_gap at least the precision of the
+        timestamp column, so the marker stays strictly between the two
+        points when it is rounded to that precision.
+        return: the archived points
+        """
+        saved_points = []
+        held_point, self.held_point = self.held_point, None
+        if held_point:
+            save_point = self.insert_checker(held_point)
+            if save_point:
+                saved_points.append(save_point)
+        last_point = self.buffer.snapshot_point or self.buffer.archieved_point
+        if self.buffer.snapshot_point:
+            saved_points.append(self.buffer.snapshot_point)
+        half_gap = (new_point.timestamp - last_point.timestamp) / 2
+        if half_gap >= SECOND:
+            # whole seconds, like the points of DATETIME columns
+            half_gap = half_gap // SECOND * SECOND
+        saved_points.append(DataPoint(last_point.timestamp + half_gap, None))
+        self.buffer = Buffer()
+        self.slope_min, self.slope_max = None, None
+        return saved_points
+
+    def time_step_at(self, timestamp: datetime.datetime
+                     ) -> Optional[datetime.timedelta]:
+        """time_step of the run of points containing timestamp"""
+        if len(self.time_steps) < 2:
+            return self.time_step
+        idx = bisect.bisect_right(
+            [run_start for run_start, _ in self.time_steps], timestamp)
+        return self.time_steps[max(idx - 1, 0)][1]
+
+    def _segment_time_steps(self, point_times: np.ndarray) -> np.ndarray:
+        """time_step_at of point_times in microseconds since epoch, in
+        microseconds"""
+        if len(self.time_steps) < 2:
+            return np.full(len(point_times), self.time_step // MICROSECOND,
+                           dtype=np.int64)
+        run_starts = np.array(
+            [(run_start - EPOCH) // MICROSECOND
+             for run_start, _ in self.time_steps], dtype=np.int64)
+        steps = np.array([step // MICROSECOND for _, step in self.time_steps],
+                         dtype=np.int64)
+        idx = np.searchsorted(run_starts, point_times, side='right') - 1
+        return steps[np.maximum(idx, 0)]
+
+    def _start_time_step(self, time_step: datetime.timedelta,
+                         run_start: datetime.datetime) -> None:
+        """Set time_step of the run starting at run_start"""
+        if self.time_step and not self.time_steps:
+            # set without the runs, e.g. restored from an older state
+            self.time_steps.append((EPOCH, self.time_step))
+        if not self.time_steps or self.time_steps[-1][1] != time_step:
+            self.time_steps.append((run_start, time_step))
+        self.time_step = time_step
+
+    def _deadband_filter(self, new_point: DataPoint) -> List[DataPoint]:
+        """Points passed to insert_checker for new_point
+
+        The first two points are always passed, they give time_step.
+        """
+        if not self.deadband or not self.buffer.snapshot_point:
+            return [new_point]
+        if abs(new_point.value - self.reported_value) <= self.deadband:
+            self.held_point = new_point
+            return []
+        held_point, self.held_point = self.held_point, None
+        return [held_point, new_point] if held_point else [new_point]
 
     def insert_checker(self, new_point: DataPoint) -> Optional[DataPoint]:
         """check slope(new_point, archived point) is safe or not"""
@@ -22,8 +174,9 @@ class Compression:
             return new_point
 
         if not self.buffer.snapshot_point:
-            self.time_step = (new_point.timestamp -
-                              self.buffer.archieved_point.timestamp)
+            self._start_time_step(
+                new_point.timestamp - self.buffer.archieved_point.timestamp,
+                self.buffer.archieved_point.timestamp)
             self.buffer.push_new_point(new_point)
             self._update_slope_interval(new_point)
             return None
@@ -40,6 +193,158 @@ class Compression:
             self._update_slope_interval(new_point)
             return save_point
 
+    def compress_array(self, timestamps, values) -> List[DataPoint]:
+        """Vectorized insert_checker for bulk arrays
+
+        timestamps: array-like of datetime64 (or datetime.datetime),
+                    should be strictly increasing
+        values: array-like of float
+        return: list of DataPoint to be archived, the same as calling
+                insert_checker on every point one by one
+
+        The slopes of every point to the archived point are computed
+        at once, and the slope interval is the cumulative max/min of
+        them. The first point outside the interval ends the segment.
+        The buffer and slope interval are left in the same state as
+        the scalar path, so insert_checker can continue afterward.
+        Where the segments are short, e.g. noisy data, the points are
+        passed to insert_checker block by block, see COMPRESS_BLOCK.
+        """
+        timestamps, values = _check_arrays(timestamps, values)
+        if self.deadband or self.max_gap:
+            return self.insert_points(_data_points(timestamps, values))
+
+        times_us = timestamps.astype(np.int64)
+
+        saved_points: List[DataPoint] = []
+        num_points = len(values)
+
+        # the first two points only initialize the buffer and time_step
+        idx = 0
+        while idx < num_points and not self.buffer.snapshot_point:
+            save_point = self.insert_checker(
+                DataPoint(timestamps[idx].item(), float(values[idx])))
+            if save_point:
+                saved_points.append(save_point)
+            idx += 1
+
+        if idx >= num_points:
+            return saved_points
+
+        first_idx = idx
+        archieved_point = self.buffer.archieved_point
+        archieved_time = np.datetime64(
+            archieved_point.timestamp, 'us').astype(np.int64)
+        archieved_value = archieved_point.value
+        # index of snapshot point, None means self.buffer.snapshot_point
+        snapshot_idx = None
+        slope_min, slope_max = self.slope_min, self.slope_max
+
+        window = self.COMPRESS_WINDOW
+        # points and segments since the last check of their length
+        block_start, num_segments = idx, 0
+        while idx < num_points:
+            if (idx - block_start >= self.COMPRESS_BLOCK
+                    and idx - block_start
+                    < self.COMPRESS_MIN_SEGMENT * num_segments):
+                self._set_array_state(archieved_point, timestamps, values,
+                                      snapshot_idx, slope_min, slope_max)
+                idx = self._compress_scalar(
+                    timestamps, values, idx, saved_points)
+                archieved_point = self.buffer.archieved_point
+                archieved_time = np.datetime64(
+                    archieved_point.timestamp, 'us').astype(np.int64)
+                archieved_value = archieved_point.value
+                first_idx, snapshot_idx = idx, None
+                slope_min, slope_max = self.slope_min, self.slope_max
+                window = self.COMPRESS_WINDOW
+            if idx - block_start >= self.COMPRESS_BLOCK:
+                block_start, num_segments = idx, 0
+            if idx >= num_points:
+                break
+
+            idx_end = min(idx + window, num_points)
+            delta_time = (times_us[idx:idx_end] - archieved_time) / 1e6
+            delta_value = values[idx:idx_end] - archieved_value
+            slope_incoming = delta_value / delta_time
+            envelope_min = _slope_envelope(
+                slope_min, (delta_value - self.dev_margin) / delta_time,
+                np.maximum)
+            envelope_max = _slope_envelope(
+                slope_max, (delta_value + self.dev_margin) / delta_time,
+                np.minimum)
+
+            outside = ((slope_incoming < envelope_min[:-1])
+                       | (slope_incoming > envelope_max[:-1]))
+            idx_outside = outside.argmax()
+            if not outside[idx_outside]:
+                slope_min, slope_max = envelope_min[-1], envelope_max[-1]
+                snapshot_idx = idx_end - 1
+                idx = idx_end
+                window *= 2
+                continue
+
+            idx_fail = idx + idx_outside
+            if idx_fail > first_idx:
+                save_point = DataPoint(timestamps[idx_fail - 1].item(),
+                                       float(values[idx_fail - 1]))
+                archieved_time = times_us[idx_fail - 1]
+            else:
+                save_point = self.buffer.snapshot_point
+                archieved_time = np.datetime64(
+                    save_point.timestamp, 'us').astype(np.int64)
+            saved_points.append(save_point)
+            num_segments += 1
+            archieved_point = save_point
+            archieved_value = save_point.value
+
+            delta_time = (times_us[idx_fail] - archieved_time) / 1e6
+            delta_value = values[idx_fail] - archieved_value
+            slope_min = (delta_value - self.dev_margin) / delta_time
+            slope_max = (delta_value + self.dev_margin) / delta_time
+            snapshot_idx = idx_fail
+            window = max(self.COMPRESS_WINDOW, 2 * (idx_fail - idx))
+            idx = idx_fail + 1
+
+        self._set_array_state(archieved_point, timestamps, values,
+                              snapshot_idx, slope_min, slope_max)
+        return saved_points
+
+    def _set_array_state(self, archieved_point: DataPoint,
+                         timestamps: np.ndarray, values: np.ndarray,
+                         snapshot_idx: Optional[int],
+                         slope_min: float, slope_max: float) -> None:
+        """Leave the buffer and slope interval of compress_array like
+        insert_checker does, snapshot_idx None keeps the snapshot point
+        of the buffer"""
+        self.buffer.archieved_point = archieved_point
+        if snapshot_idx is not None:
+            self.buffer.snapshot_point = DataPoint(
+                timestamps[snapshot_idx].item(), float(values[snapshot_idx]))
+        self.slope_min, self.slope_max = float(slope_min), float(slope_max)
+
+    def _compress_scalar(self, timestamps: np.ndarray, values: np.ndarray,
+                         idx: int, saved_points: List[DataPoint]) -> int:
+        """insert_checker of the points of compress_array from idx, by
+        blocks of COMPRESS_BLOCK points, until the segments of a block
+        are long enough for the arrays again
+
+        return: index of the first point not inserted
+        """
+        while idx < len(values):
+            idx_end = min(idx + self.COMPRESS_BLOCK, len(values))
+            num_saved = len(saved_points)
+            for new_point in _data_points(timestamps[idx:idx_end],
+                                          values[idx:idx_end]):
+                save_point = self.insert_checker(new_point)
+                if save_point:
+                    saved_points.append(save_point)
+            if (idx_end - idx >= self.COMPRESS_MIN_SEGMENT
+                    * (len(saved_points) - num_saved)):
+                return idx_end
+            idx = idx_end
+        return idx
+
     def select_interpolation(self, specified_time,
                              archieved_points: Tuple[DataPoint]
                              ) -> Generator[DataPoint, None, None]:
@@ -67,6 +372,113 @@ class Compression:
         else:
             return self._select_many(specified_time, archieved_points)
 
+    def select_interpolation_array(self, specified_time, archieved_points
+                                   ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized select_interpolation
+
+        The arguments are the same as select_interpolation.
+
+        Return: tuple of timestamps (datetime64[us]) and values (float64)
+        arrays, the same points as select_interpolation would generate
+        """
+        if isinstance(specified_time, datetime.datetime):
+            result_points = list(
+                self._select_one(specified_time, archieved_points))
+            timestamps = np.array([pnt.timestamp for pnt in result_points],
+                                  dtype='datetime64[us]')
+            values = np.array([pnt.value for pnt in result_points],
+                              dtype=np.float64)
+            return timestamps, values
+        else:
+            return self._select_many_array(specified_time, archieved_points)
+
+    def select_partition_array(self, specified_time: Tuple[datetime.datetime],
+                               time_cut_start: Optional[datetime.datetime],
+                               time_cut_end: Optional[datetime.datetime],
+                               archieved_points: List[DataPoint]
+                               ) -> Tuple[np.ndarray, np.ndarray]:
+        """Part of select_interpolation_array of a range made of the
+        segments starting in [time_cut_start, time_cut_end)
+
+        specified_time: the whole range
+        time_cut_start, time_cut_end: None for the first and the last
+            partition
+        archieved_points: points selected for the partition, with the
+            closest points before time_cut_start and after time_cut_end
+        return: the same as select_interpolation_array, the partitions
+            concatenated in order are the result of the whole range
+
+        The grid restarts at every archived point, so a segment does not
+        depend on the others. The archived point ending the last segment
+        is output by the partition, and skipped by the next one.
+        """
+        points = list(archieved_points)
+        # no archived point after the partition, so the segment to the
+        # snapshot point starts in it or before
+        snapshot_point = self.buffer.snapshot_point
+        time_last = time_cut_end or specified_time[1] or (
+            snapshot_point.timestamp if snapshot_point else None)
+        if points and snapshot_point and points[-1].timestamp < time_last:
+            points.append(snapshot_point)
+        if time_cut_start:
+            points = [pnt for pnt in points
+                      if pnt.timestamp >= time_cut_start]
+        if time_cut_end:
+            for idx, pnt in enumerate(points):
+                if pnt.timestamp >= time_cut_end:
+                    points = points[:idx + 1]
+                    break
+
+        if not time_cut_start:
+            return self._select_many_array(specified_time, points,
+                                           add_snapshot=False)
+        if not points:
+            return (np.array([], dtype='datetime64[us]'),
+                    np.array([], dtype=np.float64))
+        timestamps, values = self._select_many_array(
+            [points[0].timestamp, specified_time[1]], points,
+            add_snapshot=False)
+        if points[0].value is None:
+            # a break marker is not output
+            return timestamps, values
+        return timestamps[1:], values[1:]
+
+    def select_segments_array(self, specified_time: Tuple[datetime.datetime],
+                              first_point: DataPoint,
+                              segments: List[Tuple[DataPoint, DataPoint]]
+                              ) -> Tuple[np.ndarray, np.ndarray]:
+        """Part of select_interpolation_array of a range made of some of
+        its segments
+
+        first_point: the first archived point selected for the range
+        segments: (start, end) archived points of the segments in time
+            order, the last one can end with the snapshot point
+        return: the points select_interpolation_array outputs for
+            first_point and the segments, in order
+
+        The grid restarts at every archived point, so consecutive
+        segments are sampled together, and the others alone, the same
+        as select_partition_array.
+        """
+        runs = [[first_point]]
+        for point_start, point_end in segments:
+            if runs[-1][-1].timestamp == point_start.timestamp:
+                runs[-1].append(point_end)
+            else:
+                runs.append([point_start, point_end])
+
+        results = [self._select_many_array(specified_time, runs[0],
+                                           add_snapshot=False)]
+        for run in runs[1:]:
+            timestamps, values = self._select_many_array(
+                [run[0].timestamp, specified_time[1]], run,
+                add_snapshot=False)
+            num_skipped = 0 if run[0].value is None else 1
+            results.append((timestamps[num_skipped:],
+                            values[num_skipped:]))
+        return (np.concatenate([result[0] for result in results]),
+                np.concatenate([result[1] for result in results]))
+
     def _select_one(self, specified_time: datetime.datetime,
                     saved_points: Tuple[DataPoint]
                     ) -> Generator[DataPoint, None, None]:
@@ -91,6 +503,9 @@ class Compression:
         if specified_time < old_point.timestamp or specified_time > new_point.timestamp:
             # invalid specified time, return nothing
             return
+        if old_point.value is None or new_point.value is None:
+            # in a gap, nothing is reconstructed across a break marker
+            return
 
         result_point = self._calc_interpolation(
             specified_time, point_start=old_point, point_end=new_point)
@@ -107,14 +522,7 @@ class Compression:
             raise NotImplementedError(error_message)
 
         if not end_time:
-            if not self.buffer.snapshot_point:
-                # TODO:
-                # case 1: no data, just return and end this function
-                # case 2: with data but the curor is closed and reconnect
-                #         this should be solved by initializing the
-                #         compression class when reconnect
-                raise NotImplementedError()
-            end_time = self.buffer.snapshot_point.timestamp
+            end_time = self._last_time()
 
         def add_point_to_tail_if_needed() -> Generator[DataPoint, None, None]:
             nonlocal archieved_points
@@ -122,7 +530,8 @@ class Compression:
             pnt = None
             for pnt in archieved_points:
                 yield pnt
-            if pnt and pnt.timestamp < end_time:
+            if (pnt and pnt.timestamp < end_time
+                    and self.buffer.snapshot_point):
                 yield self.buffer.snapshot_point
 
         point_generator = add_point_to_tail_if_needed()
@@ -136,32 +545,469 @@ class Compression:
         if not start_time:
             start_time = point_prev.timestamp
 
+        time_step = self.time_step_at(point_prev.timestamp)
         if point_prev.timestamp >= start_time:
-            working_time = point_prev.timestamp
-            yield point_prev
+            grid_start = point_prev.timestamp
+            if point_prev.value is not None:
+                yield point_prev
         else:
-            working_time = start_time - self.time_step
+            grid_start = start_time - time_step
 
         for point_next in point_generator:
-            while working_time < point_next.timestamp:
-                working_time += self.time_step
-                if working_time > end_time:
-                    # fetch remaining data contained in the generator, or the
-                    # next sql execute will raise unread result found error
-                    for _ in point_generator:
-                        pass
-                    return
-
-                point_result = self._calc_interpolation(
-                    working_time,
-                    point_start=point_prev, point_end=point_next)
-                yield point_result
-
-            if working_time != point_next.timestamp:
-                working_time = point_next.timestamp
-                yield point_next
+            if point_prev.value is None or point_next.value is None:
+                # nothing is reconstructed across a break marker, the
+                # point after it starts the grid of the next run
+                if point_next.value is not None:
+                    if point_next.timestamp > end_time:
+                        return
+                    yield point_next
+            else:
+                # the slope and the start of the segment are computed
+                # once, the samples only advance sample_time and its
+                # offset, both integers of microseconds, so the grid does
+                # not drift
+                slope = self._calculate_slope(
+                    new_point=point_next, old_point=point_prev)
+                value_prev = point_prev.value
+                offset_us = (grid_start - point_prev.timestamp) // MICROSECOND
+                step_us = time_step // MICROSECOND
+                sample_time = grid_start
+                while sample_time < point_next.timestamp:
+                    sample_time += time_step
+                    if sample_time > end_time:
+                        # the remaining data contained in the generator
+                        # are not needed, the cursor discards them before
+                        # the next sql execute
+                        return
+
+                    # the same as _calc_interpolation
+                    offset_us += step_us
+                    yield DataPoint(sample_time,
+                                    slope * (offset_us / 1e6) + value_prev)
+
+                if sample_time != point_next.timestamp:
+                    yield point_next
 
             point_prev = point_next
+            grid_start = point_next.timestamp
+            time_step = self.time_step_at(grid_start)
+
+    def _last_time(self) -> datetime.datetime:
+        """Time of the last point of the buffer, the end of a range
+        without limit"""
+        last_point = (self.buffer.snapshot_point
+                      or self.buffer.archieved_point)
+        if not last_point:
+            # TODO:
+            # case: with data but the curor is closed and reconnect
+            #       this should be solved by initializing the
+            #       compression class when reconnect
+            raise NotImplementedError()
+        return last_point.timestamp
+
+    def _select_many_array(self, specified_time: Tuple[datetime.datetime],
+                           archieved_points: Generator[DataPoint, None, None],
+                           add_snapshot: bool = True
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+        """Array version of _select_many
+
+        Every segment between two archived points is sampled from its
+        start by the time_step of its run at once, and the archived
+        point at the end of the segment is added if it is not on the
+        grid, the same as the loop in _select_many.
+        """
+        segments = self._segment_samples(specified_time, archieved_points,
+                                         add_snapshot)
+        if segments is None:
+            return (np.array([], dtype='datetime64[us]'),
+                    np.array([], dtype=np.float64))
+
+        (point_times, point_values, first_point_in_range, grid_starts,
+         num_samples, add_end_point, end_time, time_steps) = segments
+
+        num_output = num_samples + add_end_point
+        output_offsets = np.cumsum(num_output) - num_output
+        if first_point_in_range:
+            output_offsets += 1
+        total_output = int(first_point_in_range) + int(num_output.sum())
+
+        output_times = np.empty(total_output, dtype=np.int64)
+        output_values = np.empty(total_output, dtype=np.float64)
+        is_grid = np.zeros(total_output, dtype=bool)
+        if first_point_in_range:
+            output_times[0] = point_times[0]
+            output_values[0] = point_values[0]
+
+        # samples on the grid
+        segment_idx = np.repeat(np.arange(len(num_samples)), num_samples)
+        sample_no = (np.arange(len(segment_idx))
+                     - np.repeat(np.cumsum(num_samples) - num_samples,
+                                 num_samples) + 1)
+        sample_times = (grid_starts[segment_idx]
+                        + sample_no * time_steps[segment_idx])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = ((point_values[1:] - point_values[:-1])
+                      / ((point_times[1:] - point_times[:-1]) / 1e6))
+        sample_values = (
+            slopes[segment_idx]
+            * ((sample_times - point_times[segment_idx]) / 1e6)
+            + point_values[segment_idx])
+        sample_pos = output_offsets[segment_idx] + sample_no - 1
+        output_times[sample_pos] = sample_times
+        output_values[sample_pos] = sample_values
+        is_grid[sample_pos] = True
+
+        # archived points at the end of segments
+        end_point_idx = np.flatnonzero(add_end_point)
+        end_point_pos = output_offsets[end_point_idx] + \
+            num_samples[end_point_idx]
+        output_times[end_point_pos] = point_times[end_point_idx + 1]
+        output_values[end_point_pos] = point_values[end_point_idx + 1]
+
+        exceed = is_grid & (output_times > end_time)
+        if exceed.any():
+            num_kept = exceed.argmax()
+            output_times = output_times[:num_kept]
+            output_values = output_values[:num_kept]
+
+        return output_times.astype('datetime64[us]'), output_values
+
+    def _points_arrays(self, specified_time: Tuple[datetime.datetime],
+                       archieved_points: Generator[DataPoint, None, None],
+                       add_snapshot: bool = True) -> Optional[tuple]:
+        """Archived points of a range select as arrays
+
+        The snapshot point is appended if the points end before end_time,
+        unless add_snapshot is False.
+        Times are microseconds since epoch, and the values of break
+        markers are NaN.
+        return: None if no point, otherwise a tuple of point_times,
+            point_values, start_time and end_time, where no limit is
+            replaced by the first point and the last point of the buffer
+        """
+        assert len(specified_time) == 2
+        start_time, end_time = specified_time[0], specified_time[1]
+
+        if not end_time:
+            end_time = self._last_time()
+
+        points = list(archieved_points)
+        if (add_snapshot and points and points[-1].timestamp < end_time
+                and self.buffer.snapshot_point):
+            points.append(self.buffer.snapshot_point)
+
+        if not points:
+            return None
+
+        # much faster than converting datetime objects by numpy
+        point_times = np.fromiter(
+            ((pnt.timestamp - EPOCH) // MICROSECOND for pnt in points),
+            dtype=np.int64, count=len(points))
+        # None of break markers is NaN, which fromiter does not convert
+        point_values = np.array([pnt.value for pnt in points],
+                                dtype=np.float64)
+        end_time = np.datetime64(end_time, 'us').astype(np.int64)
+        if start_time:
+            start_time = np.datetime64(start_time, 'us').astype(np.int64)
+        else:
+            start_time = point_times[0]
+        return point_times, point_values, start_time, end_time
+
+    def _segment_samples(self, specified_time: Tuple[datetime.datetime],
+                         archieved_points: Generator[DataPoint, None, None],
+                         add_snapshot: bool = True) -> Optional[tuple]:
+        """Sampling of every segment between two archived points, shared
+        by _select_many_array and aggregate
+
+        Times are microseconds since epoch.
+        return: None if no point, otherwise a tuple of
+            point_times, point_values: the archived points and the
+                snapshot point appended if needed
+            first_point_in_range: whether the first point is output
+            grid_starts: time the grid of every segment starts from
+            num_samples: number of grid samples of every segment, up to
+                the first one exceeding end_time
+            add_end_point: whether the point at the end of every segment
+                is output after the samples
+            end_time
+            time_steps: time_step of every segment
+
+        A segment from or to a break marker has no sample, and the point
+        after the marker is output if it is within the range.
+        """
+        if not self.time_step:
+            error_message = f"time_step({self.time_step}) is not recorded!"
+            raise NotImplementedError(error_message)
+
+        points = self._points_arrays(specified_time, archieved_points,
+                                     add_snapshot)
+        if points is None:
+            return None
+
+        point_times, point_values, start_time, end_time = points
+        time_steps = self._segment_time_steps(point_times[:-1])
+
+        # the grid of a segment starts from the archived point, except
+        # that the first segment starts from start_time if the first
+        # point is out of range
+        first_point_in_range = (point_times[0] >= start_time
+                                and not np.isnan(point_values[0]))
+        grid_starts = point_times[:-1].copy()
+        if len(grid_starts) and point_times[0] < start_time:
+            grid_starts[0] = start_time - time_steps[0]
+
+        # number of samples until reaching the end of segment, but stop
+        # at the first one exceeding end_time
+        num_samples = np.maximum(
+            0, -((grid_starts - point_times[1:]) // time_steps))
+        num_samples = np.minimum(
+            num_samples,
+            np.maximum(1, (end_time - grid_starts) // time_steps + 1))
+        add_end_point = (grid_starts + num_samples * time_steps
+                         != point_times[1:])
+
+        is_break_start = np.isnan(point_values[:-1])
+        is_break_end = np.isnan(point_values[1:])
+        num_samples[is_break_start | is_break_end] = 0
+        add_end_point = np.where(
+            is_break_start, point_times[1:] <= end_time,
+            add_end_point) & ~is_break_end
+        return (point_times, point_values, first_point_in_range,
+                grid_starts, num_samples, add_end_point, end_time,
+                time_steps)
+
+    def aggregate(self, specified_time: Tuple[datetime.datetime],
+                  archieved_points: Generator[DataPoint, None, None],
+                  functions: Tuple[str]) -> tuple:
+        """Aggregate the points select_interpolation would generate,
+        without generating them
+
+        specified_time, archieved_points: the same as the range case of
+            select_interpolation
+        functions: 'avg', 'min', 'max', 'sum', 'count' or 'integral'
+        return: a tuple of the result of each function, None if no point
+            except count
+
+        The samples of a segment are on a line, so their sum is an
+        arithmetic series and their extrema are the first and the last
+        samples. integral is the area under the piecewise linear curve
+        within the time range by trapezoids, in value * seconds.
+        """
+        segments = self._segment_samples(specified_time, archieved_points)
+        if segments is None:
+            return tuple(0 if func == 'count' else None
+                         for func in functions)
+
+        (point_times, point_values, first_point_in_range, grid_starts,
+         num_samples, add_end_point, end_time, time_steps) = segments
+
+        # the first sample exceeding end_time stops the output, so the
+        # samples after it and the end point of its segment are dropped
+        exceed = ((num_samples > 0)
+                  & (grid_starts + num_samples * time_steps > end_time))
+        if exceed.any():
+            idx_stop = exceed.argmax()
+            num_samples = num_samples[:idx_stop + 1].copy()
+            num_samples[idx_stop] = max(
+                0, (end_time - grid_starts[idx_stop]) // time_steps[idx_stop])
+            add_end_point = add_end_point[:idx_stop + 1].copy()
+            add_end_point[idx_stop] = False
+        num_segments = len(num_samples)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = ((point_values[1:] - point_values[:-1])
+                      / ((point_times[1:] - point_times[:-1]) / 1e6))
+        slopes = slopes[:num_segments]
+        values_start = point_values[:num_segments]
+        # offset of the grid start from the archived point, in us
+        offsets = grid_starts[:num_segments] - point_times[:num_segments]
+
+        has_sample = num_samples > 0
+        samples = num_samples[has_sample]
+        slope_sampled = slopes[has_sample]
+        value_sampled = values_start[has_sample]
+        offset_sampled = offsets[has_sample]
+        step_sampled = time_steps[:num_segments][has_sample]
+        sample_sum = (
+            samples * value_sampled
+            + slope_sampled * (samples * offset_sampled
+                               + step_sampled * samples * (samples + 1) / 2)
+            / 1e6)
+        sample_first = (slope_sampled
+                        * ((offset_sampled + step_sampled) / 1e6)
+                        + value_sampled)
+        sample_last = (slope_sampled
+                       * ((offset_sampled + samples * step_sampled) / 1e6)
+                       + value_sampled)
+
+        end_values = point_values[1:num_segments + 1][add_end_point]
+        output_values = [end_values, sample_first, sample_last]
+        if first_point_in_range:
+            output_values.append(point_values[:1])
+        output_values = np.concatenate(output_values)
+
+        count = (int(first_point_in_range) + int(num_samples.sum())
+                 + len(end_values))
+        total = float(sample_sum.sum()) + float(end_values.sum())
+        if first_point_in_range:
+            total += float(point_values[0])
+
+        result = []
+        for func in functions:
+            if func == 'count':
+                result.append(count)
+            elif not count:
+                result.append(None)
+            elif func == 'integral':
+                result.append(self._integral(
+                    specified_time[0], end_time, point_times, point_values))
+            elif func == 'sum':
+                result.append(total)
+            elif func == 'avg':
+                result.append(total / count)
+            elif func == 'min':
+                result.append(float(output_values.min()))
+            elif func == 'max':
+                result.append(float(output_values.max()))
+            else:
+                raise ValueError(f"aggregate function {func} is not support")
+        return tuple(result)
+
+    @staticmethod
+    def _integral(start_time: Optional[datetime.datetime], end_time: int,
+                  point_times: np.ndarray, point_values: np.ndarray
+                  ) -> Optional[float]:
+        """Area under the piecewise linear curve of the points within
+        [start_time, end_time] in value * seconds
+
+        end_time: microseconds since epoch
+        The gaps around break markers have no area.
+        """
+        if len(point_times) < 2:
+            return 0.0
+
+        if start_time:
+            start_time = np.datetime64(start_time, 'us').astype(np.int64)
+        else:
+            start_time = point_times[0]
+
+        times_left = np.clip(start_time, point_times[:-1], point_times[1:])
+        times_right = np.clip(end_time, point_times[:-1], point_times[1:])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slopes = ((point_values[1:] - point_values[:-1])
+                      / (point_times[1:] - point_times[:-1]))
+        values_left = (point_values[:-1]
+                       + slopes * (times_left - point_times[:-1]))
+        values_right = (point_values[:-1]
+                        + slopes * (times_right - point_times[:-1]))
+        areas = ((values_left + values_right) / 2
+                 * (times_right - times_left) / 1e6)
+        return float(areas[(times_right > times_left)
+                           & ~np.isnan(areas)].sum())
+
+    def select_downsampled(self, specified_time: Tuple[datetime.datetime],
+                           archieved_points: Generator[DataPoint, None, None],
+                           step: datetime.timedelta = None,
+                           max_points: int = None, mode: str = 'linear'
+                           ) -> Tuple[np.ndarray, np.ndarray]:
+        """Reconstruct a time range on a grid coarser than time_step
+
+        specified_time, archieved_points: the same as the range case of
+            select_interpolation
+        step: interval of the grid starting from start_time (or the
+            first point if no limit)
+        max_points: max number of points returned, used if step is None,
+            and step is rounded up to a multiple of time_step
+        mode:
+            'linear': the piecewise linear curve on the grid
+            'minmax': the min and max of the curve in every interval of
+                the grid, so the shape is kept for plotting
+        return: tuple of timestamps (datetime64[us]) and values (float64)
+
+        Only the grid is evaluated, the points of time_step between are
+        never generated. The curve is not defined in the gaps around
+        break markers, so nothing is returned there.
+        """
+        if mode not in self.DOWNSAMPLE_MODES:
+            raise ValueError(
+                f"mode should be one of {self.DOWNSAMPLE_MODES}, get {mode}")
+        if not step and not max_points:
+            raise ValueError("step or max_points should be given")
+
+        points = self._points_arrays(specified_time, archieved_points)
+        if points is None or points[3] < points[2]:
+            return (np.array([], dtype='datetime64[us]'),
+                    np.array([], dtype=np.float64))
+
+        point_times, point_values, start_time, end_time = points
+        if step:
+            step = step // MICROSECOND
+        else:
+            # minmax gives 2 points for every interval
+            num_intervals = max(1, max_points - 1 if mode == 'linear'
+                                else max_points // 2)
+            step = max(1, -(-(end_time - start_time) // num_intervals))
+            if self.time_step:
+                time_step = self.time_step_at(
+                    EPOCH + datetime.timedelta(microseconds=int(end_time))
+                ) // MICROSECOND
+                step = -(-step // time_step) * time_step
+        if step <= 0:
+            raise ValueError(f"step should be positive, get {step} us")
+
+        if mode == 'linear':
+            # the grid is only evaluated where the curve is defined
+            grid = np.arange(start_time, end_time + 1, step, dtype=np.int64)
+            grid = grid[(grid >= point_times[0])
+                        & (grid <= point_times[-1])]
+            values = _interpolate(grid, point_times, point_values)
+            is_defined = ~np.isnan(values)
+            return (grid[is_defined].astype('datetime64[us]'),
+                    values[is_defined])
+
+        # the extrema of a line within an interval are at its ends, so
+        # the candidates are the ends of the intervals and the archived
+        # points, the last interval ends at end_time
+        num_buckets = max(1, -(-(end_time - start_time) // step))
+        edges = start_time + step * np.arange(num_buckets + 1)
+        edges[-1] = min(edges[-1], end_time)
+        in_range = (point_times >= start_time) & (point_times <= end_time)
+        candidate_times = np.concatenate(
+            [edges[:-1], edges[1:], point_times[in_range]])
+        candidate_buckets = np.concatenate(
+            [np.arange(num_buckets), np.arange(num_buckets),
+             np.minimum((point_times[in_range] - start_time) // step,
+                        num_buckets - 1)])
+        is_defined = ((candidate_times >= point_times[0])
+                      & (candidate_times <= point_times[-1]))
+        candidate_times = candidate_times[is_defined]
+        candidate_buckets = candidate_buckets[is_defined]
+        if not len(candidate_times):
+            return (np.array([], dtype='datetime64[us]'),
+                    np.array([], dtype=np.float64))
+        candidate_values = _interpolate(candidate_times, point_times,
+                                        point_values)
+        is_defined = ~np.isnan(candidate_values)
+        candidate_times = candidate_times[is_defined]
+        candidate_buckets = candidate_buckets[is_defined]
+        candidate_values = candidate_values[is_defined]
+
+        order = np.lexsort((candidate_values, candidate_buckets))
+        sorted_buckets = candidate_buckets[order]
+        is_first = np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]]
+        is_last = np.r_[sorted_buckets[1:] != sorted_buckets[:-1], True]
+        selected = np.unique(order[is_first | is_last])
+        output_times = candidate_times[selected]
+        output_values = candidate_values[selected]
+
+        # sort by time and remove the same point selected twice
+        order = np.lexsort((output_values, output_times))
+        output_times = output_times[order]
+        output_values = output_values[order]
+        is_new = np.r_[True, (output_times[1:] != output_times[:-1])
+                       | (output_values[1:] != output_values[:-1])]
+        return (output_times[is_new].astype('datetime64[us]'),
+                output_values[is_new])
 
     def _calculate_slope(self,
                          new_point: DataPoint, *,
@@ -210,3 +1056,309 @@ class Compression:
         interpolation_value = slope * delta_time + point_start.value
         result_point = DataPoint(specified_time, interpolation_value)
         return result_point
+
+
+class PLACompression(Compression):
+    """Piecewise linear approximation with the same error bound, whose
+    vertices are not restricted to the inserted values
+
+    The segment from the archived point is extended while a line within
+    dev_margin of all its points exists, and stays within VERTEX_WINDOW
+    * dev_margin of the last point, so the next segment starts near the
+    data. The vertex ending the segment is the value of the line closest
+    to the point breaking it, instead of the inserted value.
+    The snapshot point is on the line too, so the buffer means the same
+    as the swinging door and selects need no change.
+    """
+    ENGINE = 'pla'
+    VERTEX_WINDOW = 0.5
+
+    def insert_checker(self, new_point: DataPoint) -> Optional[DataPoint]:
+        """insert_checker of Compression with the vertex moved"""
+        if not self.buffer.snapshot_point:
+            # the first two points are the same as the swinging door
+            return super().insert_checker(new_point)
+
+        archieved_point = self.buffer.archieved_point
+        slope_min, slope_max = self._calc_current_slope_interval(new_point)
+        slope_min = max(self.slope_min, slope_min)
+        slope_max = min(self.slope_max, slope_max)
+        delta_time = (new_point.timestamp
+                      - archieved_point.timestamp).total_seconds()
+        value_min = archieved_point.value + slope_min * delta_time
+        value_max = archieved_point.value + slope_max * delta_time
+        window = self.VERTEX_WINDOW * self.dev_margin
+        if (slope_min <= slope_max
+                and value_min <= new_point.value + window
+                and value_max >= new_point.value - window):
+            self.slope_min, self.slope_max = slope_min, slope_max
+            self.buffer.update_snapshot(DataPoint(
+                new_point.timestamp,
+                min(max(new_point.value, value_min), value_max)))
+            return None
+
+        snapshot_time = self.buffer.snapshot_point.timestamp
+        delta_time = (snapshot_time
+                      - archieved_point.timestamp).total_seconds()
+        save_point = DataPoint(snapshot_time, min(
+            max(new_point.value,
+                archieved_point.value + self.slope_min * delta_time),
+            archieved_point.value + self.slope_max * delta_time))
+        self.buffer.archieved_point = save_point
+        self.buffer.snapshot_point = new_point
+        self.slope_min, self.slope_max = None, None
+        self._update_slope_interval(new_point)
+        return save_point
+
+    def compress_array(self, timestamps, values) -> List[DataPoint]:
+        """insert_points of arrays, see Compression.compress_array"""
+        return self.insert_points(
+            _data_points(*_check_arrays(timestamps, values)))
+
+
+# compression engines by the name in CREATE TABLE ... compressor=<name>
+ENGINES = {engine.ENGINE: engine for engine in (Compression, PLACompression)}
+
+
+def new_compression(engine: str, dev_margin: float, deadband: float = 0.0,
+                    **kwargs) -> Compression:
+    """Compression of the engine named engine, see ENGINES"""
+    if engine not in ENGINES:
+        error_message = (f"compressor should be one of {tuple(ENGINES)}, "
+                         f"get {engine}")
+        raise ValueError(error_message)
+    return ENGINES[engine](dev_margin, deadband=deadband, **kwargs)
+
+
+def _check_arrays(timestamps, values) -> Tuple[np.ndarray, np.ndarray]:
+    """timestamps and values of compress_array as arrays"""
+    timestamps = np.asarray(timestamps, dtype='datetime64[us]')
+    values = np.asarray(values, dtype=np.float64)
+    if timestamps.shape != values.shape or timestamps.ndim != 1:
+        raise ValueError("timestamps and values should be 1-d arrays "
+                         "with the same length")
+    if np.any(np.diff(timestamps.astype(np.int64)) <= 0):
+        raise ValueError("timestamps should be strictly increasing")
+    return timestamps, values
+
+
+def _data_points(timestamps: np.ndarray,
+                 values: np.ndarray) -> Generator[DataPoint, None, None]:
+    return (DataPoint(timestamp, value) for timestamp, value
+            in zip(timestamps.tolist(), values.tolist()))
+
+
+def _slope_envelope(slope_bound: float, slopes: np.ndarray,
+                    ufunc: np.ufunc) -> np.ndarray:
+    """Cumulative max/min of slopes, the same as _update_slope_interval
+
+    return: array of slope_bound followed by the bound after each slope
+
+    _update_slope_interval replaces the slope bound by the current one
+    if the bound is 0, so the accumulation restarts after every 0.
+    """
+    envelope = np.empty(len(slopes) + 1)
+    envelope[0] = slope_bound
+    envelope[1:] = slopes
+    ufunc.accumulate(envelope, out=envelope)
+    restart = 0
+    while restart < len(slopes):
+        is_zero = envelope[restart:-1] == 0
+        idx_zero = is_zero.argmax()
+        if not is_zero[idx_zero]:
+            break
+        restart += idx_zero + 1
+        envelope[restart:] = slopes[restart - 1:]
+        ufunc.accumulate(envelope[restart:], out=envelope[restart:])
+    return envelope
+
+
+def _interpolate(times: np.ndarray, point_times: np.ndarray,
+                 point_values: np.ndarray) -> np.ndarray:
+    """Values of the piecewise linear curve of the points at times
+
+    times should be within [point_times[0], point_times[-1]]
+    The values are NaN between a break marker (NaN) and its neighbors,
+    but not at the neighbors.
+    """
+    if len(point_times) == 1:
+        return np.full(len(times), point_values[0])
+    segment_idx = np.clip(np.searchsorted(point_times, times, side='right')
+                          - 1, 0, len(point_times) - 2)
+    slopes = ((point_values[1:] - point_values[:-1])
+              / ((point_times[1:] - point_times[:-1]) / 1e6))
+    values = (slopes[segment_idx]
+              * ((times - point_times[segment_idx]) / 1e6)
+              + point_values[segment_idx])
+    # the archived points next to a break marker are defined
+    is_start = np.isnan(values) & (times == point_times[segment_idx])
+    values[is_start] = point_values[segment_idx[is_start]]
+    is_end = np.isnan(values) & (times == point_times[segment_idx + 1])
+    values[is_end] = point_values[segment_idx[is_end] + 1]
+    return values
+
+
+def aggregate_values(values: List[float], functions: Tuple[str]) -> tuple:
+    """Aggregate values the same as Compression.aggregate, for the
+    results of a point select"""
+    result = []
+    for func in functions:
+        if func == 'count':
+            result.append(len(values))
+        elif not values:
+            result.append(None)
+        elif func == 'integral':
+            result.append(0.0)
+        elif func == 'sum':
+            result.append(float(sum(values)))
+        elif func == 'avg':
+            result.append(sum(values) / len(values))
+        elif func == 'min':
+            result.append(min(values))
+        elif func == 'max':
+            result.append(max(values))
+        else:
+            raise ValueError(f"aggregate function {func} is not support")
+    return tuple(result)
+
+
+def segment_envelope(point_start: DataPoint, point_end: DataPoint,
+                     time_step: Optional[datetime.timedelta]
+                     ) -> Tuple[Optional[float], Optional[float]]:
+    """Bounds of the values reconstructed on the segment between two
+    consecutive archived points, None if time_step is unknown
+
+    The samples are on the line through the points, from point_start
+    up to the first one not before point_end, which is less than
+    time_step after it. Only point_end is output after a break marker,
+    and it has no value.
+    """
+    if point_end.value is None:
+        return None, None
+    if point_start.value is None:
+        return point_end.value, point_end.value
+    if not time_step:
+        return None, None
+    overshoot = ((point_end.value - point_start.value)
+                 * (time_step / (point_end.timestamp
+                                 - point_start.timestamp)))
+    low = min(point_start.value, point_end.value,
+              point_end.value + overshoot)
+    high = max(point_start.value, point_end.value,
+               point_end.value + overshoot)
+    # the samples are computed by another formula, rounded differently
+    margin = ENVELOPE_MARGIN * max(abs(low), abs(high), 1.0)
+    return low - margin, high + margin
+
+
+def segment_envelopes(point_before: Optional[DataPoint],
+                      points: List[DataPoint],
+                      time_step_at: Callable[[datetime.datetime],
+                                             Optional[datetime.timedelta]]
+                      ) -> List[Tuple[Optional[float], Optional[float]]]:
+    """segment_envelope of the segment ending at every archived point
+
+    point_before: the archived point before points, None if points
+        start the table, then the first envelope is its value
+    time_step_at: time_step of the segment starting at a time, see
+        Compression.time_step_at
+    """
+    envelopes = []
+    for pnt in points:
+        if point_before is None:
+            envelopes.append((pnt.value, pnt.value))
+        else:
+            envelopes.append(segment_envelope(
+                point_before, pnt, time_step_at(point_before.timestamp)))
+        point_before = pnt
+    return envelopes
+
+
+def envelope_may_meet(envelope: Tuple[Optional[float], Optional[float]],
+                      conditions: List[Tuple[str, float]]) -> bool:
+    """Whether a value within envelope can meet every (operator,
+    threshold) of conditions"""
+    low, high = envelope
+    if low is None:
+        return True
+    for operator, threshold in conditions:
+        if operator.startswith('>') and high < threshold:
+            return False
+        if operator.startswith('<') and low > threshold:
+            return False
+    return True
+
+
+def value_mask(values: np.ndarray,
+               conditions: List[Tuple[str, float]]) -> np.ndarray:
+    """Whether every value meets every (operator, threshold) of
+    conditions"""
+    mask = np.ones(len(values), dtype=bool)
+    for operator, threshold in conditions:
+        mask &= VALUE_OPERATORS[operator](values, threshold)
+    return mask
+
+
+def aligned_rows(time_start: datetime.datetime, time_end: datetime.datetime,
+                 step: datetime.timedelta,
+                 events: Iterable[Tuple[datetime.datetime, int, float]],
+                 num_series: int) -> Generator[tuple, None, None]:
+    """Values of several series on the common grid time_start + k * step
+    up to time_end, merged from their archived points in one pass
+
+    events: (timestamp, series, value) of the archived points of every
+        series in time order, with the closest points outside the range
+    return: generator of rows of the time of the grid and the value of
+        every series, None where the series has no point around the time
+        or is in a gap
+
+    A row is yielded once every series has a point not before it, so
+    only the rows after the slowest series are kept.
+    """
+    previous_points = [None] * num_series
+    # number of the first row whose value of the series is unknown
+    pending_from = [0] * num_series
+    rows = collections.deque()
+    num_yielded = num_rows = 0
+    grid_time = time_start
+
+    for timestamp, series, value in events:
+        point_before = previous_points[series]
+        if point_before is not None and (timestamp <= point_before[0]
+                                         or point_before[0] >= time_end):
+            continue
+        while grid_time <= time_end and grid_time <= timestamp:
+            rows.append([grid_time] + [None] * num_series)
+            num_rows += 1
+            grid_time = time_start + step * num_rows
+
+        # the same formula as _interpolate, nothing is interpolated
+        # across a break marker of value None
+        is_line = (point_before is not None and point_before[1] is not None
+                   and value is not None)
+        if is_line:
+            time_before, value_before = point_before
+            slope = (value - value_before) / (
+                (timestamp - time_before) // MICROSECOND / 1e6)
+        for row_idx in range(pending_from[series], num_rows):
+            row = rows[row_idx - num_yielded]
+            if row[0] == timestamp:
+                row[series + 1] = value
+            elif is_line:
+                row[series + 1] = (
+                    slope * ((row[0] - time_before) // MICROSECOND / 1e6)
+                    + value_before)
+        pending_from[series] = num_rows
+        previous_points[series] = (timestamp, value)
+
+        while num_yielded < min(pending_from):
+            yield tuple(rows.popleft())
+            num_yielded += 1
+
+    # no point after the rest of the grid
+    while rows:
+        yield tuple(rows.popleft())
+    while grid_time <= time_end:
+        yield (grid_time, ) + (None, ) * num_series
+        num_rows += 1
+        grid_time = time_start + step * num_rows
@@ -1,8 +1,122 @@
+import weakref
+
 from mysql.connector.connection import MySQLConnection
 
-from .cursor import Cursor
+from .cursor import CCursor, CMySQLConnection, Cursor
+
+
+class BaseConnection:
+    """Compression of the connection, mixed with the connection of a
+    driver, see Connection and CConnection"""
+    def __init__(self, *args, **kwargs):
+        # cursors whose compression state is saved by commit
+        self._custom_cursors = weakref.WeakSet()
+        # current database, queried by table_namespace when unknown
+        self._current_database = None
+        self._has_current_database = False
+        super().__init__(*args, **kwargs)
+
+    def connect(self, *args, **kwargs):
+        self._has_current_database = False
+        return super().connect(*args, **kwargs)
+
+    @property
+    def database(self):
+        return super().database
+
+    @database.setter
+    def database(self, value):
+        self.cmd_init_db(value)
+
+    def cmd_init_db(self, database: str):
+        """Change the current database
+
+        The compression state of the tables inserted by the cursors is
+        saved to the current database first, the tables are resolved in
+        the new database afterward, see table_namespace.
+        """
+        for ourcursor in list(self._custom_cursors):
+            if ourcursor._connection is not None:
+                ourcursor._leave_database()
+        result = super().cmd_init_db(database)
+        self._current_database = database
+        self._has_current_database = True
+        return result
+
+    def cmd_change_user(self, *args, **kwargs):
+        for ourcursor in list(self._custom_cursors):
+            if ourcursor._connection is not None:
+                ourcursor._leave_database()
+        result = super().cmd_change_user(*args, **kwargs)
+        self._has_current_database = False
+        return result
+
+    def table_namespace(self) -> tuple:
+        """(host, port, database) of the tables of the connection,
+        see registry.CompressorRegistry"""
+        if not self._has_current_database:
+            self._current_database = super().database
+            self._has_current_database = True
+        return (self.server_host, self.server_port, self._current_database)
+
+    def cursor(self, *args, fetch_chunk_size: int = None,
+               index_size: int = None, cache_size: int = None, **kwargs):
+        """Cursor compressing the inserted points of the tables created
+        with dev_margin
+
+        With options of the cursor of the driver, e.g. buffered or
+        dictionary, the cursor of the driver is returned, which does not
+        compress. The driver itself uses it, e.g. by info_query.
+        """
+        if args or kwargs:
+            return super().cursor(*args, **kwargs)
+        ourcursor = self._cursor_class(
+            self, fetch_chunk_size=fetch_chunk_size, index_size=index_size,
+            cache_size=cache_size)
+        self._custom_cursors.add(ourcursor)
+        # queried before the cursor may leave a result unread
+        self.table_namespace()
+        return ourcursor
+
+    def commit(self):
+        """Save the compression state of the tables inserted by the
+        cursors, then commit and add the partitions ahead of the points
+        committed"""
+        for ourcursor in list(self._custom_cursors):
+            if ourcursor._connection is not None:
+                ourcursor.checkpoint()
+        super().commit()
+        for ourcursor in list(self._custom_cursors):
+            if ourcursor._connection is not None:
+                ourcursor._add_partitions_ahead()
+
+    def rollback(self):
+        """Roll back, then restore the compression state of the tables
+        inserted by the cursors from the last commit"""
+        super().rollback()
+        for ourcursor in list(self._custom_cursors):
+            if ourcursor._connection is not None:
+                ourcursor._restore_inserted_tables()
+
+
+class Connection(BaseConnection, MySQLConnection):
+    """Connection of the pure Python driver"""
+    _cursor_class = Cursor
+
+
+if CMySQLConnection is not None:
+    class CConnection(BaseConnection, CMySQLConnection):
+        """Connection of the C extension driver"""
+        _cursor_class = CCursor
+else:
+    CConnection = None
 
 
-class Connection(MySQLConnection):
-    def cursor(self, *args, **kwargs):
-        return Cursor(self)
+def connect(*args, use_pure: bool = True, **kwargs):
+    """Connection of the pure Python driver, or of the C extension if
+    use_pure is False"""
+    if use_pure:
+        return Connection(*args, **kwargs)
+    if CConnection is None:
+        raise ImportError("MySQL Connector/Python C Extension not available")
+    return CConnection(*args, **kwargs)
@@ -1,21 +1,107 @@
+import concurrent.futures
 import datetime
+import functools
+import heapq
+import itertools
 import re
-from typing import Dict, List, Optional
-
-from mysql.connector.cursor import MySQLCursor
-
-from .compression import Compression
-from .data_structure import DataPoint
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from mysql.connector.cursor import MySQLCursor, MySQLCursorPrepared
+from mysql.connector.errors import InterfaceError
+
+from .compression import (EPOCH, MICROSECOND, Compression, aggregate_values,
+                          aligned_rows, envelope_may_meet, new_compression,
+                          segment_envelope, segment_envelopes, value_mask)
+from .data_structure import (ArchievedIndex, ChunkBuffer, DataPoint,
+                             ResultCache, RollupBuffer)
+from .registry import TableRegistry, compressor_registry
 from .settings import Config
-from . import stmt_parser
-
-
-class Cursor(MySQLCursor):
-    def __init__(self, connection=None):
+from . import chunk, partition, rollup, stmt_parser
+
+try:
+    import pandas as pd
+except ImportError:  # pandas is only required by fetch_dataframe
+    pd = None
+try:
+    from mysql.connector.connection_cext import CMySQLConnection
+    from mysql.connector.cursor_cext import CMySQLCursor, CMySQLCursorPrepared
+except ImportError:  # the C extension is only required by use_pure=False
+    CMySQLConnection = CMySQLCursor = CMySQLCursorPrepared = None
+
+
+class BaseCursor:
+    """Compression of the cursor, mixed with the cursor of a driver,
+    see Cursor and CCursor"""
+    def __init__(self, connection=None, fetch_chunk_size: int = None,
+                 index_size: int = None, cache_size: int = None):
         super().__init__(connection)
+        self.fetch_chunk_size = fetch_chunk_size or Config.FETCH_CHUNK_SIZE
+        # max number of archived points kept in memory per table,
+        # 0 to disable the in-memory index
+        self.index_size = (Config.INDEX_SIZE if index_size is None
+                           else index_size)
         self._select_flag = False
         self._selected_row_generator = None
-        self.compression_dict: Dict[str, Compression] = {}
+        self._selected_array_loader = None
+        # cursor reading the archived rows of the select, self or
+        # one of self._prepared_cursors
+        self._selected_cursor: MySQLCursor = self
+        # LRU of prepared statements of archived-point writes and
+        # boundary lookups, keyed by the statement
+        self._prepared_cursors: Dict[str, tuple] = OrderedDict()
+        # tables inserted by this cursor, whose state is saved by
+        # checkpoint and open chunks are saved when closing
+        self._inserted_tables = set()
+        self._has_state_table = False
+        # connections of select_parallel
+        self._parallel_connections = []
+        # partitions of the last select_parallel, which may still use
+        # the connections
+        self._parallel_futures = []
+        # columns of the values of select_aligned, see fetch_dataframe
+        self._aligned_table_names = []
+        # max number of results of the LRU cache of range selects,
+        # 0 to disable the cache
+        self.cache_size = (Config.CACHE_SIZE if cache_size is None
+                           else cache_size)
+
+    @property
+    def _tables(self) -> TableRegistry:
+        """compression, partitions and open chunks of the tables of the
+        current database, shared by every cursor, see
+        registry.CompressorRegistry"""
+        return compressor_registry.tables(self._connection.table_namespace())
+
+    @property
+    def result_cache(self) -> Optional[ResultCache]:
+        """cache of range select results of the tables of the current
+        database, shared by every cursor, None if disabled"""
+        if not self.cache_size:
+            return None
+        return self._tables.cache(self.cache_size)
+
+    @property
+    def compression_dict(self) -> Dict[str, Compression]:
+        return self._tables.compressions
+
+    @property
+    def partition_dict(self) -> Dict[str, Optional[tuple]]:
+        return self._tables.partitions
+
+    @property
+    def envelope_dict(self) -> Dict[str, bool]:
+        return self._tables.envelopes
+
+    @property
+    def chunk_dict(self) -> Dict[str, ChunkBuffer]:
+        return self._tables.chunk_buffers
+
+    @property
+    def rollup_dict(self) -> Dict[str, RollupBuffer]:
+        return self._tables.rollup_buffers
 
     def execute(self, operation: str, params=None, multi=False):
         if not operation:
@@ -25,15 +111,21 @@ class Cursor(MySQLCursor):
             raise Exception("Cursor is not connected")
 
         stmt = stmt_parser.preprocessing(operation)
+        stmt_type = stmt_parser.classify(stmt)
 
+        self._discard_selected_rows()
         self._select_flag = False
-        if 'insert' in stmt:
-            return self._custom_insert(stmt)
-        elif 'select' in stmt:
+        self._selected_array_loader = None
+        if stmt_type == 'insert':
+            return self._custom_insert(stmt, params)
+        elif stmt_type == 'select':
             self._select_flag = True
-            return self._custom_select(stmt)
-        elif 'create table' in stmt:
+            return self._custom_select(stmt, params)
+        elif stmt_type == 'create table':
             return self._custom_create_table(stmt)
+        elif stmt_type == 'use':
+            return self._connection.cmd_init_db(
+                stmt_parser.parse_use(operation))
         else:
             return super().execute(operation, params, multi)
 
@@ -43,68 +135,389 @@ class Cursor(MySQLCursor):
         else:
             return super().fetchone()
 
+    def fetchmany(self, size: int = None):
+        if self._select_flag:
+            return self._custom_fetchmany(size)
+        else:
+            return super().fetchmany(size)
+
     def fetchall(self):
         if self._select_flag:
             return self._custom_fetchall()
         else:
             return super().fetchall()
 
-    def _custom_insert(self, stmt: str):
-        """Handle insert statement if need compression
+    def close(self):
+        if self._connection and self._inserted_tables:
+            self._save_inserted_tables()
+        self._inserted_tables.clear()
+        for _, prepared_cursor in self._prepared_cursors.values():
+            prepared_cursor.close()
+        self._prepared_cursors.clear()
+        self._wait_parallel_selects(cancel=True)
+        for connection in self._parallel_connections:
+            connection.close()
+        self._parallel_connections.clear()
+        return super().close()
+
+    def _save_inserted_tables(self):
+        """Save the open chunks and the state of the tables inserted by
+        the cursor"""
+        self._discard_selected_rows()
+        for table_name in self._inserted_tables & self.chunk_dict.keys():
+            with self._tables.lock(table_name):
+                self._save_chunks(
+                    table_name, [self.chunk_dict[table_name].pop_points()])
+        self.checkpoint()
+        self._inserted_tables.clear()
+
+    def _restore_inserted_tables(self):
+        """Called by the connection after rolling back, the state of the
+        tables inserted by the cursor is restored from the last commit,
+        as the archived points after it are gone"""
+        self._discard_selected_rows()
+        for table_name in self._inserted_tables:
+            with self._tables.lock(table_name):
+                self._tables.discard(table_name)
+                self._restore_state(table_name)
+        self._inserted_tables.clear()
+
+    def _leave_database(self):
+        """Called by the connection before changing the current
+        database, whose tables the cursor stops using"""
+        if self._inserted_tables:
+            self._save_inserted_tables()
+        self._has_state_table = False
+
+    def executemany(self, operation: str, seq_params):
+        """Execute the operation with every parameters in seq_params
+
+        INSERT statements are fed through the compression as one batch,
+        and the archived points are written back by multi-row INSERTs.
+        seq_params should be a sequence of (timestamp, value), and
+        timestamp can be datetime.datetime or 'Y-m-d H:M:S' string.
+        For example,
+        executemany("INSERT INTO voltage (timestamp, value) VALUES (%s, %s)",
+                    [('2022-06-02 21:17:01', 3.5),
+                     ('2022-06-02 21:17:02', 3.6)])
+        """
+        if not operation or not seq_params:
+            return None
 
-        1. Parse table name, first two column names
-        2. Call compression insert_checkout
-        3. If return value is not None, save the return value
-           to database
+        stmt = stmt_parser.preprocessing(operation)
+
+        self._discard_selected_rows()
+        if stmt_parser.classify(stmt) != 'insert':
+            self._select_flag = False
+            return super().executemany(operation, seq_params)
+
+        self._select_flag = False
+        template = stmt_parser.parse_insert_template(stmt)
+
+        points = [DataPoint(stmt_parser.to_datetime(time_stamp), float(val))
+                  for time_stamp, val in seq_params]
+
+        self._insert_points(template.table_name, points)
+
+    def fetch_numpy(self):
+        """Fetch the selected rows as numpy arrays
+
+        return: tuple of timestamps (datetime64[us]) and values (float64)
+
+        If no row was fetched by fetchone yet, the whole result is
+        reconstructed by array operations instead of point by point.
         """
-        table_name = re.search(r"into\s(\w+)\s", stmt).group(1)
+        if not self._select_flag:
+            raise InterfaceError("No result set to fetch from.")
 
-        col_time = 'timestamp'
-        col_value = 'value'
+        if self._selected_array_loader:
+            array_loader = self._selected_array_loader
+            self._selected_array_loader = None
+            self._selected_row_generator = (_ for _ in [])
+            return array_loader()
+
+        result = self._custom_fetchall()
+        timestamps = np.array([row[0] for row in result],
+                              dtype='datetime64[us]')
+        values = np.array([row[1] for row in result], dtype=np.float64)
+        return timestamps, values
 
+    def fetch_dataframe(self):
+        """Fetch the selected rows as pandas.DataFrame
+
+        columns: timestamp, value, or timestamp and the table names after
+            select_aligned
+        """
+        if pd is None:
+            raise ImportError("pandas is required by fetch_dataframe")
+
+        timestamps, values = self.fetch_numpy()
+        if values.ndim == 2:
+            # select_aligned, a column for every table
+            return pd.DataFrame(
+                {'timestamp': timestamps,
+                 **{table_name: values[:, idx] for idx, table_name
+                    in enumerate(self._aligned_table_names)}})
+        return pd.DataFrame({'timestamp': timestamps, 'value': values})
+
+    def _custom_insert(self, stmt: str, params=None):
+        """Handle insert statement if need compression
+
+        1. Parse table name, first two column names
+        2. Call compression insert_checkout for every row
+        3. Save the points returned by insert_checker to database
+           with one multi-row INSERT
+        """
         # Ryan
         # parse the value of timestamp and value
         # format of timestamp: '2022-06-02 21:17:01'
-        # val_pattern = r"values\s+?\('((\w+-*)+\s(\w+:*)+)',\s?(\W?\w+)\)"
-        val_pattern = r"values\s+?\('((\w+-*)+\s(\w+:*)+)',\s?(-?\d+(.\d+)?)\)"
-        matched = re.search(val_pattern, stmt)
+        # multiple rows are allowed:
+        # VALUES ('2022-06-02 21:17:01', 3.5), ('2022-06-02 21:17:02', 3.6)
+        # or with params, where timestamp can also be datetime:
+        # VALUES (%s, %s), (%s, %s)
+        template, rows = stmt_parser.parse_insert(stmt, params or None)
 
-        if not matched:
+        if not rows:
             raise Exception("Insertion should only contain two values")
 
-        time_stamp = matched.group(1)
-        val = float(matched.group(4))
-        input_time = datetime.datetime.strptime(
-            time_stamp, "%Y-%m-%d %H:%M:%S")
+        points = [
+            DataPoint(stmt_parser.to_datetime(time_stamp), float(val))
+            for time_stamp, val in rows
+        ]
+        self._insert_points(template.table_name, points)
 
-        test_point = DataPoint(input_time, val)
+    def _insert_points(self, table_name: str, points: List[DataPoint]):
+        """Run points through the compression of the table and save
+        the archived ones
 
-        if table_name not in self.compression_dict.keys():
-            comp = Compression(dev_margin=Config.DEV_MARGIN,
-                               archieved_point=test_point)
-            self.compression_dict[table_name] = comp
-            point_to_be_saved = test_point
-        else:
-            comp = self.compression_dict[table_name]
-            point_to_be_saved = comp.insert_checker(test_point)
-
-        if point_to_be_saved:
-            sql = (f"INSERT INTO {table_name}({col_time}, {col_value})"
-                   f"VALUES (%s, %s);")
-            super().execute(sql, (point_to_be_saved.strftime(), point_to_be_saved.value))
+        The lock of the table is held, so points inserted by other
+        threads are compressed and saved before or after them.
+        """
+        comp = self._compression(table_name)
+        self._inserted_tables.add(table_name)
+
+        with self._tables.lock(table_name):
+            # the start of the segment ending at the first saved point
+            archieved_before = comp.buffer.archieved_point
+            points_to_be_saved = comp.insert_points(points)
+
+            rollup_buffer = self.rollup_dict.get(table_name)
+            if rollup_buffer:
+                rollup_buffer.push_points(points)
+                self._save_rollups(table_name, rollup_buffer.pop_buckets())
+
+            if table_name in self.chunk_dict:
+                self._save_chunks(table_name, self.chunk_dict[table_name]
+                                  .push_points(points_to_be_saved))
+            else:
+                envelopes = None
+                if self._has_envelope(table_name):
+                    envelopes = segment_envelopes(
+                        archieved_before, points_to_be_saved,
+                        comp.time_step_at)
+                self._save_points(table_name, points_to_be_saved, envelopes)
+            self._tables.add_archieved_points(table_name, points_to_be_saved)
+
+    def _add_partitions_ahead(self):
+        """Split the future partition of the partitioned tables inserted
+        by the cursor, so that Config.PARTITION_MARGIN partitions are
+        left after the latest archived point
+
+        Called by Connection.commit after committing, as ALTER TABLE
+        commits implicitly and waits for the transactions using the
+        table, so it never runs within an INSERT. Points later than the
+        partitions are kept by the future partition until then.
+        """
+        for table_name in self._inserted_tables.difference(
+                self.chunk_dict):
+            if table_name not in self.partition_dict:
+                self._discard_selected_rows()
+                self.partition_dict[table_name] = self._load_partition(
+                    table_name)
+            with self._tables.lock(table_name):
+                comp = self.compression_dict.get(table_name)
+                if (not self.partition_dict.get(table_name) or comp is None
+                        or comp.buffer.archieved_point is None):
+                    continue
+                period, partition_bound = self.partition_dict[table_name]
+                time_last = partition.periods_after(
+                    comp.buffer.archieved_point.timestamp, period,
+                    Config.PARTITION_MARGIN)
+                if partition_bound and time_last < partition_bound:
+                    continue
+                definitions, new_bound = partition.partition_definitions(
+                    partition_bound or comp.buffer.archieved_point.timestamp,
+                    time_last, period)
+                # other cursors do not split the same partitions
+                self.partition_dict[table_name] = (period, new_bound)
+
+            future_name = partition.future_partition_name(period)
+            definitions.append(
+                f"PARTITION {future_name} VALUES LESS THAN (MAXVALUE)")
+            self._discard_selected_rows()
+            try:
+                super().execute(f"ALTER TABLE {table_name} "
+                                f"REORGANIZE PARTITION {future_name} INTO "
+                                f"({', '.join(definitions)})")
+            except Exception:
+                # loaded from information_schema by the next commit
+                self.partition_dict.pop(table_name, None)
+                raise
+
+    def _load_partition(self, table_name: str) -> Optional[tuple]:
+        """Get (period, upper bound of the last partition) of a table
+        from information_schema"""
+        super().execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name, ))
+        names = [row[0] for row in super().fetchall()]
+        return partition.parse_partition_names(names)
+
+    def _save_points(self, table_name: str, points: List[DataPoint],
+                     envelopes: List[tuple] = None):
+        """Write archived points with multi-row INSERT
+
+        At most Config.INSERT_BATCH_SIZE points are sent by one statement.
+        envelopes: (segment_min, segment_max) of every point, None if
+            the table has no such columns
+        """
+        col_time = 'timestamp'
+        col_value = 'value'
+        columns = f"{col_time}, {col_value}"
+        row_placeholders = "(%s, %s)"
+        if envelopes is not None:
+            columns += ", segment_min, segment_max"
+            row_placeholders = "(%s, %s, %s, %s)"
+
+        batch_size = Config.INSERT_BATCH_SIZE
+        for idx_start in range(0, len(points), batch_size):
+            batch = points[idx_start:idx_start + batch_size]
+            placeholders = ", ".join([row_placeholders] * len(batch))
+            sql = (f"INSERT INTO {table_name}({columns}) "
+                   f"VALUES {placeholders};")
+            params = []
+            for idx, pnt in enumerate(batch, idx_start):
+                params.extend((pnt.timestamp, pnt.value))
+                if envelopes is not None:
+                    params.extend(envelopes[idx])
+            self._execute_prepared(sql, params)
+
+    def _has_envelope(self, table_name: str) -> bool:
+        """Whether the table has the segment_min and segment_max
+        columns, looked up in information_schema once"""
+        if table_name not in self.envelope_dict:
+            super().execute(
+                "SELECT COUNT(*) FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+                "AND COLUMN_NAME IN ('segment_min', 'segment_max')",
+                (table_name, ))
+            rows = super().fetchall()
+            self.envelope_dict[table_name] = bool(rows and rows[0][0] == 2)
+        return self.envelope_dict[table_name]
+
+    def _save_chunks(self, table_name: str,
+                     chunks_points: List[List[DataPoint]]):
+        """Write the points of every closed chunk as a BLOB row"""
+        for points in chunks_points:
+            if not points:
+                continue
+            self._execute_prepared(
+                f"INSERT INTO {table_name} "
+                "(chunk_start, chunk_end, num_points, data) "
+                "VALUES (%s, %s, %s, %s)",
+                [points[0].timestamp, points[-1].timestamp, len(points),
+                 chunk.encode(points)])
+
+    def _save_rollups(self, table_name: str,
+                      level_buckets: Dict[str, List[tuple]]):
+        """Merge the bucket summaries of every level into the rollup
+        tables, at most Config.INSERT_BATCH_SIZE buckets by one
+        statement"""
+        batch_size = Config.INSERT_BATCH_SIZE
+        for level, buckets in level_buckets.items():
+            for idx_start in range(0, len(buckets), batch_size):
+                batch = buckets[idx_start:idx_start + batch_size]
+                params = []
+                for bucket in batch:
+                    params.extend(bucket)
+                self._execute_prepared(
+                    rollup.stmt_upsert(table_name, level, len(batch)),
+                    params)
+
+    def _execute_prepared(self, stmt: str, params: list) -> MySQLCursor:
+        """Execute stmt with params by a server-side prepared statement
+
+        The statement is prepared once and kept while it is one of the
+        last Config.PREPARED_STMT_CACHE_SIZE statements executed.
+        If the size is 0, stmt is executed by this cursor instead.
+        return: the cursor executing stmt
+        """
+        if not Config.PREPARED_STMT_CACHE_SIZE:
+            super().execute(stmt, params)
+            return self
 
-    def _custom_select(self, stmt: str):
+        if stmt in self._prepared_cursors:
+            self._prepared_cursors.move_to_end(stmt)
+        else:
+            if len(self._prepared_cursors) >= Config.PREPARED_STMT_CACHE_SIZE:
+                _, (_, oldest_cursor) = self._prepared_cursors.popitem(
+                    last=False)
+                oldest_cursor.close()
+            self._prepared_cursors[stmt] = (
+                stmt, self._prepared_cursor_class(self._connection))
+        # the statement is prepared again if it is not the same object
+        # executed last time
+        stmt_prepared, prepared_cursor = self._prepared_cursors[stmt]
+        prepared_cursor.execute(stmt_prepared, params)
+        return prepared_cursor
+
+    def _custom_select(self, stmt: str, params=None):
         """
 
         store interpolated result from select_interpolation to
         self._selected_row_generator
+
+        The stmt is parsed by its template, see stmt_parser.select_template
+        for the supported cases. The times can be given by params, e.g.
+        WHERE timestamp >= %s AND timestamp <= %s
+        A range can be downsampled by STEP, e.g. STEP '15 minute'
+        A range can be filtered by value, e.g. AND value > 250
         """
-        if ("<" in stmt
-                or ">" in stmt
-                or "where" not in stmt):
-            self._handle_select_many(stmt)
+        template, times = stmt_parser.parse_select(stmt, params or None)
+        time_start, time_end = [
+            stmt_parser.to_datetime(times[position])
+            if position is not None else None
+            for position in (template.position_start, template.position_end)
+        ]
+        if template.aggregates and template.is_select_one:
+            self._handle_select_one(template.table_name, time_start)
+            result_row = aggregate_values(
+                [row[1] for row in self._selected_row_generator],
+                template.aggregates)
+            self._selected_array_loader = None
+            self._selected_row_generator = (x for x in (result_row, ))
+        elif template.aggregates:
+            self._handle_select_aggregate(
+                template.table_name, template.aggregates, time_start,
+                time_end)
+        elif template.is_select_one:
+            self._handle_select_one(template.table_name, time_start)
+        elif template.step:
+            self._handle_select_downsampled(
+                template.table_name, time_start, time_end,
+                step=template.step, mode=template.downsample_mode)
+        elif template.value_conditions:
+            value_conditions = [
+                (operator,
+                 float(times[position]) if position is not None else literal)
+                for operator, position, literal in template.value_conditions]
+            self._handle_select_value(template.table_name, time_start,
+                                      time_end, value_conditions)
         else:
-            self._handle_select_one(stmt)
+            # The cases (no point before time_start or after time_end)
+            # are handled by compression._select_many
+            self._select_range(template.table_name, time_start, time_end)
 
     def _custom_create_table(self, stmt: str):
         """
@@ -117,43 +530,442 @@ class Cursor(MySQLCursor):
             timestamp DATETIME,
             value DOUBLE dev_margin=2.5
         );
+
+        An index on (timestamp, value) is added to the table, and the
+        columns segment_min and segment_max, the bounds of the values
+        reconstructed between an archived point and the previous one,
+        see _handle_select_value. The table
+        can also be partitioned by time with partition_by=day/month/year,
+        for example,
+            value DOUBLE dev_margin=2.5 partition_by=month
+        then the primary key is extended with timestamp, which is
+        required by MySQL.
+
+        With storage=chunk, the archived points are packed by
+        connector.chunk into one BLOB row per Config.CHUNK_SECONDS,
+        and the columns of the statement are replaced by those of the
+        chunks.
+
+        With rollup=minute/hour/day, or levels joined by '+' like
+        rollup=minute+day, the count, sum, min, max, first and last of
+        the inserted values of every bucket are kept in the table
+        <table>_rollup_<level>.
+
+        The compression engine is chosen by compressor=swinging_door
+        (default) or compressor=pla, and a dead-band filter ahead of it
+        by deadband=xxx, see compression.ENGINES and
+        Compression.insert_points.
+
+        With max_gap=xxx (seconds, default Config.MAX_GAP), a longer gap
+        between two inserted points is saved as a break marker of value
+        NULL, and nothing is reconstructed across it, so value should be
+        nullable.
+
+        The compression state is registered only after the table is
+        created, CREATE TABLE IF NOT EXISTS of an existing table keeps
+        its state.
         """
         stmt_preprocess = stmt_parser.preprocessing(stmt)
-        table_name = re.search(r"table\s(\w+)", stmt_preprocess).group(1)
+        table_name = re.search(r"table\s(?:if not exists\s)?(\w+)",
+                               stmt_preprocess).group(1)
 
-        dev_pattern = r"dev_margin\s?=\s?(\d+(.\d+)?)"
+        dev_pattern = r"dev_margin\s?=\s?(\d+(\.\d+)?)"
         dev_match = re.search(dev_pattern, stmt_preprocess)
         if not dev_match:
             return super().execute(stmt_preprocess)
 
         dev_value = float(dev_match.group(1))
-        self._create_dev_margin_table_if_not_exists()
-        self._insert_dev_margin(table_name, dev_value)
-        self.compression_dict[table_name] = Compression(
-            dev_margin=dev_value)
-
         modified_stmt = (stmt_preprocess[:dev_match.start()] +
                          stmt_preprocess[dev_match.end():])
+
+        partition_pattern = r"partition_by\s?=\s?(\w+)"
+        partition_match = re.search(partition_pattern, modified_stmt)
+        if partition_match:
+            modified_stmt = (modified_stmt[:partition_match.start()] +
+                             modified_stmt[partition_match.end():])
+            if partition_match.group(1) not in partition.PERIODS:
+                error_message = (f"partition_by should be one of "
+                                 f"{partition.PERIODS}, "
+                                 f"get {partition_match.group(1)}")
+                raise ValueError(error_message)
+
+        storage_pattern = r"storage\s?=\s?(row|chunk)"
+        storage_match = re.search(storage_pattern, modified_stmt)
+        if storage_match:
+            modified_stmt = (modified_stmt[:storage_match.start()] +
+                             modified_stmt[storage_match.end():])
+        is_chunk_storage = bool(
+            storage_match and storage_match.group(1) == 'chunk')
+
+        compressor_pattern = r"compressor\s?=\s?(\w+)"
+        compressor_match = re.search(compressor_pattern, modified_stmt)
+        if compressor_match:
+            modified_stmt = (modified_stmt[:compressor_match.start()] +
+                             modified_stmt[compressor_match.end():])
+        deadband_pattern = r"deadband\s?=\s?(\d+(\.\d+)?)"
+        deadband_match = re.search(deadband_pattern, modified_stmt)
+        if deadband_match:
+            modified_stmt = (modified_stmt[:deadband_match.start()] +
+                             modified_stmt[deadband_match.end():])
+        max_gap_pattern = r"max_gap\s?=\s?(\d+(\.\d+)?)"
+        max_gap_match = re.search(max_gap_pattern, modified_stmt)
+        if max_gap_match:
+            modified_stmt = (modified_stmt[:max_gap_match.start()] +
+                             modified_stmt[max_gap_match.end():])
+        max_gap = (float(max_gap_match.group(1)) if max_gap_match
+                   else Config.MAX_GAP)
+        if max_gap and not is_chunk_storage:
+            # a break marker in a shorter gap could be rounded onto the
+            # next point, see Compression._break_run
+            fsp_match = re.search(
+                r"\btimestamp\s(?:datetime|timestamp)(?:\s?\((\d)\))?",
+                modified_stmt)
+            fsp = (int(fsp_match.group(1))
+                   if fsp_match and fsp_match.group(1) else 0)
+            precision = 10 ** -fsp
+            if max_gap < precision:
+                error_message = (f"max_gap should be at least {precision} "
+                                 "seconds, the precision of timestamp, "
+                                 f"get {max_gap}")
+                raise ValueError(error_message)
+        comp = new_compression(
+            compressor_match.group(1) if compressor_match
+            else Compression.ENGINE, dev_value,
+            float(deadband_match.group(1)) if deadband_match else 0.0,
+            max_gap=(datetime.timedelta(seconds=max_gap) if max_gap
+                     else None))
+
+        rollup_pattern = r"rollup\s?=\s?([a-z+]+)"
+        rollup_match = re.search(rollup_pattern, modified_stmt)
+        rollup_buffer = None
+        if rollup_match:
+            modified_stmt = (modified_stmt[:rollup_match.start()] +
+                             modified_stmt[rollup_match.end():])
+            rollup_levels = rollup.parse_levels(rollup_match.group(1))
+            rollup_buffer = RollupBuffer(
+                {level: rollup.LEVELS[level] for level in rollup_levels})
+
+        if is_chunk_storage and partition_match:
+            raise NotImplementedError(
+                "partition_by is not support with storage=chunk")
+
+        # the compression state of an existing table is kept
+        if (stmt_preprocess.startswith("create table if not exists")
+                and self._table_exists(table_name)):
+            return None
+
+        partition_state = None
+        if is_chunk_storage:
+            modified_stmt = (
+                f"CREATE TABLE {table_name} ("
+                "chunk_start DATETIME(6) NOT NULL PRIMARY KEY, "
+                "chunk_end DATETIME(6) NOT NULL, "
+                "num_points INT NOT NULL, "
+                "data MEDIUMBLOB NOT NULL)")
+        else:
+            modified_stmt = stmt_parser.append_create_definitions(
+                modified_stmt.rstrip().rstrip(';'),
+                ["segment_min DOUBLE", "segment_max DOUBLE",
+                 "index idx_timestamp_value (timestamp, value)"])
+        if partition_match:
+            period = partition_match.group(1)
+            # created ahead, points are not saved within ALTER TABLE
+            time_now = datetime.datetime.now()
+            stmt_partition, partition_bound = partition.stmt_partition_by(
+                period, time_now, partition.periods_after(
+                    time_now, period, Config.PARTITION_MARGIN))
+            modified_stmt = (
+                stmt_parser.primary_key_with_timestamp(modified_stmt)
+                + " " + stmt_partition)
+            partition_state = (period, partition_bound)
+
+        # nothing is registered if the table cannot be created
         super().execute(modified_stmt)
+        if rollup_buffer:
+            for level in rollup_buffer.level_sizes:
+                super().execute(rollup.stmt_create_table(table_name, level))
+                # buckets of a table of the same name dropped before
+                super().execute(rollup.stmt_clear_table(table_name, level))
+
+        self._tables.register(
+            table_name, comp,
+            chunk_buffer=(ChunkBuffer(Config.CHUNK_SECONDS)
+                          if is_chunk_storage else None),
+            partition=partition_state, rollup_buffer=rollup_buffer)
+        if not is_chunk_storage:
+            self.envelope_dict[table_name] = True
+        with self._tables.lock(table_name):
+            state = self._state_row(table_name)
+        self._save_states([state])
+        # CREATE TABLE committed the transaction implicitly, so is the
+        # state of the table
+        super().execute("COMMIT")
+        return None
+
+    def _table_exists(self, table_name: str) -> bool:
+        """Whether the table is in the current database"""
+        super().execute(
+            "SELECT COUNT(*) FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name, ))
+        rows = super().fetchall()
+        return bool(rows and rows[0][0])
+
+    def migrate_table(self, table_name: str, partition_by: str = None):
+        """Add the index of CREATE TABLE to a table created before
+
+        If partition_by (day/month/year) is given, the table is also
+        partitioned by time, and timestamp is added to the primary key.
+        """
+        self._discard_selected_rows()
+        self._select_flag = False
+
+        super().execute(f"SHOW INDEX FROM {table_name} "
+                        "WHERE Key_name = 'idx_timestamp_value'")
+        if not super().fetchall():
+            super().execute(f"ALTER TABLE {table_name} "
+                            "ADD INDEX idx_timestamp_value (timestamp, value)")
+
+        if not partition_by:
+            return
+
+        super().execute(
+            "SELECT COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+            "AND CONSTRAINT_NAME = 'PRIMARY' ORDER BY ORDINAL_POSITION",
+            (table_name, ))
+        key_columns = [row[0] for row in super().fetchall()]
+        if key_columns and 'timestamp' not in key_columns:
+            key_columns.append('timestamp')
+            super().execute(f"ALTER TABLE {table_name} DROP PRIMARY KEY, "
+                            f"ADD PRIMARY KEY ({', '.join(key_columns)})")
+
+        super().execute(
+            f"SELECT MIN(timestamp), MAX(timestamp) FROM {table_name}")
+        time_min, time_max = super().fetchall()[0]
+        stmt_partition, partition_bound = partition.stmt_partition_by(
+            partition_by, time_min, time_max)
+        super().execute(f"ALTER TABLE {table_name} {stmt_partition}")
+        self.partition_dict[table_name] = (partition_by, partition_bound)
+
+    def select_downsampled(self, table_name: str,
+                           time_start: datetime.datetime = None,
+                           time_end: datetime.datetime = None,
+                           step: datetime.timedelta = None,
+                           max_points: int = None, mode: str = 'linear'):
+        """Select a time range reconstructed on a coarser grid
+
+        Either step or max_points should be given, see
+        Compression.select_downsampled for the modes.
+        The rows are fetched by fetchall, fetch_numpy, etc.
+        """
+        self._discard_selected_rows()
+        self._select_flag = False
+        self._selected_array_loader = None
+        self._handle_select_downsampled(table_name, time_start, time_end,
+                                        step, max_points, mode)
+        self._select_flag = True
+
+    def select_aligned(self, table_names: List[str],
+                       time_start: datetime.datetime,
+                       time_end: datetime.datetime,
+                       step: datetime.timedelta):
+        """Select a time range of several tables reconstructed on the
+        common grid time_start + k * step
+
+        The archived points of all tables are streamed together in time
+        order and interpolated in one pass, see
+        compression.aligned_rows. Every row is the time of the grid
+        followed by the value of every table, None where the table has
+        no point around the time.
+        The rows are fetched by fetchall, fetchmany, etc. fetch_numpy
+        gives values of shape (number of rows, number of tables) with
+        NaN for None.
+        """
+        if not time_start or not time_end:
+            raise ValueError("time_start and time_end should be given")
+        if step <= datetime.timedelta(0):
+            error_message = f"step should be positive, get {step}"
+            raise ValueError(error_message)
+        self._discard_selected_rows()
+        self._select_flag = False
+        self._selected_array_loader = None
+
+        events = self._aligned_events(table_names, time_start, time_end)
+        rows = aligned_rows(time_start, time_end, step, events,
+                            len(table_names))
+        self._aligned_table_names = list(table_names)
+        self._selected_row_generator = rows
+        self._selected_array_loader = functools.partial(
+            _aligned_arrays, rows, len(table_names))
+        self._select_flag = True
+
+    def _aligned_events(self, table_names: List[str],
+                        time_start: datetime.datetime,
+                        time_end: datetime.datetime):
+        """Archived points of the tables as (timestamp, index of the
+        table, value) in time order, see _select_archieved_points
+
+        The rows of the tables without the points in memory are
+        selected by one UNION ALL sorted by the server, and read by
+        chunks. Only the archived points of chunk tables are read first.
+        return: iterator of the merged points
+        """
+        streams, row_tables = [], []
+        for series, table_name in enumerate(table_names):
+            comp = self._compression(table_name)
+            points = self._indexed_archieved_points(table_name, time_start,
+                                                    time_end)
+            if points is None and table_name in self.chunk_dict:
+                points = list(self._select_chunk_points(
+                    table_name, time_start, time_end))
+            if points is None:
+                row_tables.append((series, table_name))
+            else:
+                streams.append([(pnt.timestamp, series, pnt.value)
+                                for pnt in points])
+            # ignored by aligned_rows if a point after time_end is saved
+            snapshot_point = comp.buffer.snapshot_point
+            if snapshot_point:
+                streams.append([(snapshot_point.timestamp, series,
+                                 snapshot_point.value)])
+
+        if row_tables:
+            self._selected_cursor = self._execute_prepared(
+                *self._stmt_select_aligned(row_tables, time_start,
+                                           time_end))
+            streams.append(self._rows_from_fetchmany(self._selected_cursor))
+        return heapq.merge(*streams)
+
+    def _stmt_select_aligned(self, row_tables: List[Tuple[int, str]],
+                             time_start: datetime.datetime,
+                             time_end: datetime.datetime) -> tuple:
+        """UNION ALL of _stmt_select_with_boundaries of the tables,
+        sorted by time, with the index of the table of every row
+
+        row_tables: (index, table name) of the tables
+        return: the statement and its params
+        """
+        selects, params = [], []
+        for series, table_name in row_tables:
+            stmt_where, params_where = self._where_with_boundaries(
+                table_name, time_start, time_end)
+            selects.append(f"SELECT timestamp, {series} AS series, value "
+                           f"FROM {table_name}{stmt_where}")
+            params.extend(params_where)
+        return (" UNION ALL ".join(selects)
+                + " ORDER BY timestamp, series"), params
+
+    def select_parallel(self, table_name: str,
+                        time_start: datetime.datetime,
+                        time_end: datetime.datetime, connect: Callable,
+                        num_partitions: int = None):
+        """Select a long time range by partitions in parallel
+
+        The range is split into num_partitions time slices. The archived
+        points of every slice are selected over a connection of its own
+        and reconstructed by a thread, see
+        Compression.select_partition_array. The connections are got from
+        connect once and kept by the cursor.
+        The rows are fetched by fetchall, fetch_numpy, etc. in order,
+        the same as a range SELECT.
+        """
+        num_partitions = num_partitions or Config.PARALLEL_PARTITIONS
+        self._discard_selected_rows()
+        self._select_flag = False
+        self._selected_array_loader = None
+        if not time_start or not time_end or num_partitions < 2:
+            self._select_range(table_name, time_start, time_end)
+            self._select_flag = True
+            return
+
+        # resolved here, the threads do not read the registry
+        comp = self._compression(table_name)
+        while len(self._parallel_connections) < num_partitions:
+            self._parallel_connections.append(connect())
+        time_cuts = ([None]
+                     + [time_start + (time_end - time_start) * idx
+                        / num_partitions for idx in range(1, num_partitions)]
+                     + [None])
+        open_points = None
+        if table_name in self.chunk_dict:
+            with self._tables.lock(table_name):
+                open_points = self.chunk_dict[table_name].points[:]
+
+        executor = concurrent.futures.ThreadPoolExecutor(num_partitions)
+        futures = [
+            executor.submit(self._select_partition, connection, table_name,
+                            comp, [time_start, time_end], time_cuts[idx],
+                            time_cuts[idx + 1], open_points)
+            for idx, connection
+            in enumerate(self._parallel_connections[:num_partitions])]
+        executor.shutdown(wait=False)
+        self._parallel_futures = futures
+
+        self._selected_array_loader = lambda: tuple(
+            np.concatenate(arrays)
+            for arrays in zip(*(future.result() for future in futures)))
+        self._selected_row_generator = (
+            row for future in futures
+            for row in zip(future.result()[0].tolist(),
+                           future.result()[1].tolist()))
+        self._select_flag = True
+
+    def _select_partition(self, connection, table_name: str,
+                          comp: Compression, specified_time: list,
+                          time_cut_start: Optional[datetime.datetime],
+                          time_cut_end: Optional[datetime.datetime],
+                          open_points: Optional[List[DataPoint]]):
+        """Select and reconstruct a partition of select_parallel by
+        connection, in a thread
+
+        open_points: the open chunk of a table with chunk storage
+        """
+        time_first = time_cut_start or specified_time[0]
+        time_last = time_cut_end or specified_time[1]
+        partition_cursor = _plain_cursor(connection)
+        if open_points is None:
+            partition_cursor.execute(*self._stmt_select_with_boundaries(
+                table_name, time_first, time_last))
+            points = [DataPoint(*row) for row in partition_cursor.fetchall()]
+        else:
+            partition_cursor.execute(*self._stmt_select_chunks(
+                table_name, time_first, time_last))
+            points = [pnt for row in partition_cursor.fetchall()
+                      for pnt in chunk.decode(row[0])]
+            points = list(chunk.points_in_range(
+                points + open_points, time_first, time_last))
+        partition_cursor.close()
+
+        return comp.select_partition_array(
+            specified_time, time_cut_start, time_cut_end, points)
 
     def _custom_fetchone(self):
         assert self._select_flag
+        # rows are consumed one by one, fetch_numpy can only convert
+        # the remaining ones
+        self._selected_array_loader = None
 
         try:
-            next_point = next(self._selected_row_generator)
+            return next(self._selected_row_generator)
         except StopIteration:
             return None
 
-        return next_point.timestamp, next_point.value
+    def _custom_fetchmany(self, size: int = None):
+        assert self._select_flag
+        self._selected_array_loader = None
+
+        size = size or self.arraysize
+        return list(itertools.islice(self._selected_row_generator, size))
 
     def _custom_fetchall(self):
         assert self._select_flag
+        self._selected_array_loader = None
 
-        result = [(pnt.timestamp, pnt.value)
-                  for pnt in self._selected_row_generator]
-        return result
+        return list(self._selected_row_generator)
 
-    def _handle_select_one(self, stmt):
+    def _handle_select_one(self, table_name: str,
+                           selected_timestamp: datetime.datetime):
         """Save selected value as a generator to self._selected_row_generator
 
         TODO if have time
@@ -165,231 +977,783 @@ class Cursor(MySQLCursor):
         case 2: the connector was closed and reconnected, compression
                 objected should be load from extra information table
         """
-        table_name = re.search(r"from\s(\w+)", stmt).group(1)
-
-        select_pattern = r"where\s+?timestamp\s+?=\s+?'((\w+-*)+\s(\w+:*)+)'"
-        selected_timestamp = re.search(select_pattern, stmt).group(1)
-
-        if not selected_timestamp:
-            raise ValueError(
-                "The format of query should be: ...where timestamp = 'Y-m-d H:M:S'")
-
-        selected_timestamp = datetime.datetime.strptime(
-            selected_timestamp, "%Y-%m-%d %H:%M:%S")
-
-        """ Query the timestamp to see if it exist in DB """
-        stmt_pre_query = (
-            f"SELECT timestamp, value "
-            f"FROM {table_name} "
-            f"WHERE timestamp = '{selected_timestamp}'"
-        )
-
-        super().execute(stmt_pre_query)
-        result_tuple = super().fetchone()
+        """ Query the timestamp and the closest points around it """
+        result_points = list(self._select_archieved_points(
+            table_name, selected_timestamp, selected_timestamp))
 
         """the asked point does exist in DB"""
-        if result_tuple:
-            self._selected_row_generator = (
-                x for x in (DataPoint(*result_tuple), ))
-            return
+        for pnt in result_points:
+            if pnt.timestamp == selected_timestamp and pnt.value is not None:
+                self._selected_row_generator = (
+                    x for x in ((pnt.timestamp, pnt.value), ))
+                return
 
         """the asked point does NOT exist"""
-        lower_bound_point = self._get_closest_point(
-            'prev', table_name, selected_timestamp)
-        if not lower_bound_point:
+        if (not result_points
+                or result_points[0].timestamp > selected_timestamp):
             # select timestamp before the earliest data
             self._selected_row_generator = (_ for _ in [])
             return
 
-        upper_bound_point = self._get_closest_point(
-            'next', table_name, selected_timestamp)
+        lower_bound_point = result_points[0]
+        upper_bound_point = (result_points[1]
+                             if len(result_points) > 1 else None)
 
-        comp = self.compression_dict[table_name]
-        self._selected_row_generator = comp.select_interpolation(
-            selected_timestamp,
+        self._select_interpolation(
+            table_name, selected_timestamp,
             (lower_bound_point, upper_bound_point)
         )
 
-    def _handle_select_many(self, stmt: str):
-        """Handle select with a time range
-
-        case 0(no_limit): no time-related limit in where or no where clause
-        SELECT * FROM table_name
-        SELECT (timestamp, value) FROM table_name
-
-        case 1(range): WHERE with both left and right
-        SELECT * FROM table_name
-        WHERE timestamp >= '2022-06-01 08:30:01'
-        AND timestamp < '2022-06-05 21:07:11';
-
-        case 2(after): no left limit
-        SELECT (timestamp, value) FROM table_name
-        WHERE timestamp > '2022-06-01 08:30:01';
-
-        case 3(before): no right limit
-        SELECT (timestamp, value) FROM table_name
-        WHERE timestamp <= '2022-06-05 21:07:11';
-        """
-        stmt_split_where = stmt.split("where")
-        if len(stmt_split_where) > 2:
-            raise ValueError(f"Multiple where in {stmt}")
-
-        table_name = stmt_parser.get_table_name_from_select(stmt)
-        if len(stmt_split_where) == 1:  # case 0
-            return self._handle_select_no_time_limit(table_name)
-
-        stmt_after_where = stmt_split_where[1].strip()
-        time_conditions = stmt_parser.find_time_condition(stmt_after_where)
-        assert len(time_conditions) != 0
-        if len(time_conditions) > 2:
-            error_message = ("complex where clause with more than "
-                             "2 conditions about time is not support")
-            raise NotImplementedError(error_message)
-
-        if len(time_conditions) == 2:  # case 1
-            return self._handle_select_range(table_name, time_conditions)
-
-        if "<" in time_conditions[0]:  # case 2
-            return self._handle_select_before(table_name, time_conditions[0])
-        else:  # case 3
-            return self._handle_select_after(table_name, time_conditions[0])
-
-    def _handle_select_no_time_limit(self, table_name: str):
-        stmt_select_no_time_limit = (
-            f"SELECT timestamp, value FROM {table_name} "
-            "ORDER BY timestamp ASC")
-        super().execute(stmt_select_no_time_limit)
-        points_generator = self._generator_from_super_class_fetchone(
-            prev_point=None, next_point=None)
+    def _select_range(self, table_name: str,
+                      time_start: Optional[datetime.datetime],
+                      time_end: Optional[datetime.datetime]):
+        """Select a time range, None means no limit on that side
 
-        comp = self.compression_dict[table_name]
-        self._selected_row_generator = comp.select_interpolation(
-            [None, None], points_generator)
-
-    def _handle_select_after(self, table_name: str, time_condition: str):
-        str_start = stmt_parser.get_first_time_from_string(time_condition)
-        time_start = datetime.datetime.strptime(
-            str_start, '%Y-%m-%d %H:%M:%S')
-        prev_point = self._get_closest_point('prev', table_name, time_start)
-
-        stmt_select_after = (
-            f"SELECT timestamp, value FROM {table_name} WHERE "
-            + time_condition + " ORDER BY timestamp ASC")
-        super().execute(stmt_select_after)
-
-        # The case (prev_point is None) is handled by
-        # self._generator_from_super_class_fetchone and
-        # compression._select_many
-        points_generator = self._generator_from_super_class_fetchone(
-            prev_point=prev_point, next_point=None)
+        If the result cache is enabled, the result is reconstructed at
+        once and cached unless it depends on the snapshot point in the
+        buffer, which changes with every insert.
+        """
+        if self.result_cache is None:
+            points_generator = self._select_archieved_points(
+                table_name, time_start, time_end)
+            self._select_interpolation(
+                table_name, [time_start, time_end], points_generator)
+            return
 
+        cache_key = (table_name, time_start, time_end)
+        result_cache = self.result_cache
+        cached_result = result_cache.get(cache_key)
+        if cached_result is None:
+            generation = result_cache.generation(table_name)
+            points = list(self._select_archieved_points(
+                table_name, time_start, time_end))
+            comp = self.compression_dict[table_name]
+            cached_result = comp.select_interpolation_array(
+                [time_start, time_end], points)
+            if points and time_end and points[-1].timestamp >= time_end:
+                # a point inserted before the first point could also
+                # change the result if it is not before time_start
+                span_start = points[0].timestamp
+                if not time_start or time_start < span_start:
+                    span_start = time_start or datetime.datetime.min
+                result_cache.put(
+                    cache_key, *cached_result,
+                    span=(span_start, points[-1].timestamp),
+                    generation=generation)
+
+        timestamps, values = cached_result
+        self._selected_array_loader = lambda: (timestamps.copy(),
+                                               values.copy())
+        self._selected_row_generator = zip(timestamps.tolist(),
+                                           values.tolist())
+
+    def _handle_select_downsampled(self, table_name: str,
+                                   time_start: Optional[datetime.datetime],
+                                   time_end: Optional[datetime.datetime],
+                                   step: datetime.timedelta = None,
+                                   max_points: int = None,
+                                   mode: str = 'linear'):
+        """Reconstruct only the grid of the downsampled range at once"""
+        points_generator = self._select_archieved_points(
+            table_name, time_start, time_end)
         comp = self.compression_dict[table_name]
-        self._selected_row_generator = comp.select_interpolation(
-            [time_start, None], points_generator)
-
-    def _handle_select_before(self, table_name: str, time_condition: str):
-        str_end = stmt_parser.get_first_time_from_string(time_condition)
-        time_end = datetime.datetime.strptime(
-            str_end, '%Y-%m-%d %H:%M:%S')
-        next_point = self._get_closest_point('next', table_name, time_end)
-
-        stmt_select_before = (
-            f"SELECT timestamp, value FROM {table_name} WHERE "
-            + time_condition + " ORDER BY timestamp ASC")
-        super().execute(stmt_select_before)
-
-        # The case (next_point is None) is handled by
-        # self._generator_from_super_class_fetchone and
-        # compression._select_many
-        points_generator = self._generator_from_super_class_fetchone(
-            prev_point=None, next_point=next_point)
+        timestamps, values = comp.select_downsampled(
+            [time_start, time_end], points_generator, step, max_points, mode)
+        self._selected_array_loader = lambda: (timestamps.copy(),
+                                               values.copy())
+        self._selected_row_generator = zip(timestamps.tolist(),
+                                           values.tolist())
+
+    def _handle_select_value(self, table_name: str,
+                             time_start: Optional[datetime.datetime],
+                             time_end: Optional[datetime.datetime],
+                             value_conditions: List[Tuple[str, float]]):
+        """Reconstructed points of a time range meeting every
+        (operator, threshold) of value_conditions
+
+        Segments whose envelope can not meet the conditions are skipped
+        by the server, and only the others are reconstructed. Tables
+        without envelopes, with storage=chunk or created by older
+        versions, are reconstructed whole.
+        """
+        comp = self._compression(table_name)
+        if table_name in self.chunk_dict or not self._has_envelope(
+                table_name):
+            points = list(self._select_archieved_points(
+                table_name, time_start, time_end))
+            timestamps, values = comp.select_interpolation_array(
+                [time_start, time_end], points)
+        else:
+            super().execute(*self._stmt_select_candidate_segments(
+                table_name, time_start, time_end, value_conditions))
+            rows = super().fetchall()
+            timestamps, values = self._reconstruct_candidate_segments(
+                comp, time_start, time_end, value_conditions, rows)
+
+        mask = value_mask(values, value_conditions)
+        timestamps, values = timestamps[mask], values[mask]
+        self._selected_array_loader = lambda: (timestamps.copy(),
+                                               values.copy())
+        self._selected_row_generator = zip(timestamps.tolist(),
+                                           values.tolist())
+
+    def _stmt_select_candidate_segments(
+            self, table_name: str, time_start: Optional[datetime.datetime],
+            time_end: Optional[datetime.datetime],
+            value_conditions: List[Tuple[str, float]]) -> tuple:
+        """SELECT the segments of a time range whose envelope may meet
+        value_conditions, see _stmt_select_with_boundaries for the range
+
+        Every row is the end of a segment with the point before it, and
+        whether the segment is a candidate. The first and the last
+        points of the range are always selected.
+        return: the statement and its params
+        """
+        envelope_conditions, params = [], []
+        for operator, threshold in value_conditions:
+            if operator.startswith('>'):
+                envelope_conditions.append(
+                    "(segment_max IS NULL OR segment_max >= %s)")
+            else:
+                envelope_conditions.append(
+                    "(segment_min IS NULL OR segment_min <= %s)")
+            params.append(threshold)
+        stmt_where, params_where = self._where_with_boundaries(
+            table_name, time_start, time_end)
+        return (
+            "SELECT prev_time, prev_value, timestamp, value, is_candidate "
+            "FROM (SELECT LAG(timestamp) OVER w AS prev_time, "
+            "LAG(value) OVER w AS prev_value, timestamp, value, "
+            "LEAD(timestamp) OVER w AS next_time, "
+            f"{' AND '.join(envelope_conditions)} AS is_candidate "
+            f"FROM {table_name}{stmt_where} "
+            "WINDOW w AS (ORDER BY timestamp)) AS segments "
+            "WHERE is_candidate OR prev_time IS NULL OR next_time IS NULL "
+            "ORDER BY timestamp", params + params_where)
+
+    @staticmethod
+    def _reconstruct_candidate_segments(
+            comp: Compression, time_start: Optional[datetime.datetime],
+            time_end: Optional[datetime.datetime],
+            value_conditions: List[Tuple[str, float]], rows: list) -> tuple:
+        """Reconstruct the candidate segments selected by
+        _stmt_select_candidate_segments, and the segment to the snapshot
+        point if it may meet value_conditions
+
+        return: arrays of the points of the candidate segments, not
+            filtered yet
+        """
+        if not rows:
+            return (np.array([], dtype='datetime64[us]'),
+                    np.array([], dtype=np.float64))
+        first_point = DataPoint(rows[0][2], rows[0][3])
+        last_point = DataPoint(rows[-1][2], rows[-1][3])
+        segments = [
+            (DataPoint(prev_time, prev_value), DataPoint(timestamp, value))
+            for prev_time, prev_value, timestamp, value, is_candidate in rows
+            if is_candidate and prev_time is not None]
+
+        # the snapshot point ends the range, the same as _points_arrays
+        snapshot_point = comp.buffer.snapshot_point
+        time_last = time_end or (snapshot_point.timestamp
+                                 if snapshot_point else None)
+        if (snapshot_point and time_last
+                and last_point.timestamp < time_last
+                and envelope_may_meet(
+                    segment_envelope(last_point, snapshot_point,
+                                     comp.time_step_at(
+                                         last_point.timestamp)),
+                    value_conditions)):
+            segments.append((last_point, snapshot_point))
+        return comp.select_segments_array([time_start, time_end],
+                                          first_point, segments)
+
+    def _handle_select_aggregate(self, table_name: str, aggregates: tuple,
+                                 time_start: Optional[datetime.datetime],
+                                 time_end: Optional[datetime.datetime]):
+        """Aggregate the reconstructed points of a time range from the
+        archived points directly, see Compression.aggregate
+
+        The result is one row with a column per aggregate function.
+        If the table has rollups covering the time range, the result is
+        aggregated from them instead, see _select_rollup_aggregate.
+        """
+        result_row = self._select_rollup_aggregate(
+            table_name, aggregates, time_start, time_end)
+        if result_row is not None:
+            self._selected_row_generator = (x for x in (result_row, ))
+            return
 
+        points_generator = self._select_archieved_points(
+            table_name, time_start, time_end)
         comp = self.compression_dict[table_name]
-        self._selected_row_generator = comp.select_interpolation(
-            [None, time_end], points_generator)
-
-    def _handle_select_range(self, table_name: str, time_conditions: List[str]):
-        assert len(time_conditions) == 2
-
-        str_start = stmt_parser.get_first_time_from_string(time_conditions[0])
-        time_start = datetime.datetime.strptime(
-            str_start, '%Y-%m-%d %H:%M:%S')
-        prev_point = self._get_closest_point('prev', table_name, time_start)
-
-        str_end = stmt_parser.get_first_time_from_string(time_conditions[1])
-        time_end = datetime.datetime.strptime(
-            str_end, '%Y-%m-%d %H:%M:%S')
-        next_point = self._get_closest_point('next', table_name, time_end)
-
-        stmt_range = (
-            f"SELECT timestamp, value FROM {table_name} "
-            f"  WHERE {time_conditions[0]}"
-            f"  AND {time_conditions[1]}"
-            f"  ORDER BY timestamp ASC"
-        )
-        super().execute(stmt_range)
+        result_row = comp.aggregate([time_start, time_end], points_generator,
+                                    aggregates)
+        self._selected_row_generator = (x for x in (result_row, ))
+
+    def _select_rollup_aggregate(self, table_name: str, aggregates: tuple,
+                                 time_start: Optional[datetime.datetime],
+                                 time_end: Optional[datetime.datetime]
+                                 ) -> Optional[tuple]:
+        """Aggregate the exact inserted values by the rollups of the
+        table, if the time range is whole buckets of a level, see
+        rollup.covering_level
+
+        return: the result row, None if the rollups cannot answer
+        """
+        comp = self._compression(table_name)
+        rollup_buffer = self.rollup_dict.get(table_name)
+        if (rollup_buffer is None
+                or not set(aggregates) <= set(rollup.FUNCTIONS)):
+            return None
+        time_step = comp.time_step_at(time_end) if time_end else None
+        level = rollup.covering_level(
+            tuple(rollup_buffer.level_sizes), time_start, time_end,
+            time_step)
+        if level is None:
+            return None
 
-        points_generator = self._generator_from_super_class_fetchone(
-            prev_point=prev_point, next_point=next_point)
+        bucket_end = time_end + time_step if time_end else None
+        # the buckets not saved yet are not saved meanwhile
+        with self._tables.lock(table_name):
+            super().execute(*rollup.stmt_select_summary(
+                table_name, level, time_start, bucket_end))
+            summaries = super().fetchall()
+            summaries.extend(
+                rollup_buffer.summaries(level, time_start, bucket_end))
+        return rollup.combine(summaries, aggregates)
+
+    def _select_archieved_points(self, table_name: str,
+                                 time_start: Optional[datetime.datetime],
+                                 time_end: Optional[datetime.datetime]):
+        """Archived points in [time_start, time_end] and the closest
+        points outside
+
+        The points are taken from the in-memory index if it contains
+        all of them, otherwise selected from the database.
+        return: iterable of DataPoint
+        """
+        # restored before the archived rows are selected
+        self._compression(table_name)
+        result_points = self._indexed_archieved_points(table_name,
+                                                       time_start, time_end)
+        if result_points is not None:
+            return result_points
+
+        if table_name in self.chunk_dict:
+            return self._select_chunk_points(table_name, time_start,
+                                             time_end)
+
+        self._selected_cursor = self._execute_prepared(
+            *self._stmt_select_with_boundaries(
+                table_name, time_start, time_end))
+        return self._generator_from_fetchmany(self._selected_cursor)
+
+    def _indexed_archieved_points(self, table_name: str,
+                                  time_start: Optional[datetime.datetime],
+                                  time_end: Optional[datetime.datetime]
+                                  ) -> Optional[List[DataPoint]]:
+        """_select_archieved_points from the in-memory index, None if
+        the index does not contain all of them
+
+        The index is shared by every cursor and maintained by their
+        inserts, so the lock of the table is held while it is read.
+        """
+        if not self.index_size:
+            return None
+        with self._tables.lock(table_name):
+            archieved_index = self._tables.archieved_index(table_name,
+                                                           self.index_size)
+            result_points = archieved_index.select(time_start, time_end)
+            if result_points is None and not archieved_index.warmed:
+                self._warm_archieved_index(table_name, archieved_index)
+                result_points = archieved_index.select(time_start, time_end)
+        return result_points
+
+    def _select_chunk_points(self, table_name: str,
+                             time_start: Optional[datetime.datetime],
+                             time_end: Optional[datetime.datetime]):
+        """_select_archieved_points of a table with chunk storage
+
+        The chunks containing the closest points outside are selected
+        together, then followed by the open chunk in memory.
+        The lock of the table is held while the chunks are selected and
+        the open chunk is copied, so a chunk closed by an insert
+        meanwhile is neither missed nor read twice.
+        return: generator of DataPoint
+        """
+        with self._tables.lock(table_name):
+            self._selected_cursor = self._execute_prepared(
+                *self._stmt_select_chunks(table_name, time_start, time_end))
+            open_points = self.chunk_dict[table_name].points[:]
+        points = itertools.chain(
+            self._chunk_points_from_fetchmany(self._selected_cursor),
+            open_points)
+        return chunk.points_in_range(points, time_start, time_end)
+
+    def _stmt_select_chunks(self, table_name: str,
+                            time_start: Optional[datetime.datetime],
+                            time_end: Optional[datetime.datetime]
+                            ) -> tuple:
+        """SELECT the chunks containing the archived points of
+        _stmt_select_with_boundaries
+
+        return: the statement and its params
+        """
+        conditions, params = [], []
+        if time_start:
+            conditions.append(
+                f"chunk_start >= COALESCE("
+                f"(SELECT MAX(chunk_start) FROM {table_name} "
+                f"WHERE chunk_start <= %s), %s)")
+            params.extend((time_start, time_start))
+        if time_end:
+            conditions.append(
+                f"chunk_start <= COALESCE("
+                f"(SELECT MIN(chunk_start) FROM {table_name} "
+                f"WHERE chunk_start >= %s), %s)")
+            params.extend((time_end, time_end))
+        stmt_where = ""
+        if conditions:
+            stmt_where = " WHERE " + " AND ".join(conditions)
+        return (f"SELECT data FROM {table_name}{stmt_where} "
+                "ORDER BY chunk_start ASC"), params
+
+    def _warm_archieved_index(self, table_name: str,
+                              archieved_index: ArchievedIndex):
+        """Load the latest points before the index from the database"""
+        num_points = archieved_index.max_points - len(archieved_index)
+        if num_points <= 0:
+            archieved_index.warmed = True
+            return
 
-        comp = self.compression_dict[table_name]
-        self._selected_row_generator = comp.select_interpolation(
-            [time_start, time_end], points_generator)
+        if table_name in self.chunk_dict:
+            old_points = self._select_latest_chunk_points(
+                table_name, archieved_index.first_timestamp(), num_points)
+            archieved_index.warm(old_points,
+                                 is_all=len(old_points) < num_points)
+            return
 
-    def _generator_from_super_class_fetchone(self, prev_point: DataPoint,
-                                             next_point: DataPoint):
-        if prev_point:
-            yield prev_point
+        stmt_warm = f"SELECT timestamp, value FROM {table_name} "
+        params = []
+        if len(archieved_index):
+            stmt_warm += "WHERE timestamp < %s "
+            params.append(archieved_index.first_timestamp())
+        stmt_warm += "ORDER BY timestamp DESC LIMIT %s"
+        params.append(num_points)
+        super().execute(stmt_warm, params)
+        old_points = [DataPoint(*row) for row in super().fetchall()]
+        archieved_index.warm(old_points,
+                             is_all=len(old_points) < num_points)
+
+    def _select_latest_chunk_points(self, table_name: str,
+                                    time_before: Optional[datetime.datetime],
+                                    num_points: int) -> List[DataPoint]:
+        """At most num_points latest archived points before time_before
+        of a table with chunk storage, in descending order of timestamp
+
+        The points of the open chunk come first, the lock of the table
+        should be held.
+        """
+        stmt_latest = f"SELECT data FROM {table_name} "
+        params = []
+        if time_before:
+            stmt_latest += "WHERE chunk_start < %s "
+            params.append(time_before)
+        stmt_latest += "ORDER BY chunk_start DESC"
+        super().execute(stmt_latest, params)
+
+        # the chunk of time_before also has points after it
+        time_limit = time_before or datetime.datetime.max
+        old_points = [pnt for pnt in reversed(self.chunk_dict[table_name]
+                                              .points)
+                      if pnt.timestamp < time_limit]
         row = super().fetchone()
-        while row is not None:
-            yield DataPoint(*row)
+        while row and len(old_points) < num_points:
+            old_points.extend(pnt for pnt in reversed(chunk.decode(row[0]))
+                              if pnt.timestamp < time_limit)
             row = super().fetchone()
-        if next_point:
-            yield next_point
+        if row:
+            super().fetchall()
+        return old_points[:num_points]
+
+    def _stmt_select_with_boundaries(self, table_name: str,
+                                     time_start: Optional[datetime.datetime],
+                                     time_end: Optional[datetime.datetime]
+                                     ) -> tuple:
+        """SELECT archived points in [time_start, time_end] together with
+        the closest points before time_start and after time_end
+
+        The closest points are found by subqueries, so all points needed
+        by the interpolation are fetched in one round trip.
+        None means no limit on that side.
+        return: the statement and its params
+        """
+        stmt_where, params = self._where_with_boundaries(
+            table_name, time_start, time_end)
+        return (f"SELECT timestamp, value FROM {table_name}{stmt_where} "
+                "ORDER BY timestamp ASC"), params
+
+    @staticmethod
+    def _where_with_boundaries(table_name: str,
+                               time_start: Optional[datetime.datetime],
+                               time_end: Optional[datetime.datetime]
+                               ) -> tuple:
+        """WHERE clause of _stmt_select_with_boundaries and its params,
+        empty if no limit"""
+        conditions, params = [], []
+        if time_start:
+            conditions.append(
+                f"timestamp >= COALESCE("
+                f"(SELECT MAX(timestamp) FROM {table_name} "
+                f"WHERE timestamp <= %s), %s)")
+            params.extend((time_start, time_start))
+        if time_end:
+            conditions.append(
+                f"timestamp <= COALESCE("
+                f"(SELECT MIN(timestamp) FROM {table_name} "
+                f"WHERE timestamp >= %s), %s)")
+            params.extend((time_end, time_end))
+
+        stmt_where = ""
+        if conditions:
+            stmt_where = " WHERE " + " AND ".join(conditions)
+        return stmt_where, params
+
+    def _select_interpolation(self, table_name: str, specified_time,
+                              archieved_points):
+        """Keep the selected rows as a generator to
+        self._selected_row_generator
 
-    def _create_dev_margin_table_if_not_exists(self):
+        The arguments are also kept for fetch_numpy, to reconstruct
+        the whole result by array operations.
+        """
+        comp = self.compression_dict[table_name]
+        self._selected_array_loader = functools.partial(
+            comp.select_interpolation_array, specified_time, archieved_points)
+        self._selected_row_generator = (
+            (pnt.timestamp, pnt.value)
+            for pnt in comp.select_interpolation(specified_time,
+                                                 archieved_points))
+
+    def _generator_from_fetchmany(self, selected_cursor: MySQLCursor):
+        """Generate archived points of the select executed by
+        selected_cursor
+
+        Rows are read from the server by chunks of self.fetch_chunk_size.
+        The rows not read are discarded by the next execute.
+        """
+        rows = self._fetchmany_rows(selected_cursor, self.fetch_chunk_size)
+        while rows:
+            for row in rows:
+                yield DataPoint(*row)
+            rows = self._fetchmany_rows(selected_cursor,
+                                        self.fetch_chunk_size)
+
+    def _rows_from_fetchmany(self, selected_cursor: MySQLCursor):
+        """Generate the rows of selected_cursor as tuples, see
+        _generator_from_fetchmany"""
+        rows = self._fetchmany_rows(selected_cursor, self.fetch_chunk_size)
+        while rows:
+            for row in rows:
+                yield tuple(row)
+            rows = self._fetchmany_rows(selected_cursor,
+                                        self.fetch_chunk_size)
+
+    def _chunk_points_from_fetchmany(self, selected_cursor: MySQLCursor):
+        """Generate archived points of the chunks selected by
+        selected_cursor, see _generator_from_fetchmany"""
+        rows = self._fetchmany_rows(selected_cursor, self.fetch_chunk_size)
+        while rows:
+            for row in rows:
+                yield from chunk.decode(row[0])
+            rows = self._fetchmany_rows(selected_cursor,
+                                        self.fetch_chunk_size)
+
+    def _discard_selected_rows(self):
+        """Discard the archived rows not read by the previous select
+
+        The selected rows are generated lazily, so some of them may
+        still be on the connection if not all rows were fetched.
+        """
+        self._wait_parallel_selects()
+        if self._select_flag and self._have_unread_result():
+            if self._selected_cursor is self:
+                super().fetchall()
+            else:
+                self._selected_cursor.fetchall()
+        self._selected_cursor = self
+
+    def _wait_parallel_selects(self, cancel: bool = False):
+        """Wait for the partitions of select_parallel, so that their
+        connections can be reused or closed
+
+        cancel: cancel the partitions not started, whose rows are not
+        read any more
+        """
+        if cancel:
+            for future in self._parallel_futures:
+                future.cancel()
+        concurrent.futures.wait(self._parallel_futures)
+        self._parallel_futures = []
+
+    def checkpoint(self):
+        """Save the compression state of the tables inserted by this
+        cursor to the state table
+
+        Called by Connection.commit and close, so the state is saved in
+        the same transaction as the archived points.
+        """
+        states = []
+        for table_name in self._inserted_tables:
+            with self._tables.lock(table_name):
+                rollup_buffer = self.rollup_dict.get(table_name)
+                if rollup_buffer:
+                    self._save_rollups(
+                        table_name,
+                        rollup_buffer.pop_buckets(closed_only=False))
+                states.append(self._state_row(table_name))
+        # written after releasing the locks, inserts of other cursors
+        # do not wait for the database
+        self._save_states(states)
+
+    def _compression(self, table_name: str) -> Compression:
+        """Compression of the table, restored from the state table on
+        first use in the process"""
+        comp = self.compression_dict.get(table_name)
+        if comp is not None:
+            return comp
+        with self._tables.lock(table_name):
+            if table_name not in self.compression_dict:
+                self._restore_state(table_name)
+        return self.compression_dict[table_name]
+
+    def _state_table_exists(self) -> bool:
+        """Whether the state table is in the current database, checked
+        without creating it so a SELECT does not commit implicitly"""
+        if not self._has_state_table:
+            self._has_state_table = self._table_exists("compressor_state")
+        return self._has_state_table
+
+    def _create_state_table_if_not_exists(self):
+        """Only called by CREATE TABLE and checkpoint, the statement
+        commits the transaction implicitly"""
+        if self._state_table_exists():
+            return
         stmt_creat_table = (
-            "CREATE TABLE IF NOT EXISTS dev_margin ("
-            "    Id int NOT NULL AUTO_INCREMENT PRIMARY KEY,"
-            "    table_name varchar(40),"
-            "    dev_margin DOUBLE"
+            "CREATE TABLE IF NOT EXISTS compressor_state ("
+            "    table_name varchar(64) NOT NULL PRIMARY KEY,"
+            "    dev_margin DOUBLE NOT NULL,"
+            "    storage varchar(8) NOT NULL,"
+            "    time_step BIGINT,"
+            "    archieved_time DATETIME(6),"
+            "    archieved_value DOUBLE,"
+            "    snapshot_time DATETIME(6),"
+            "    snapshot_value DOUBLE,"
+            "    slope_min DOUBLE,"
+            "    slope_max DOUBLE,"
+            "    open_chunk MEDIUMBLOB,"
+            "    rollup varchar(32),"
+            "    compressor varchar(16) NOT NULL,"
+            "    deadband DOUBLE NOT NULL,"
+            "    reported_value DOUBLE,"
+            "    held_time DATETIME(6),"
+            "    held_value DOUBLE,"
+            "    max_gap BIGINT,"
+            "    time_steps MEDIUMBLOB"
             ")"
         )
         super().execute(stmt_creat_table)
+        self._has_state_table = True
 
-    def _insert_dev_margin(self, table_name, dev_margin):
-        stmt_insert_dev = (
-            "INSERT INTO dev_margin (table_name, dev_margin) "
-            "VALUES (%s, %s);"
-        )
-        super().execute(stmt_insert_dev, (table_name, dev_margin))
-        return
-
-    def _get_closest_point(self, prev_or_next: str,
-                           table_name: str,
-                           specified_time: datetime.datetime
-                           ) -> Optional[DataPoint]:
-
-        if prev_or_next == 'prev':
-            compare_sign = '<='
-            sort_order = 'DESC'
-        elif prev_or_next == 'next':
-            compare_sign = '>='
-            sort_order = 'ASC'
-        else:
-            error_message = (f"prev_or_next should be 'prev' or 'next', "
-                             f"get {prev_or_next}")
-            raise ValueError(error_message)
+    def _state_row(self, table_name: str) -> list:
+        """Row of the state table with dev_margin, storage, time_step
+        (microseconds), buffer, slope interval, open chunk, rollup
+        levels, compression engine, dead-band state, max_gap
+        (microseconds) and time steps of the runs of the table, the lock
+        of the table should be held
 
-        str_time = specified_time.strftime('%Y-%m-%d %H:%M:%S')
-        stmt_select_previous_point = (
-            f"SELECT timestamp, value FROM {table_name} "
-            f"WHERE timestamp {compare_sign} '{str_time}' "
-            f"ORDER BY timestamp {sort_order} LIMIT 1"
-        )
-        super().execute(stmt_select_previous_point)
-        result_row = super().fetchone()
-        if result_row:
-            return DataPoint(*result_row)
-        else:
-            return None
+        The time steps are (run start, time_step) in microseconds packed
+        as int64 pairs.
+        """
+        comp = self.compression_dict[table_name]
+        archieved_point = comp.buffer.archieved_point
+        snapshot_point = comp.buffer.snapshot_point
+        chunk_buffer = self.chunk_dict.get(table_name)
+        open_chunk = (chunk.encode(chunk_buffer.points)
+                      if chunk_buffer and chunk_buffer.points else None)
+        rollup_buffer = self.rollup_dict.get(table_name)
+        held_point = comp.held_point
+        time_steps = None
+        if comp.time_steps:
+            time_steps = array('q', [
+                value // MICROSECOND for run_start, step in comp.time_steps
+                for value in (run_start - EPOCH, step)]).tobytes()
+        return [
+            table_name, comp.dev_margin,
+            'chunk' if chunk_buffer else 'row',
+            comp.time_step // MICROSECOND if comp.time_step else None,
+            archieved_point.timestamp if archieved_point else None,
+            archieved_point.value if archieved_point else None,
+            snapshot_point.timestamp if snapshot_point else None,
+            snapshot_point.value if snapshot_point else None,
+            comp.slope_min, comp.slope_max, open_chunk,
+            '+'.join(rollup_buffer.level_sizes) if rollup_buffer else None,
+            comp.ENGINE, comp.deadband, comp.reported_value,
+            held_point.timestamp if held_point else None,
+            held_point.value if held_point else None,
+            comp.max_gap // MICROSECOND if comp.max_gap else None,
+            time_steps]
+
+    def _save_states(self, states: List[list]):
+        """Write the rows of _state_row to the state table"""
+        if not states:
+            return
+        self._create_state_table_if_not_exists()
+        for state in states:
+            self._execute_prepared(
+                "REPLACE INTO compressor_state VALUES "
+                "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, "
+                "%s, %s, %s, %s, %s)", state)
+
+    def _restore_state(self, table_name: str):
+        """Register the compression of the table saved by _save_states
+
+        Tables created by older versions only have dev_margin in the
+        dev_margin table, and unknown tables get Config.DEV_MARGIN.
+        """
+        rows = []
+        if self._state_table_exists():
+            super().execute(
+                "SELECT dev_margin, storage, time_step, archieved_time, "
+                "archieved_value, snapshot_time, snapshot_value, "
+                "slope_min, slope_max, open_chunk, rollup, compressor, "
+                "deadband, reported_value, held_time, held_value, "
+                "max_gap, time_steps "
+                "FROM compressor_state WHERE table_name = %s",
+                (table_name, ))
+            rows = super().fetchall()
+        if not rows:
+            self._tables.restore(table_name, Compression(
+                dev_margin=self._legacy_dev_margin(table_name)))
+            return
+
+        (dev_margin, storage, time_step, archieved_time, archieved_value,
+         snapshot_time, snapshot_value, slope_min, slope_max,
+         open_chunk, rollup_levels, engine, deadband, reported_value,
+         held_time, held_value, max_gap, time_steps) = rows[0]
+        comp = new_compression(
+            engine, dev_margin, deadband,
+            archieved_point=(DataPoint(archieved_time, archieved_value)
+                             if archieved_time else None),
+            snapshot_point=(DataPoint(snapshot_time, snapshot_value)
+                            if snapshot_time else None),
+            max_gap=(datetime.timedelta(microseconds=max_gap)
+                     if max_gap else None))
+        if time_step is not None:
+            comp.time_step = datetime.timedelta(microseconds=time_step)
+        if time_steps:
+            values = array('q')
+            values.frombytes(time_steps)
+            comp.time_steps = [
+                (EPOCH + datetime.timedelta(microseconds=run_start),
+                 datetime.timedelta(microseconds=step))
+                for run_start, step in zip(values[::2], values[1::2])]
+        comp.slope_min, comp.slope_max = slope_min, slope_max
+        comp.reported_value = reported_value
+        if held_time:
+            comp.held_point = DataPoint(held_time, held_value)
+
+        chunk_buffer = None
+        if storage == 'chunk':
+            chunk_buffer = ChunkBuffer(Config.CHUNK_SECONDS)
+            if open_chunk:
+                chunk_buffer.push_points(chunk.decode(open_chunk))
+        rollup_buffer = None
+        if rollup_levels:
+            rollup_buffer = RollupBuffer(
+                {level: rollup.LEVELS[level]
+                 for level in rollup.parse_levels(rollup_levels)})
+        self._tables.restore(table_name, comp, chunk_buffer,
+                             rollup_buffer)
+
+    def _legacy_dev_margin(self, table_name: str) -> float:
+        """dev_margin of the table in the dev_margin table written by
+        older versions, Config.DEV_MARGIN if none"""
+        super().execute("SHOW TABLES LIKE 'dev_margin'")
+        if not super().fetchall():
+            return Config.DEV_MARGIN
+        super().execute(
+            "SELECT dev_margin FROM dev_margin WHERE table_name = %s "
+            "ORDER BY Id DESC LIMIT 1", (table_name, ))
+        rows = super().fetchall()
+        return rows[0][0] if rows else Config.DEV_MARGIN
+
+
+class Cursor(BaseCursor, MySQLCursor):
+    """Cursor of the pure Python driver"""
+    _prepared_cursor_class = MySQLCursorPrepared
+
+    @staticmethod
+    def _fetchmany_rows(selected_cursor: MySQLCursor, size: int):
+        """Read at most size rows of the select executed by
+        selected_cursor
+
+        MySQLCursor.fetchmany calls the overridden fetchone row by row,
+        so the rows are read from the connection directly.
+        """
+        if not selected_cursor._have_unread_result():
+            return []
+
+        rows, eof = selected_cursor._connection.get_rows(
+            count=size, binary=selected_cursor._binary,
+            columns=selected_cursor.description)
+        if selected_cursor._nextrow[0]:
+            rows.insert(0, selected_cursor._nextrow[0])
+            selected_cursor._nextrow = (None, None)
+        if eof:
+            selected_cursor._handle_eof(eof)
+        return rows
+
+
+if CMySQLCursor is not None:
+    class CCursor(BaseCursor, CMySQLCursor):
+        """Cursor of the C extension driver, see connector.connect"""
+        _prepared_cursor_class = CMySQLCursorPrepared
+
+        def _have_unread_result(self) -> bool:
+            return bool(self._connection.unread_result
+                        or (self._nextrow and self._nextrow[0]))
+
+        def _fetchmany_rows(self, selected_cursor, size: int):
+            """Read at most size rows of the select executed by
+            selected_cursor
+
+            CMySQLCursor.fetchmany reads the rows from the connection
+            by chunks, it is called directly since fetchmany is
+            overridden.
+            """
+            if selected_cursor is self:
+                if not self._have_unread_result():
+                    return []
+                return CMySQLCursor.fetchmany(self, size)
+            return selected_cursor.fetchmany(size)
+else:
+    CCursor = None
+
+
+def _aligned_arrays(rows, num_series: int) -> tuple:
+    """Rows of select_aligned as timestamps (datetime64[us]) and values
+    (float64) of shape (number of rows, num_series)"""
+    rows = list(rows)
+    timestamps = np.array([row[0] for row in rows], dtype='datetime64[us]')
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+    return timestamps, values.reshape(len(rows), num_series)
+
+
+def _plain_cursor(connection):
+    """Cursor without compression of the driver of connection"""
+    if (CMySQLConnection is not None
+            and isinstance(connection, CMySQLConnection)):
+        return CMySQLCursor(connection)
+    return MySQLCursor(connection)
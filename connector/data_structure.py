@@ -1,7 +1,16 @@
+import bisect
 import datetime
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 
 class DataPoint:
+    # no __dict__ per point, millions of them are created when SELECT
+    __slots__ = ('timestamp', 'value')
+
     def __init__(self, timestamp: datetime, value: float) -> None:
         self.timestamp = timestamp
         self.value = value
@@ -45,3 +54,296 @@ class Buffer:
         self.archieved_point = self.snapshot_point
         self.snapshot_point = new_point
         return save_point
+
+
+class ChunkBuffer:
+    """Archived points of the open chunk of a table with chunk storage
+
+    Like Buffer, the points are kept in memory, until a point of a
+    later time bucket closes the chunk and it is written as a BLOB.
+    """
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, bucket_seconds: int) -> None:
+        self.bucket_size = datetime.timedelta(seconds=bucket_seconds)
+        self.points: List[DataPoint] = []
+        self.bucket = None
+
+    def __repr__(self) -> str:
+        return f"ChunkBuffer({len(self.points)} points, bucket={self.bucket})"
+
+    def push_points(self, new_points: List[DataPoint]
+                    ) -> List[List[DataPoint]]:
+        """Add points newer than every point in the buffer
+
+        return: points of the chunks closed by new_points
+        """
+        closed_chunks = []
+        for pnt in new_points:
+            bucket = (pnt.timestamp - self.EPOCH) // self.bucket_size
+            if self.points and bucket != self.bucket:
+                closed_chunks.append(self.points)
+                self.points = []
+            self.bucket = bucket
+            self.points.append(pnt)
+        return closed_chunks
+
+    def pop_points(self) -> List[DataPoint]:
+        """Close the open chunk"""
+        points, self.points = self.points, []
+        return points
+
+
+class RollupBuffer:
+    """Summaries of the rollup buckets of a table not saved yet
+
+    Like ChunkBuffer, the inserted points are kept in memory, but only
+    as [count, sum, min, max, first_time, first_value, last_time,
+    last_value] of their bucket of every level. A bucket is saved when
+    a point of a later bucket closes it, or at checkpoint, and merged
+    with the summary saved before.
+    """
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+    def __init__(self, level_sizes: Dict[str, datetime.timedelta]) -> None:
+        self.level_sizes = level_sizes
+        self.buckets: Dict[str, Dict[datetime.datetime, list]] = {
+            level: {} for level in level_sizes}
+
+    def __repr__(self) -> str:
+        num_buckets = {level: len(buckets)
+                       for level, buckets in self.buckets.items()}
+        return f"RollupBuffer({num_buckets})"
+
+    def push_points(self, new_points: List[DataPoint]) -> None:
+        """Add the exact values of inserted points, in time order"""
+        for level, size in self.level_sizes.items():
+            buckets = self.buckets[level]
+            for pnt in new_points:
+                bucket = (self.EPOCH
+                          + (pnt.timestamp - self.EPOCH) // size * size)
+                summary = buckets.get(bucket)
+                if summary is None:
+                    buckets[bucket] = [1, pnt.value, pnt.value, pnt.value,
+                                       pnt.timestamp, pnt.value,
+                                       pnt.timestamp, pnt.value]
+                    continue
+                summary[0] += 1
+                summary[1] += pnt.value
+                summary[2] = min(summary[2], pnt.value)
+                summary[3] = max(summary[3], pnt.value)
+                summary[6], summary[7] = pnt.timestamp, pnt.value
+
+    def pop_buckets(self, closed_only: bool = True
+                    ) -> Dict[str, List[tuple]]:
+        """Remove the buckets to be saved
+
+        closed_only: keep the latest bucket of every level
+        return: (bucket, *summary) of every level
+        """
+        popped = {}
+        for level, buckets in self.buckets.items():
+            latest = max(buckets) if closed_only and buckets else None
+            popped[level] = [(bucket, *summary)
+                             for bucket, summary in buckets.items()
+                             if bucket != latest]
+            self.buckets[level] = ({latest: buckets[latest]}
+                                   if latest is not None else {})
+        return popped
+
+    def summaries(self, level: str,
+                  time_start: Optional[datetime.datetime],
+                  time_end: Optional[datetime.datetime]) -> List[list]:
+        """Summaries not saved of the buckets in [time_start, time_end)"""
+        return [summary for bucket, summary in self.buckets[level].items()
+                if (time_start is None or bucket >= time_start)
+                and (time_end is None or bucket < time_end)]
+
+
+class ArchievedIndex:
+    """Sorted archived points of a table kept in memory
+
+    Timestamps are stored as microseconds since epoch in an array, and
+    the values of break markers as NaN.
+    Every archived point not earlier than complete_from is in the index,
+    so a query can be answered from memory if the closest point before
+    its start is not earlier than complete_from.
+    """
+    EPOCH = datetime.datetime(1970, 1, 1)
+    MICROSECOND = datetime.timedelta(microseconds=1)
+
+    def __init__(self, max_points: int) -> None:
+        self.max_points = max_points
+        self.timestamps = array('q')
+        self.values = array('d')
+        # no point is known to be complete yet
+        self.complete_from = math.inf
+        self.warmed = False
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __repr__(self) -> str:
+        return (f"ArchievedIndex({len(self)} points, "
+                f"complete_from={self.complete_from})")
+
+    def first_timestamp(self) -> Optional[datetime.datetime]:
+        if not len(self):
+            return None
+        return self._to_datetime(self.timestamps[0])
+
+    def append(self, new_points: List[DataPoint]) -> None:
+        """Add points newer than every point in the index
+
+        The oldest quarter of points is evicted when the index is full.
+        """
+        if not new_points:
+            return
+        if not len(self):
+            self.complete_from = min(self.complete_from,
+                                     self._to_int(new_points[0].timestamp))
+        for pnt in new_points:
+            self.timestamps.append(self._to_int(pnt.timestamp))
+            self.values.append(math.nan if pnt.value is None else pnt.value)
+
+        if len(self) > self.max_points:
+            num_evict = len(self) - self.max_points + self.max_points // 4
+            del self.timestamps[:num_evict]
+            del self.values[:num_evict]
+            self.complete_from = self.timestamps[0]
+
+    def warm(self, old_points: List[DataPoint], is_all: bool) -> None:
+        """Add points older than every point in the index
+
+        old_points: in descending order of timestamp
+        is_all: old_points are all the points before the index
+        """
+        self.warmed = True
+        old_points = old_points[:self.max_points - len(self)]
+        self.timestamps[:0] = array(
+            'q', [self._to_int(pnt.timestamp) for pnt in reversed(old_points)])
+        self.values[:0] = array(
+            'd', [math.nan if pnt.value is None else pnt.value
+                  for pnt in reversed(old_points)])
+        if is_all:
+            self.complete_from = -math.inf
+        elif old_points:
+            self.complete_from = self.timestamps[0]
+
+    def select(self, time_start: Optional[datetime.datetime],
+               time_end: Optional[datetime.datetime]
+               ) -> Optional[List[DataPoint]]:
+        """Points in [time_start, time_end] and the closest points
+        outside, the same as the select of the cursor
+
+        None means no limit on that side.
+        return: None if the index does not contain all of them
+        """
+        if time_start:
+            idx_start = bisect.bisect_right(
+                self.timestamps, self._to_int(time_start)) - 1
+        else:
+            idx_start = -1
+        if idx_start < 0:
+            if self.complete_from != -math.inf:
+                return None
+            idx_start = 0
+
+        if time_end:
+            idx_end = bisect.bisect_left(
+                self.timestamps, self._to_int(time_end)) + 1
+        else:
+            idx_end = len(self)
+
+        return [DataPoint(self._to_datetime(self.timestamps[idx]),
+                          None if math.isnan(self.values[idx])
+                          else self.values[idx])
+                for idx in range(idx_start, min(idx_end, len(self)))]
+
+    def _to_int(self, timestamp: datetime.datetime) -> int:
+        return (timestamp - self.EPOCH) // self.MICROSECOND
+
+    def _to_datetime(self, timestamp: int) -> datetime.datetime:
+        return self.EPOCH + datetime.timedelta(microseconds=timestamp)
+
+
+class ResultCache:
+    """LRU cache of reconstructed select results
+
+    key: (table_name, time_start, time_end)
+    value: timestamps and values arrays, and the time span of archived
+           points used by the reconstruction. A result is invalidated
+           when new archived points fall in its span.
+    The cache is shared by the cursors of a database, see
+    registry.TableRegistry.
+    """
+    def __init__(self, max_entries: int, max_points: int) -> None:
+        self.max_entries = max_entries
+        self.max_points = max_points
+        self.entries: OrderedDict = OrderedDict()
+        self.num_points = 0
+        self.hits = 0
+        self.misses = 0
+        # number of invalidations of every table, a result is not put
+        # if its table is invalidated while it is reconstructed
+        self.generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __repr__(self) -> str:
+        return f"ResultCache({self.info()})"
+
+    def info(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses,
+                'entries': len(self.entries), 'points': self.num_points}
+
+    def generation(self, table_name: str) -> int:
+        """Taken before selecting the archived points of a result, and
+        given to put"""
+        return self.generations.get(table_name, 0)
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        """return: (timestamps, values), None if not cached"""
+        with self._lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            timestamps, values, _ = self.entries[key]
+            return timestamps, values
+
+    def put(self, key: tuple, timestamps, values,
+            span: Tuple[datetime.datetime, datetime.datetime],
+            generation: int = None) -> None:
+        if len(timestamps) > self.max_points:
+            return
+        with self._lock:
+            if (generation is not None
+                    and generation != self.generation(key[0])):
+                return
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = (timestamps, values, span)
+            self.num_points += len(timestamps)
+            while (len(self.entries) > self.max_entries
+                   or self.num_points > self.max_points):
+                self._pop(next(iter(self.entries)))
+
+    def invalidate(self, table_name: str, time_first: datetime.datetime,
+                   time_last: datetime.datetime) -> None:
+        """Remove results of the table using archived points in
+        [time_first, time_last]"""
+        with self._lock:
+            self.generations[table_name] = self.generation(table_name) + 1
+            for key in list(self.entries.keys()):
+                span_start, span_end = self.entries[key][2]
+                if (key[0] == table_name and time_first <= span_end
+                        and time_last >= span_start):
+                    self._pop(key)
+
+    def _pop(self, key: tuple) -> None:
+        timestamps, _, _ = self.entries.pop(key)
+        self.num_points -= len(timestamps)
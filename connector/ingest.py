@@ -0,0 +1,193 @@
+import asyncio
+import concurrent.futures
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from .settings import Config
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class AsyncIngestor:
+    """Insert points from asyncio code without blocking the event loop
+
+    Points of any table are queued by put, and sent in batches to a
+    worker thread, which runs them through the compression and saves
+    the archived points by a connection of its own. A batch is flushed
+    when it has batch_size points or its first point has waited
+    flush_interval seconds.
+
+    The queue holds at most max_queue_size points, then put waits until
+    a batch is taken, so producers are slowed down to the speed of the
+    database.
+
+    connect: called in the worker thread to get the connection,
+        e.g. functools.partial(connector.connect, host=..., ...)
+    """
+    def __init__(self, connect: Callable, batch_size: int = None,
+                 flush_interval: float = None,
+                 max_queue_size: int = None) -> None:
+        self.connect = connect
+        self.batch_size = batch_size or Config.INGEST_BATCH_SIZE
+        self.flush_interval = (Config.INGEST_FLUSH_INTERVAL
+                               if flush_interval is None else flush_interval)
+        self.max_queue_size = max_queue_size or Config.INGEST_QUEUE_SIZE
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='AsyncIngestor')
+        self._connection = None
+        self._cursor = None
+        self._error: Optional[BaseException] = None
+
+        self.points_received = 0
+        self.points_flushed = 0
+        self.num_flushes = 0
+        self.flush_latency_last = 0.0
+        self.flush_latency_max = 0.0
+        self._flush_latency_sum = 0.0
+
+    def __repr__(self) -> str:
+        return f"AsyncIngestor({self.info()})"
+
+    async def __aenter__(self) -> 'AsyncIngestor':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def info(self) -> Dict[str, float]:
+        """Queue depth, number of points and flush latency in seconds"""
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'points_received': self.points_received,
+            'points_flushed': self.points_flushed,
+            'flushes': self.num_flushes,
+            'flush_latency_last': self.flush_latency_last,
+            'flush_latency_max': self.flush_latency_max,
+            'flush_latency_avg': (self._flush_latency_sum / self.num_flushes
+                                  if self.num_flushes else 0.0),
+        }
+
+    async def start(self) -> None:
+        """Connect in the worker thread and start taking points"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._open)
+        self._queue = asyncio.Queue(self.max_queue_size)
+        self._consumer = asyncio.create_task(self._consume())
+
+    async def put(self, table_name: str, timestamp, value: float) -> None:
+        """Queue a point, wait if the queue is full
+
+        timestamp: datetime or string, the same as INSERT
+        """
+        self._check_running()
+        await self._queue.put((table_name, timestamp, value))
+        self.points_received += 1
+
+    def put_nowait(self, table_name: str, timestamp, value: float) -> None:
+        """Queue a point, raise asyncio.QueueFull if the queue is full"""
+        self._check_running()
+        self._queue.put_nowait((table_name, timestamp, value))
+        self.points_received += 1
+
+    async def flush(self) -> None:
+        """Save every point queued before, and commit"""
+        self._check_running()
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((_FLUSH, done))
+        await asyncio.wait([done, self._consumer],
+                           return_when=asyncio.FIRST_COMPLETED)
+        self._raise_error()
+
+    async def close(self) -> None:
+        """Save every point queued before, then close the connection"""
+        if self._consumer and not self._consumer.done():
+            await self._queue.put((_CLOSE, None))
+            await self._consumer
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close)
+        self._executor.shutdown()
+        self._raise_error()
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch, command = await self._next_batch()
+            if batch:
+                try:
+                    await loop.run_in_executor(self._executor,
+                                               self._flush_batch, batch)
+                except Exception as error:
+                    self._error = error
+                    return
+            if command is _CLOSE:
+                return
+            if command:
+                command.set_result(None)
+
+    async def _next_batch(self) -> tuple:
+        """Points until the batch is full or flush_interval is passed
+
+        return: points, and the future of flush, _CLOSE or None
+        """
+        batch: List[tuple] = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                item = await self._queue.get()
+            else:
+                try:
+                    item = await asyncio.wait_for(
+                        self._queue.get(), deadline - time.monotonic())
+                except asyncio.TimeoutError:
+                    return batch, None
+            if item[0] is _FLUSH or item[0] is _CLOSE:
+                return batch, (item[1] if item[0] is _FLUSH else _CLOSE)
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch, None
+
+    def _open(self) -> None:
+        self._connection = self.connect()
+        self._cursor = self._connection.cursor()
+
+    def _close(self) -> None:
+        if self._cursor:
+            self._cursor.close()
+            self._connection.commit()
+            self._connection.close()
+            self._cursor, self._connection = None, None
+
+    def _flush_batch(self, batch: List[tuple]) -> None:
+        """Insert the points of every table by executemany and commit,
+        in the worker thread"""
+        time_begin = time.perf_counter()
+        table_rows = defaultdict(list)
+        for table_name, timestamp, value in batch:
+            table_rows[table_name].append((timestamp, value))
+        for table_name, rows in table_rows.items():
+            self._cursor.executemany(
+                f"INSERT INTO {table_name} (timestamp, value) "
+                "VALUES (%s, %s)", rows)
+        self._connection.commit()
+
+        latency = time.perf_counter() - time_begin
+        self.points_flushed += len(batch)
+        self.num_flushes += 1
+        self.flush_latency_last = latency
+        self.flush_latency_max = max(self.flush_latency_max, latency)
+        self._flush_latency_sum += latency
+
+    def _raise_error(self) -> None:
+        if self._error:
+            raise self._error
+
+    def _check_running(self) -> None:
+        self._raise_error()
+        if self._consumer is None or self._consumer.done():
+            raise RuntimeError("AsyncIngestor is not running")
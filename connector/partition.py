@@ -0,0 +1,123 @@
+import datetime
+import re
+from typing import List, Optional, Tuple
+
+PERIODS = ('day', 'month', 'year')
+
+
+def period_start(specified_time: datetime.datetime,
+                 period: str) -> datetime.datetime:
+    """start of the day/month/year containing specified_time"""
+    if period == 'day':
+        return datetime.datetime(specified_time.year, specified_time.month,
+                                 specified_time.day)
+    elif period == 'month':
+        return datetime.datetime(specified_time.year, specified_time.month, 1)
+    elif period == 'year':
+        return datetime.datetime(specified_time.year, 1, 1)
+    else:
+        error_message = f"period should be one of {PERIODS}, get {period}"
+        raise ValueError(error_message)
+
+
+def next_period_start(specified_time: datetime.datetime,
+                      period: str) -> datetime.datetime:
+    """start of the day/month/year after the one containing
+    specified_time"""
+    start = period_start(specified_time, period)
+    if period == 'day':
+        return start + datetime.timedelta(days=1)
+    elif period == 'month':
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    else:
+        return start.replace(year=start.year + 1)
+
+
+def periods_after(specified_time: datetime.datetime, period: str,
+                  count: int) -> datetime.datetime:
+    """start of the count-th day/month/year after the one containing
+    specified_time"""
+    working_time = period_start(specified_time, period)
+    for _ in range(count):
+        working_time = next_period_start(working_time, period)
+    return working_time
+
+
+def partition_name(lower_bound: datetime.datetime, period: str) -> str:
+    """example: p_month_20220601"""
+    return f"p_{period}_{lower_bound.strftime('%Y%m%d')}"
+
+
+def future_partition_name(period: str) -> str:
+    """the partition holding all timestamps not partitioned yet"""
+    return f"p_{period}_future"
+
+
+def partition_definitions(lower_bound: datetime.datetime,
+                          upper_bound: datetime.datetime,
+                          period: str) -> Tuple[List[str], datetime.datetime]:
+    """PARTITION definitions covering [lower_bound, upper_bound]
+
+    return: list of definitions, and the upper bound of the last partition
+    """
+    definitions = []
+    working_time = period_start(lower_bound, period)
+    while working_time <= upper_bound:
+        next_time = next_period_start(working_time, period)
+        definitions.append(
+            f"PARTITION {partition_name(working_time, period)} "
+            f"VALUES LESS THAN ('{next_time.strftime('%Y-%m-%d %H:%M:%S')}')")
+        working_time = next_time
+    return definitions, working_time
+
+
+def stmt_partition_by(period: str,
+                      lower_bound: datetime.datetime = None,
+                      upper_bound: datetime.datetime = None
+                      ) -> Tuple[str, Optional[datetime.datetime]]:
+    """PARTITION BY clause of CREATE/ALTER TABLE
+
+    Partitions are created for [lower_bound, upper_bound] if given,
+    the later timestamps go to the future partition.
+    return: the clause, and the upper bound of the last partition
+    """
+    if period not in PERIODS:
+        error_message = f"period should be one of {PERIODS}, get {period}"
+        raise ValueError(error_message)
+    definitions, partition_bound = [], None
+    if lower_bound:
+        definitions, partition_bound = partition_definitions(
+            lower_bound, upper_bound, period)
+    definitions.append(f"PARTITION {future_partition_name(period)} "
+                       "VALUES LESS THAN (MAXVALUE)")
+    stmt = ("PARTITION BY RANGE COLUMNS(timestamp) ("
+            + ", ".join(definitions) + ")")
+    return stmt, partition_bound
+
+
+def parse_partition_names(
+        names: List[str]
+) -> Optional[Tuple[str, Optional[datetime.datetime]]]:
+    """Get period and the upper bound of the last partition by names
+
+    names: partition names of a table created by this connector
+    return: None if the table is not partitioned by this connector
+    """
+    period, lower_bounds = None, []
+    for name in names:
+        matched = re.fullmatch(r"p_(day|month|year)_(\d{8}|future)",
+                               name or '')
+        if not matched:
+            continue
+        period = matched.group(1)
+        if matched.group(2) != 'future':
+            lower_bounds.append(
+                datetime.datetime.strptime(matched.group(2), '%Y%m%d'))
+
+    if not period:
+        return None
+    if not lower_bounds:
+        return period, None
+    return period, next_period_start(max(lower_bounds), period)
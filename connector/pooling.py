@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+from typing import Dict
+
+from mysql.connector.errors import PoolError
+
+from .connection import Connection, connect
+from .settings import Config
+
+
+class ConnectionPool:
+    """Connections kept open for short-lived users
+
+    Connections are created when needed, up to pool_size, and handed
+    out by get_connection. Their cursors share the compression of the
+    tables (see registry.CompressorRegistry), so a connection from the
+    pool continues the compression of the previous user.
+
+    A connection idle for more than health_check_interval seconds is
+    pinged before it is handed out, and reconnected if it is broken.
+    """
+    def __init__(self, pool_size: int = None,
+                 health_check_interval: float = None,
+                 **connect_kwargs) -> None:
+        self.pool_size = pool_size or Config.POOL_SIZE
+        self.health_check_interval = (
+            Config.POOL_HEALTH_CHECK_INTERVAL
+            if health_check_interval is None else health_check_interval)
+        self.connect_kwargs = connect_kwargs
+        # (connection, time it was returned), the latest returned one
+        # is handed out first, so idle ones are not pinged too often
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._num_created = 0
+        self.num_reconnects = 0
+        self.num_waits = 0
+
+    def __repr__(self) -> str:
+        return f"ConnectionPool({self.info()})"
+
+    def __enter__(self) -> 'ConnectionPool':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def info(self) -> Dict[str, int]:
+        return {'size': self.pool_size, 'created': self._num_created,
+                'idle': self._idle.qsize(),
+                'in_use': self._num_created - self._idle.qsize(),
+                'reconnects': self.num_reconnects, 'waits': self.num_waits}
+
+    def get_connection(self, timeout: float = None) -> 'PooledConnection':
+        """Get an idle connection, or create one if the pool is not full
+
+        If all connections are in use, wait for one at most timeout
+        seconds (forever if None), then raise PoolError.
+        """
+        try:
+            connection, time_returned = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._create_connection()
+            if connection:
+                return PooledConnection(self, connection)
+            self.num_waits += 1
+            try:
+                connection, time_returned = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise PoolError(
+                    f"No connection available in {timeout} seconds, "
+                    f"pool_size={self.pool_size}") from None
+
+        if time.monotonic() - time_returned > self.health_check_interval:
+            try:
+                if not connection.is_connected():
+                    connection.reconnect()
+                    self.num_reconnects += 1
+            except Exception:
+                self._close_connection(connection)
+                raise
+        return PooledConnection(self, connection)
+
+    def close(self) -> None:
+        """Close the idle connections, the ones in use are closed when
+        returned"""
+        self.pool_size = 0
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close_connection(connection)
+
+    def _create_connection(self):
+        """New connection, None if the pool is full"""
+        with self._lock:
+            if self._num_created >= self.pool_size:
+                return None
+            self._num_created += 1
+        try:
+            return connect(**self.connect_kwargs)
+        except Exception:
+            with self._lock:
+                self._num_created -= 1
+            raise
+
+    def _put_connection(self, connection) -> None:
+        """Take back a connection, the transaction not committed is
+        rolled back, and so is the compression state of the tables it
+        inserted, see Connection.rollback"""
+        if self._num_created > self.pool_size:
+            self._close_connection(connection)
+            return
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            self._close_connection(connection)
+            return
+        self._idle.put((connection, time.monotonic()))
+
+    def _close_connection(self, connection) -> None:
+        with self._lock:
+            self._num_created -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+class PooledConnection:
+    """Connection got from ConnectionPool, returned to the pool by close
+
+    Other attributes are the same as Connection.
+    """
+    def __init__(self, pool: ConnectionPool, connection: Connection) -> None:
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, attr):
+        if self._connection is None:
+            raise PoolError("The connection is returned to the pool")
+        return getattr(self._connection, attr)
+
+    def __enter__(self) -> 'PooledConnection':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._pool._put_connection(self._connection)
+            self._connection = None
@@ -0,0 +1,158 @@
+import datetime
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .compression import Compression
+from .data_structure import (ArchievedIndex, ChunkBuffer, DataPoint,
+                             ResultCache, RollupBuffer)
+from .settings import Config
+
+
+class TableRegistry:
+    """Compression state of the tables of one database, shared by all
+    cursors and connections to it
+
+    Tables are identified by name within the database. An insert holds
+    the lock of its table while compressing and saving, so different
+    tables are written in parallel and the points of one table are
+    archived in order.
+    """
+    def __init__(self) -> None:
+        self.compressions: Dict[str, Compression] = {}
+        # open chunks of tables created with storage=chunk
+        self.chunk_buffers: Dict[str, ChunkBuffer] = {}
+        # buckets not saved of tables created with rollup=...
+        self.rollup_buffers: Dict[str, RollupBuffer] = {}
+        # (period, upper bound of the last partition) of partitioned
+        # tables, None for tables without partitions
+        self.partitions: Dict[str, Optional[tuple]] = {}
+        # whether the archived rows of a table have the segment_min and
+        # segment_max columns
+        self.envelopes: Dict[str, bool] = {}
+        # in-memory indexes of the latest archived points, see
+        # archieved_index
+        self.archieved_indexes: Dict[str, ArchievedIndex] = {}
+        # cache of range select results, see cache
+        self.result_cache: Optional[ResultCache] = None
+        self._table_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"TableRegistry({sorted(self.compressions)})"
+
+    def register(self, table_name: str, comp: Compression,
+                 chunk_buffer: ChunkBuffer = None,
+                 partition: Optional[tuple] = None,
+                 rollup_buffer: RollupBuffer = None) -> None:
+        """Replace the state of a table when it is created"""
+        with self.lock(table_name):
+            self.partitions[table_name] = partition
+            self.restore(table_name, comp, chunk_buffer, rollup_buffer)
+            # points of the table dropped before are forgotten
+            self.archieved_indexes.pop(table_name, None)
+            if self.result_cache is not None:
+                self.result_cache.invalidate(
+                    table_name, datetime.datetime.min, datetime.datetime.max)
+
+    def restore(self, table_name: str, comp: Compression,
+                chunk_buffer: ChunkBuffer = None,
+                rollup_buffer: RollupBuffer = None) -> None:
+        """Set the compression, open chunk and rollup buckets of a
+        table, the lock of the table should be held"""
+        self.compressions[table_name] = comp
+        if chunk_buffer:
+            self.chunk_buffers[table_name] = chunk_buffer
+        else:
+            self.chunk_buffers.pop(table_name, None)
+        if rollup_buffer:
+            self.rollup_buffers[table_name] = rollup_buffer
+        else:
+            self.rollup_buffers.pop(table_name, None)
+
+    def discard(self, table_name: str) -> None:
+        """Drop the compression, open chunk, rollup buckets and index of
+        a table whose inserts are rolled back, the lock of the table
+        should be held"""
+        self.compressions.pop(table_name, None)
+        self.chunk_buffers.pop(table_name, None)
+        self.rollup_buffers.pop(table_name, None)
+        self.archieved_indexes.pop(table_name, None)
+        if self.result_cache is not None:
+            self.result_cache.invalidate(
+                table_name, datetime.datetime.min, datetime.datetime.max)
+
+    def add_archieved_points(self, table_name: str,
+                             points: List[DataPoint]) -> None:
+        """Add points archived by any cursor to the index of the table
+        and invalidate the cached results they change, the lock of the
+        table should be held"""
+        if not points:
+            return
+        archieved_index = self.archieved_indexes.get(table_name)
+        if archieved_index is not None:
+            archieved_index.append(points)
+        if self.result_cache is not None:
+            self.result_cache.invalidate(
+                table_name, min(pnt.timestamp for pnt in points),
+                max(pnt.timestamp for pnt in points))
+
+    def archieved_index(self, table_name: str,
+                        max_points: int) -> ArchievedIndex:
+        """In-memory index of the table, created with max_points by the
+        first cursor using it, the lock of the table should be held"""
+        if table_name not in self.archieved_indexes:
+            self.archieved_indexes[table_name] = ArchievedIndex(max_points)
+        return self.archieved_indexes[table_name]
+
+    def cache(self, max_entries: int) -> ResultCache:
+        """Cache of range select results, created with max_entries by
+        the first cursor using it"""
+        if self.result_cache is None:
+            with self._lock:
+                if self.result_cache is None:
+                    self.result_cache = ResultCache(
+                        max_entries, Config.CACHE_MAX_POINTS)
+        return self.result_cache
+
+    def lock(self, table_name: str) -> threading.Lock:
+        """Lock held while compressing and saving points of the table"""
+        table_lock = self._table_locks.get(table_name)
+        if table_lock is None:
+            with self._lock:
+                table_lock = self._table_locks.setdefault(
+                    table_name, threading.Lock())
+        return table_lock
+
+
+class CompressorRegistry:
+    """TableRegistry of every database of the process
+
+    A database is identified by (host, port, database name) of the
+    connection, see Connection.table_namespace, so tables of the same
+    name in different databases or servers never share a compression.
+    """
+    def __init__(self) -> None:
+        self.databases: Dict[Tuple[str, int, Optional[str]],
+                             TableRegistry] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"CompressorRegistry({sorted(self.databases, key=str)})"
+
+    def tables(self, namespace: Tuple[str, int, Optional[str]]
+               ) -> TableRegistry:
+        """State of the tables of the database of namespace"""
+        table_registry = self.databases.get(namespace)
+        if table_registry is None:
+            with self._lock:
+                table_registry = self.databases.setdefault(
+                    namespace, TableRegistry())
+        return table_registry
+
+    def clear(self) -> None:
+        """Forget every table, e.g. after dropping the database"""
+        with self._lock:
+            self.databases.clear()
+
+
+compressor_registry = CompressorRegistry()
@@ -0,0 +1,154 @@
+import datetime
+from typing import List, Optional, Tuple
+
+LEVELS = {
+    'minute': datetime.timedelta(minutes=1),
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+EPOCH = datetime.datetime(1970, 1, 1)
+# aggregate functions answered by the rollups, integral is computed
+# from the reconstructed points
+FUNCTIONS = ('avg', 'min', 'max', 'sum', 'count')
+
+
+def parse_levels(text: str) -> Tuple[str, ...]:
+    """levels of rollup=..., e.g. 'minute+day' -> ('minute', 'day')"""
+    levels = tuple(text.split('+'))
+    if not all(level in LEVELS for level in levels):
+        error_message = (f"rollup should be levels of {tuple(LEVELS)} "
+                         f"joined by '+', get {text}")
+        raise ValueError(error_message)
+    return levels
+
+
+def rollup_table_name(table_name: str, level: str) -> str:
+    """example: voltage_rollup_hour"""
+    return f"{table_name}_rollup_{level}"
+
+
+def bucket_start(specified_time: datetime.datetime,
+                 level: str) -> datetime.datetime:
+    """start of the minute/hour/day containing specified_time"""
+    size = LEVELS[level]
+    return EPOCH + (specified_time - EPOCH) // size * size
+
+
+def stmt_create_table(table_name: str, level: str) -> str:
+    """The table is kept if it exists, e.g. left by a table dropped
+    before, and emptied by stmt_clear_table"""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {rollup_table_name(table_name, level)} ("
+        "bucket DATETIME NOT NULL PRIMARY KEY, "
+        "num_points BIGINT NOT NULL, "
+        "value_sum DOUBLE NOT NULL, "
+        "value_min DOUBLE NOT NULL, "
+        "value_max DOUBLE NOT NULL, "
+        "first_time DATETIME(6) NOT NULL, "
+        "first_value DOUBLE NOT NULL, "
+        "last_time DATETIME(6) NOT NULL, "
+        "last_value DOUBLE NOT NULL)")
+
+
+def stmt_clear_table(table_name: str, level: str) -> str:
+    return f"TRUNCATE TABLE {rollup_table_name(table_name, level)}"
+
+
+def stmt_upsert(table_name: str, level: str, num_buckets: int) -> str:
+    """Multi-row INSERT of bucket summaries, merged with the summaries
+    already saved for the same buckets
+
+    MySQL assigns from left to right, so first_value and last_value are
+    compared with the old first_time and last_time.
+    """
+    placeholders = ", ".join(
+        ["(%s, %s, %s, %s, %s, %s, %s, %s, %s)"] * num_buckets)
+    return (
+        f"INSERT INTO {rollup_table_name(table_name, level)} "
+        "(bucket, num_points, value_sum, value_min, value_max, "
+        "first_time, first_value, last_time, last_value) "
+        f"VALUES {placeholders} "
+        "ON DUPLICATE KEY UPDATE "
+        "num_points = num_points + VALUES(num_points), "
+        "value_sum = value_sum + VALUES(value_sum), "
+        "value_min = LEAST(value_min, VALUES(value_min)), "
+        "value_max = GREATEST(value_max, VALUES(value_max)), "
+        "first_value = IF(VALUES(first_time) < first_time, "
+        "VALUES(first_value), first_value), "
+        "first_time = LEAST(first_time, VALUES(first_time)), "
+        "last_value = IF(VALUES(last_time) >= last_time, "
+        "VALUES(last_value), last_value), "
+        "last_time = GREATEST(last_time, VALUES(last_time))")
+
+
+def stmt_select_summary(table_name: str, level: str,
+                        time_start: Optional[datetime.datetime],
+                        time_end: Optional[datetime.datetime]) -> tuple:
+    """Count, sum, min and max of the buckets in [time_start, time_end)
+
+    return: stmt, params
+    """
+    conditions, params = [], []
+    if time_start is not None:
+        conditions.append("bucket >= %s")
+        params.append(time_start)
+    if time_end is not None:
+        conditions.append("bucket < %s")
+        params.append(time_end)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return (
+        "SELECT SUM(num_points), SUM(value_sum), MIN(value_min), "
+        f"MAX(value_max) FROM {rollup_table_name(table_name, level)}"
+        f"{where}", params)
+
+
+def covering_level(levels: Tuple[str, ...],
+                   time_start: Optional[datetime.datetime],
+                   time_end: Optional[datetime.datetime],
+                   time_step: Optional[datetime.timedelta]
+                   ) -> Optional[str]:
+    """The coarsest level whose buckets cover [time_start, time_end]
+    exactly, None if there is none
+
+    time_start should be the start of a bucket, and the next point
+    after time_end (time_end + time_step) the start of the next bucket.
+    A missing bound is covered by every level.
+    """
+    for level in sorted(levels, key=LEVELS.get, reverse=True):
+        if (time_start is not None
+                and bucket_start(time_start, level) != time_start):
+            continue
+        if time_end is not None:
+            if not time_step:
+                continue
+            time_next = time_end + time_step
+            if bucket_start(time_next, level) != time_next:
+                continue
+        return level
+    return None
+
+
+def combine(summaries: List[tuple], functions: Tuple[str]) -> tuple:
+    """Aggregate (count, sum, min, max) of buckets by functions, the
+    same as aggregate_values of the points of the buckets"""
+    summaries = [summary for summary in summaries
+                 if summary and summary[0]]
+    count = sum(int(summary[0]) for summary in summaries)
+    result = []
+    for func in functions:
+        if func == 'count':
+            result.append(count)
+        elif not count:
+            result.append(None)
+        elif func == 'sum':
+            result.append(float(sum(summary[1] for summary in summaries)))
+        elif func == 'avg':
+            result.append(sum(summary[1] for summary in summaries) / count)
+        elif func == 'min':
+            result.append(min(summary[2] for summary in summaries))
+        elif func == 'max':
+            result.append(max(summary[3] for summary in summaries))
+        else:
+            raise ValueError(f"aggregate function {func} is not support "
+                             "by rollups")
+    return tuple(result)
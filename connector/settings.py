@@ -1,2 +1,43 @@
 class Config:
     DEV_MARGIN = 5
+    # max number of archived points written by one multi-row INSERT
+    INSERT_BATCH_SIZE = 1000
+    # number of archived rows read from the server at once when SELECT
+    FETCH_CHUNK_SIZE = 1000
+    # max number of archived points of a table kept in memory,
+    # 0 to disable the in-memory index
+    INDEX_SIZE = 0
+    # max number of range select results cached, 0 to disable the cache
+    CACHE_SIZE = 0
+    # max number of reconstructed points in the cache
+    CACHE_MAX_POINTS = 10_000_000
+    # number of parsed INSERT/SELECT templates kept by stmt_parser
+    STMT_CACHE_SIZE = 256
+    # number of server-side prepared statements kept by a cursor for
+    # archived-point writes and boundary lookups, 0 to disable
+    PREPARED_STMT_CACHE_SIZE = 32
+    # time bucket of a chunk of tables created with storage=chunk,
+    # in seconds
+    CHUNK_SECONDS = 3600
+    # a gap between two inserted points longer than it, in seconds,
+    # breaks the reconstruction, 0 to never break, see max_gap=xxx of
+    # CREATE TABLE
+    MAX_GAP = 0
+    # number of partitions kept after the one of the latest archived
+    # point of tables created with partition_by=xxx, added by CREATE
+    # TABLE and Connection.commit
+    PARTITION_MARGIN = 3
+    # points inserted by one flush of AsyncIngestor
+    INGEST_BATCH_SIZE = 1000
+    # max seconds a point waits in AsyncIngestor before flushed
+    INGEST_FLUSH_INTERVAL = 1.0
+    # max number of points queued by AsyncIngestor
+    INGEST_QUEUE_SIZE = 100_000
+    # number of time slices selected in parallel by
+    # Cursor.select_parallel
+    PARALLEL_PARTITIONS = 4
+    # max number of connections of connector.pool
+    POOL_SIZE = 5
+    # connections of connector.pool idle for more seconds are pinged
+    # before handed out
+    POOL_HEALTH_CHECK_INTERVAL = 30.0
@@ -1,5 +1,9 @@
+import datetime
+import functools
 import re
-from typing import List
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from .settings import Config
 
 
 def preprocessing(stmt_origin: str) -> str:
@@ -9,43 +13,440 @@ def preprocessing(stmt_origin: str) -> str:
     2. remove redundant spaces
     3. to lower case
     """
-    stmt_working = stmt_origin.replace('\n', ' ')
-    stmt_working = re.sub('\s+', ' ', stmt_working).strip()
+    stmt_working = " ".join(stmt_origin.split())
     stmt_working = stmt_working.lower()
     return stmt_working
 
 
+def classify(stmt: str) -> str:
+    """type of a preprocessed stmt by its leading keywords
+
+    return: 'insert', 'select', 'create table', 'use' or 'other'
+    """
+    if stmt.startswith('insert'):
+        return 'insert'
+    elif stmt.startswith('select'):
+        return 'select'
+    elif stmt.startswith('create table'):
+        return 'create table'
+    elif stmt.startswith('use '):
+        return 'use'
+    else:
+        return 'other'
+
+
+def parse_timestamp(time_string: str) -> datetime.datetime:
+    """'Y-m-d H:M:S' to datetime
+
+    fromisoformat is much faster than strptime, which is kept for
+    the strings not zero-padded, e.g. 2022-6-2 1:17:01
+    """
+    try:
+        return datetime.datetime.fromisoformat(time_string)
+    except ValueError:
+        return datetime.datetime.strptime(time_string, "%Y-%m-%d %H:%M:%S")
+
+
+def to_datetime(time_value) -> datetime.datetime:
+    """datetime or 'Y-m-d H:M:S' string to datetime"""
+    if isinstance(time_value, datetime.datetime):
+        return time_value
+    return parse_timestamp(time_value)
+
+
 def timestamp_pattern() -> str:
-    """MySQL timestamp format
+    """MySQL timestamp format, fractional seconds are optional
 
     example: 2022-06-05 21:07:11
     """
-    return r"\d+-\d+-\d+\s\d+:\d+:\d+"
+    return r"\d+-\d+-\d+\s\d+:\d+:\d+(?:\.\d+)?"
 
 
 def value_pattern() -> str:
-    """int or floating point
+    """number literal of MySQL, sign, fraction and exponent are optional
 
-    floating point is optional
     example:
       15
-      3.14
-      0.98701
+      -3.14
+      +.5
+      1e-3
+    """
+    return r"[-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?"
+
+
+def insert_row_pattern() -> str:
+    """one ('timestamp', value) tuple of an INSERT statement
+
+    example: ('2022-06-02 21:17:01', -3.5)
     """
-    return "\d+(.\d+)?"
+    return (r"\(\s?'(" + timestamp_pattern() + r")'\s?,\s?("
+            + value_pattern() + r")\s?\)")
+
+
+TIMESTAMP_LITERAL_REGEX = re.compile(r"'(" + timestamp_pattern() + r")'")
+INSERT_ROW_REGEX = re.compile(insert_row_pattern())
+INSERT_PARAM_ROW_REGEX = re.compile(r"\(\s?%s\s?,\s?%s\s?\)")
+INSERT_TUPLE_REGEX = re.compile(r"\([^()]*\)")
+INSERT_VALUES_REGEX = re.compile(r"\bvalues\s?\(")
+INSERT_HEAD_REGEX = re.compile(r"into\s(\w+)\s?(?:\(([^)]*)\))?")
+USE_REGEX = re.compile(r"^\s*use\s+`?([^`\s;]+)`?\s*;?\s*$",
+                       re.IGNORECASE)
+SELECT_TABLE_REGEX = re.compile(r"from\s(\w+)")
+SELECT_ONE_REGEX = re.compile(r"where\s+?timestamp\s+?=\s+?(?:'\?'|%s)")
+TIME_CONDITION_REGEX = re.compile(r"timestamp\s?([<>])=?\s?(?:'\?'|%s)")
+VALUE_CONDITION_REGEX = re.compile(
+    r"\bvalue\s?([<>]=?)\s?(%s|" + value_pattern() + r")(?![\w.])")
+VALUE_COLUMN_REGEX = re.compile(r"\bvalue\b")
+# the conditions of WHERE are only joined by AND
+WHERE_UNSUPPORTED_REGEX = re.compile(r"\b(?:or|not|xor)\b|[()]|\|\||!(?!=)")
+TIME_BETWEEN_REGEX = re.compile(
+    r"timestamp between (?:'\?'|%s) and (?:'\?'|%s)")
+STEP_REGEX = re.compile(
+    r"\sstep\s'(\d+)\s?(second|minute|hour|day)s?'(?:\s(linear|minmax))?")
+AGGREGATE_REGEX = re.compile(
+    r"(avg|min|max|sum|count|integral)\s?\(\s?(value|timestamp|\*)\s?\)"
+    r"(\s(as\s)?\w+)?")
+
+
+class InsertTemplate(NamedTuple):
+    table_name: str
+    # column names listed after the table name, empty if not listed
+    columns: Tuple[str, ...]
 
 
-def find_time_condition(stmt: str) -> List[str]:
-    condition_pattern = (r"timestamp\s?[<>]=?\s?\'"
-                         + timestamp_pattern() + r"\'")
-    result = re.findall(condition_pattern, stmt)
-    return result
+class SelectTemplate(NamedTuple):
+    table_name: str
+    # indexes of the time literals of the stmt, None if no limit
+    position_start: Optional[int]
+    position_end: Optional[int]
+    # WHERE timestamp = '...'
+    is_select_one: bool
+    # number of %s placeholders
+    num_params: int
+    # aggregate functions of the select list, empty if not aggregated
+    aggregates: Tuple[str, ...]
+    # interval of the grid of a downsampled select, None if not
+    step: Optional[datetime.timedelta]
+    downsample_mode: str
+    # (operator, index of the %s placeholder or None, literal or None)
+    # of every condition on value, e.g. value > 250
+    value_conditions: Tuple[Tuple[str, Optional[int], Optional[float]],
+                            ...]
+
+
+def parse_insert(stmt: str, params: Sequence[Any] = None
+                 ) -> Tuple[InsertTemplate, List[Tuple[Any, Any]]]:
+    """template and (timestamp, value) pairs of a preprocessed
+    INSERT stmt
+
+    The part before VALUES is parsed once per shape by
+    insert_template.
+    If params is given, the rows are (%s, %s) placeholders and the pairs
+    are taken from params as they are, otherwise the pairs are strings
+    of the literals.
+    ValueError is raised unless every tuple after VALUES is one of them.
+    """
+    template, stmt_values = _split_insert(stmt)
+    if not stmt_values.rstrip(';').rstrip().endswith(')'):
+        error_message = f"Unsupported VALUES of INSERT: {stmt_values}"
+        raise ValueError(error_message)
+    row_regex = (INSERT_ROW_REGEX if params is None
+                 else INSERT_PARAM_ROW_REGEX)
+    rows = row_regex.findall(stmt_values)
+    # a tuple has no parenthesis inside, so every one is parsed if
+    # the numbers are the same
+    if not (len(rows) == stmt_values.count('(')
+            == stmt_values.count(')')):
+        _raise_unparsed_tuple(stmt_values, row_regex)
+    if params is None:
+        return template, rows
+
+    _check_params(params, len(rows) * 2)
+    return template, list(zip(params[0::2], params[1::2]))
+
+
+def parse_insert_template(stmt: str) -> InsertTemplate:
+    """template of a preprocessed INSERT stmt, whose rows are not
+    parsed, e.g. of executemany"""
+    template, _ = _split_insert(stmt)
+    return template
+
+
+def parse_use(stmt_origin: str) -> str:
+    """database of a USE stmt, parsed from the stmt not lowercased
+    since database names may be case sensitive"""
+    matched = USE_REGEX.match(stmt_origin)
+    if not matched:
+        error_message = f"Unsupported USE statement: {stmt_origin}"
+        raise NotImplementedError(error_message)
+    return matched.group(1)
+
+
+@functools.lru_cache(maxsize=Config.STMT_CACHE_SIZE)
+def insert_template(stmt_head: str) -> InsertTemplate:
+    """parse INSERT INTO table_name (col, ...) before VALUES
+
+    The columns should be (timestamp, value) or not listed, since the
+    fields of every row are taken in this order.
+    """
+    matched = INSERT_HEAD_REGEX.search(stmt_head)
+    if not matched:
+        raise ValueError(f"table name is not found in {stmt_head}")
+    columns = ()
+    if matched.group(2):
+        columns = tuple(col.strip().strip('`')
+                        for col in matched.group(2).split(','))
+        if columns != ('timestamp', 'value'):
+            error_message = ("columns of INSERT should be (timestamp, "
+                             f"value), get ({matched.group(2)})")
+            raise NotImplementedError(error_message)
+    return InsertTemplate(matched.group(1), columns)
+
+
+def parse_select(stmt: str, params: Sequence[Any] = None
+                 ) -> Tuple[SelectTemplate, List[Any]]:
+    """template and times of a preprocessed SELECT stmt
+
+    The time literals are replaced by '?', so the stmts only different
+    in time share one template parsed by select_template.
+    The times are strings of the literals, or params if given. Literals
+    and %s placeholders can not be mixed.
+    """
+    split_literals = TIMESTAMP_LITERAL_REGEX.split(stmt)
+    template = select_template("'?'".join(split_literals[0::2]))
+    if params is None:
+        return template, split_literals[1::2]
+
+    if len(split_literals) > 1:
+        raise ValueError("time literals and parameters can not be mixed")
+    _check_params(params, template.num_params)
+    return template, params
 
 
-def get_table_name_from_select(stmt: str) -> str:
-    return re.search(r"from\s(\w+)", stmt).group(1)
+@functools.lru_cache(maxsize=Config.STMT_CACHE_SIZE)
+def select_template(stmt: str) -> SelectTemplate:
+    """parse SELECT stmt with time literals replaced by '?'
 
+    See select_time_positions for the supported WHERE clauses.
+    """
+    table_name = SELECT_TABLE_REGEX.search(stmt).group(1)
+    aggregates = select_aggregates(stmt)
+    step, downsample_mode = select_step(stmt)
+    value_conditions = select_value_conditions(stmt)
+    position_start, position_end, is_select_one = select_time_positions(
+        stmt, bool(value_conditions))
+    if step and (aggregates or is_select_one):
+        raise NotImplementedError(
+            "STEP is only support on range select without aggregation")
+    if value_conditions and (aggregates or is_select_one or step):
+        raise NotImplementedError(
+            "conditions on value are only support on range select "
+            "without aggregation and STEP")
+    return SelectTemplate(table_name, position_start, position_end,
+                          is_select_one, stmt.count("%s"), aggregates,
+                          step, downsample_mode, value_conditions)
+
+
+def select_time_positions(stmt: str, has_value_conditions: bool = False
+                          ) -> Tuple[Optional[int], Optional[int], bool]:
+    """positions of start and end time among the time literals
+
+    case 0(no_limit): no time-related limit in where or no where clause
+    case 1(range): WHERE with both left and right
+    case 2(after): no right limit
+    case 3(before): no left limit
+    case 4(one): WHERE timestamp = '...'
+    case 1 can also be WHERE timestamp BETWEEN '...' AND '...'
+    Any case can have conditions on value, see select_value_conditions.
+    return: position_start, position_end and whether it is case 4
+    """
+    stmt_split_where = stmt.split("where")
+    if len(stmt_split_where) > 2:
+        raise ValueError(f"Multiple where in {stmt}")
+    if len(stmt_split_where) == 1:  # case 0
+        return None, None, False
+
+    idx_where = len(stmt_split_where[0])
+    time_between = TIME_BETWEEN_REGEX.search(stmt, idx_where)
+    if time_between:  # case 1
+        if TIME_CONDITION_REGEX.search(stmt, idx_where):
+            error_message = ("complex where clause with more than "
+                             "2 conditions about time is not support")
+            raise NotImplementedError(error_message)
+        position = _position(stmt, time_between)
+        return position, position + 1, False
+
+    time_conditions = list(TIME_CONDITION_REGEX.finditer(stmt, idx_where))
+    if not time_conditions:
+        matched = SELECT_ONE_REGEX.search(stmt)
+        if matched:  # case 4
+            return _position(stmt, matched), None, True
+        if has_value_conditions:  # case 0
+            return None, None, False
+        raise ValueError("The format of query should be: "
+                         "...where timestamp = 'Y-m-d H:M:S'")
+
+    if len(time_conditions) > 2:
+        error_message = ("complex where clause with more than "
+                         "2 conditions about time is not support")
+        raise NotImplementedError(error_message)
+
+    positions = [_position(stmt, matched) for matched in time_conditions]
+    if len(time_conditions) == 2:  # case 1
+        return positions[0], positions[1], False
+    if time_conditions[0].group(1) == "<":  # case 3
+        return None, positions[0], False
+    else:  # case 2
+        return positions[0], None, False
+
+
+def select_step(stmt: str) -> Tuple[Optional[datetime.timedelta], str]:
+    """STEP clause of a downsampled select
+
+    example: ... WHERE ... STEP '15 minute' MINMAX
+    units: second, minute, hour, day
+    mode: LINEAR (default) or MINMAX, see Compression.select_downsampled
+    return: step (None if no STEP clause), mode
+    """
+    matched = STEP_REGEX.search(stmt)
+    if not matched:
+        return None, 'linear'
+    step = datetime.timedelta(
+        **{matched.group(2) + 's': int(matched.group(1))})
+    return step, matched.group(3) or 'linear'
+
+
+def select_value_conditions(stmt: str
+                            ) -> Tuple[Tuple[str, Optional[int],
+                                             Optional[float]], ...]:
+    """conditions on value of the WHERE clause
+
+    example: ... WHERE timestamp BETWEEN ... AND value > %s
+        -> (('>', 2, None), )
+    The threshold is a number or a %s placeholder.
+    NotImplementedError is raised for OR, NOT or parentheses in the
+    WHERE clause, and for other conditions on value, e.g. value = 3.
+    return: (operator, position of the placeholder among the time
+        literals and placeholders, literal) of every condition
+    """
+    if "where" not in stmt:
+        return ()
+    idx_where = stmt.index("where")
+    if WHERE_UNSUPPORTED_REGEX.search(stmt, idx_where):
+        error_message = ("only conditions joined by AND are support in "
+                         f"the where clause of {stmt}")
+        raise NotImplementedError(error_message)
+    conditions = []
+    for matched in VALUE_CONDITION_REGEX.finditer(stmt, idx_where):
+        if matched.group(2) == "%s":
+            conditions.append((matched.group(1), _position(stmt, matched),
+                               None))
+        else:
+            conditions.append((matched.group(1), None,
+                               float(matched.group(2))))
+    if len(VALUE_COLUMN_REGEX.findall(stmt, idx_where)) != len(conditions):
+        error_message = ("conditions on value should be value <, <=, > "
+                         f"or >= a number or %s, get {stmt}")
+        raise NotImplementedError(error_message)
+    return tuple(conditions)
+
+
+def select_aggregates(stmt: str) -> Tuple[str, ...]:
+    """aggregate functions of the select list
+
+    example: SELECT AVG(value), COUNT(*) FROM ... -> ('avg', 'count')
+    return: empty if the select list has no aggregate function
+    """
+    select_list = stmt[len("select"):stmt.index(" from ")].split(",")
+    aggregates = []
+    for column in select_list:
+        matched = AGGREGATE_REGEX.fullmatch(column.strip())
+        if not matched:
+            aggregates.append(None)
+        elif matched.group(1) != 'count' and matched.group(2) != 'value':
+            raise NotImplementedError(
+                f"{matched.group(1)} is only support on value")
+        else:
+            aggregates.append(matched.group(1))
+
+    if not any(aggregates):
+        return ()
+    if not all(aggregates):
+        raise NotImplementedError(
+            "aggregate functions can not be selected with columns")
+    return tuple(aggregates)
+
+
+def _split_insert(stmt: str) -> Tuple[InsertTemplate, str]:
+    """template and the part from the first tuple after VALUES"""
+    matched = INSERT_VALUES_REGEX.search(stmt)
+    if not matched:
+        raise ValueError(f"VALUES is not found in {stmt}")
+    return (insert_template(stmt[:matched.start()]),
+            stmt[matched.end() - 1:].rstrip())
+
+
+def _raise_unparsed_tuple(stmt_values: str, row_regex: re.Pattern):
+    for row_text in INSERT_TUPLE_REGEX.findall(stmt_values):
+        if not row_regex.fullmatch(row_text):
+            row_expected = ("('timestamp', number)"
+                            if row_regex is INSERT_ROW_REGEX else "(%s, %s)")
+            error_message = (f"{row_expected} is expected in VALUES, "
+                             f"get {row_text}")
+            raise ValueError(error_message)
+    error_message = f"Unsupported VALUES of INSERT: {stmt_values}"
+    raise ValueError(error_message)
+
+
+def _position(stmt: str, matched: re.Match) -> int:
+    """index of the time literal or placeholder matched among the ones
+    of stmt"""
+    return (stmt.count("'?'", 0, matched.start())
+            + stmt.count("%s", 0, matched.start()))
+
+
+def _check_params(params: Sequence[Any], num_params: int):
+    if not isinstance(params, (list, tuple)):
+        raise ValueError("params should be a list or tuple, "
+                         f"get {type(params).__name__}")
+    if len(params) != num_params:
+        raise ValueError(f"{num_params} parameters are expected, "
+                         f"get {len(params)}")
+
+
+def append_create_definitions(stmt: str, definitions: List[str]) -> str:
+    """add definitions before the closing parenthesis of CREATE TABLE"""
+    idx_close = stmt.rindex(')')
+    return (stmt[:idx_close].rstrip() + ", " + ", ".join(definitions)
+            + stmt[idx_close:])
+
+
+def primary_key_with_timestamp(stmt: str) -> str:
+    """make the primary key of CREATE TABLE contain timestamp
+
+    MySQL requires the partition column in every unique key.
+    For example,
+      id int not null auto_increment primary key, ...
+    becomes
+      id int not null auto_increment, ..., primary key (id, timestamp)
+    """
+    table_key = re.search(r"primary key\s?\(([^)]*)\)", stmt)
+    if table_key:
+        columns = [col.strip() for col in table_key.group(1).split(',')]
+        if 'timestamp' in columns:
+            return stmt
+        columns.append('timestamp')
+        return (stmt[:table_key.start()]
+                + f"primary key ({', '.join(columns)})"
+                + stmt[table_key.end():])
 
-def get_first_time_from_string(stmt: str) -> str:
-    result = re.findall(timestamp_pattern(), stmt)[0]
-    return result
+    idx_open = stmt.index('(') + 1
+    column_key = re.search(r"(\w+) [^,]*?(\s?primary key)", stmt[idx_open:])
+    if not column_key:
+        return stmt
+    column = column_key.group(1)
+    stmt = (stmt[:idx_open + column_key.start(2)]
+            + stmt[idx_open + column_key.end(2):])
+    key_columns = [column] if column == 'timestamp' else [column, 'timestamp']
+    return append_create_definitions(
+        stmt, [f"primary key ({', '.join(key_columns)})"])
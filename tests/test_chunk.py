@@ -0,0 +1,56 @@
+import datetime
+import math
+import random
+
+import pytest
+
+from connector import chunk
+from connector.data_structure import DataPoint
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def as_tuples(points):
+    return [(pnt.timestamp, pnt.value) for pnt in points]
+
+
+@pytest.mark.parametrize('points', [
+    [DataPoint(TIME_START, 120.5)],
+    [DataPoint(TIME_START + datetime.timedelta(seconds=idx), 120.5)
+     for idx in range(100)],
+    # microseconds, negative values and a break marker of value None
+    [DataPoint(TIME_START, -0.0),
+     DataPoint(TIME_START + datetime.timedelta(microseconds=1), 1e-300),
+     DataPoint(TIME_START + datetime.timedelta(seconds=3), None),
+     DataPoint(TIME_START + datetime.timedelta(days=40), -1e300),
+     DataPoint(TIME_START + datetime.timedelta(days=40, seconds=1),
+               math.pi)],
+])
+def test_decode_encode(points):
+    assert as_tuples(chunk.decode(chunk.encode(points))) == as_tuples(points)
+
+
+def test_decode_encode_irregular():
+    random.seed(0)
+    timestamp, points = TIME_START, []
+    for _ in range(5000):
+        # delta of delta of every size, values repeated at times
+        timestamp += datetime.timedelta(
+            microseconds=random.choice([1, 1000, 10 ** 6, 3 * 10 ** 9])
+            * random.randint(1, 9))
+        value = (points[-1].value if points and random.random() < 0.3
+                 else round(random.gauss(120, 5), random.randint(0, 6)))
+        points.append(DataPoint(timestamp, value))
+
+    assert as_tuples(chunk.decode(chunk.encode(points))) == as_tuples(points)
+
+
+def test_points_in_range_keeps_closest_points_outside():
+    points = [DataPoint(TIME_START + datetime.timedelta(seconds=idx), idx)
+              for idx in range(0, 100, 10)]
+
+    selected = chunk.points_in_range(
+        points, TIME_START + datetime.timedelta(seconds=25),
+        TIME_START + datetime.timedelta(seconds=50))
+
+    assert [pnt.value for pnt in selected] == [20, 30, 40, 50]
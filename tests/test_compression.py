@@ -0,0 +1,130 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from connector.compression import Compression, aligned_rows
+from connector.data_structure import DataPoint
+
+TIME_START = datetime.datetime(2022, 6, 1)
+
+
+def signal(num_points: int, seed: int = 0):
+    """1-3 s apart, smooth and noisy parts in turn"""
+    rng = np.random.default_rng(seed)
+    timestamps = (np.datetime64(TIME_START, 'us')
+                  + np.cumsum(rng.integers(1, 4, num_points))
+                  * np.timedelta64(1, 's'))
+    noisy = (np.arange(num_points) // 300) % 2 == 1
+    values = np.where(noisy, rng.normal(0, 1, num_points),
+                      np.sin(np.arange(num_points) / 50))
+    return timestamps, np.round(values * 3, 1)
+
+
+def as_tuples(points):
+    return [(pnt.timestamp, pnt.value) for pnt in points]
+
+
+def state(comp: Compression) -> tuple:
+    return (as_tuples([comp.buffer.archieved_point,
+                       comp.buffer.snapshot_point]),
+            comp.slope_min, comp.slope_max, comp.time_steps)
+
+
+def insert_one_by_one(comp: Compression, timestamps, values):
+    saved_points = []
+    for timestamp, value in zip(timestamps.tolist(), values.tolist()):
+        save_point = comp.insert_checker(DataPoint(timestamp, value))
+        if save_point:
+            saved_points.append(save_point)
+    return saved_points
+
+
+@pytest.mark.parametrize('dev_margin', [0.1, 0.5, 2.0])
+@pytest.mark.parametrize('min_segment', [0, 10, 10 ** 9])
+def test_compress_array_same_as_insert_checker(monkeypatch, dev_margin,
+                                               min_segment):
+    # 0 never falls back to insert_checker, 10 ** 9 always does
+    monkeypatch.setattr(Compression, 'COMPRESS_MIN_SEGMENT', min_segment)
+    monkeypatch.setattr(Compression, 'COMPRESS_BLOCK', 100)
+    timestamps, values = signal(3000)
+
+    expected = Compression(dev_margin)
+    expected_points = insert_one_by_one(expected, timestamps, values)
+    comp = Compression(dev_margin)
+    saved_points = comp.compress_array(timestamps, values)
+
+    assert as_tuples(saved_points) == as_tuples(expected_points)
+    assert state(comp) == state(expected)
+
+
+def test_compress_array_continues_insert_checker():
+    timestamps, values = signal(2000, seed=1)
+    expected = Compression(0.5)
+    expected_points = insert_one_by_one(expected, timestamps, values)
+
+    comp = Compression(0.5)
+    saved_points = insert_one_by_one(comp, timestamps[:700], values[:700])
+    saved_points += comp.compress_array(timestamps[700:1500],
+                                        values[700:1500])
+    saved_points += insert_one_by_one(comp, timestamps[1500:],
+                                      values[1500:])
+
+    assert as_tuples(saved_points) == as_tuples(expected_points)
+    assert state(comp) == state(expected)
+
+
+def test_compress_array_rejects_unordered_timestamps():
+    timestamps = np.array(['2022-06-01T00:00:02', '2022-06-01T00:00:01'],
+                          dtype='datetime64[us]')
+    with pytest.raises(ValueError):
+        Compression(0.5).compress_array(timestamps, [1.0, 2.0])
+
+
+@pytest.mark.parametrize('time_range', [
+    (None, None),
+    (TIME_START + datetime.timedelta(seconds=500),
+     TIME_START + datetime.timedelta(seconds=3000)),
+    (TIME_START + datetime.timedelta(seconds=1000, milliseconds=500),
+     TIME_START + datetime.timedelta(seconds=1001)),
+])
+def test_select_many_array_same_as_select_many(time_range):
+    timestamps, values = signal(2000, seed=2)
+    comp = Compression(0.5)
+    archived_points = comp.compress_array(timestamps, values)
+
+    expected = list(comp._select_many(time_range, iter(archived_points)))
+    times, selected_values = comp._select_many_array(
+        time_range, iter(archived_points))
+
+    assert times.astype(datetime.datetime).tolist() == [
+        pnt.timestamp for pnt in expected]
+    np.testing.assert_allclose(
+        selected_values, [pnt.value for pnt in expected], rtol=1e-12)
+
+
+def test_aligned_rows_interpolates_every_series():
+    step = datetime.timedelta(seconds=10)
+    events = [
+        (TIME_START - step, 0, 0.0),
+        (TIME_START, 1, 5.0),
+        (TIME_START + 4 * step, 0, 40.0),
+        (TIME_START + 2 * step, 1, 5.0),
+        (TIME_START + 3 * step, 1, None),
+        (TIME_START + 5 * step, 1, 7.0),
+    ]
+    events.sort(key=lambda event: event[0])
+
+    rows = list(aligned_rows(TIME_START, TIME_START + 6 * step, step,
+                             events, 2))
+
+    assert rows == [
+        (TIME_START, 8.0, 5.0),
+        (TIME_START + step, 16.0, 5.0),
+        (TIME_START + 2 * step, 24.0, 5.0),
+        # series 1 has a break marker between 2 and 5 steps
+        (TIME_START + 3 * step, 32.0, None),
+        (TIME_START + 4 * step, 40.0, None),
+        (TIME_START + 5 * step, None, 7.0),
+        (TIME_START + 6 * step, None, None),
+    ]
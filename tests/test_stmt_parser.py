@@ -0,0 +1,112 @@
+import datetime
+
+import pytest
+
+from connector import stmt_parser
+
+
+def parse_insert(operation: str, params=None):
+    return stmt_parser.parse_insert(
+        stmt_parser.preprocessing(operation), params)
+
+
+def parse_select(operation: str, params=None):
+    return stmt_parser.parse_select(
+        stmt_parser.preprocessing(operation), params)
+
+
+def test_insert_literals():
+    template, rows = parse_insert(
+        "INSERT INTO Voltage (`timestamp`, value) VALUES "
+        "('2022-06-01 00:00:00', 120.5), ('2022-06-01 00:00:01.5', -1e3);")
+
+    assert template == stmt_parser.InsertTemplate(
+        'voltage', ('timestamp', 'value'))
+    assert rows == [('2022-06-01 00:00:00', '120.5'),
+                    ('2022-06-01 00:00:01.5', '-1e3')]
+
+
+def test_insert_params():
+    template, rows = parse_insert(
+        "INSERT INTO voltage VALUES (%s, %s), (%s, %s)", (1, 2.0, 3, 4.0))
+
+    assert template == stmt_parser.InsertTemplate('voltage', ())
+    assert rows == [(1, 2.0), (3, 4.0)]
+
+
+@pytest.mark.parametrize('operation, error', [
+    # the fields of every row are taken as (timestamp, value)
+    ("INSERT INTO v (value, timestamp) VALUES "
+     "(1, '2022-06-01 00:00:00')", NotImplementedError),
+    ("INSERT INTO v VALUES ('2022-06-01 00:00:00', 1), (now(), 2)",
+     ValueError),
+    ("INSERT INTO v VALUES ('2022-06-01 00:00:00', 1, 3)", ValueError),
+])
+def test_insert_unsupported(operation, error):
+    with pytest.raises(error):
+        parse_insert(operation)
+
+
+def test_select_range():
+    template, times = parse_select(
+        "SELECT timestamp, value FROM voltage "
+        "WHERE timestamp >= '2022-06-01 00:00:00' "
+        "AND timestamp <= '2022-06-01 01:00:00'")
+
+    assert (template.table_name, template.position_start,
+            template.position_end, template.is_select_one) == (
+                'voltage', 0, 1, False)
+    assert times == ['2022-06-01 00:00:00', '2022-06-01 01:00:00']
+
+
+def test_select_templates_shared_by_times():
+    stmt_parser.select_template.cache_clear()
+    for minute in range(10):
+        parse_select("SELECT timestamp, value FROM voltage "
+                     f"WHERE timestamp >= '2022-06-01 00:{minute:02}:00'")
+
+    cache_info = stmt_parser.select_template.cache_info()
+    assert (cache_info.misses, cache_info.hits) == (1, 9)
+
+
+@pytest.mark.parametrize('operation, params, expected', [
+    ("SELECT timestamp, value FROM voltage WHERE timestamp = %s", [1],
+     {'is_select_one': True, 'num_params': 1}),
+    ("SELECT avg(value), max(value) FROM voltage "
+     "WHERE timestamp BETWEEN %s AND %s", [1, 2],
+     {'aggregates': ('avg', 'max'), 'position_end': 1}),
+    ("SELECT timestamp, value FROM voltage "
+     "WHERE timestamp >= %s AND value > 250", [1],
+     {'value_conditions': (('>', None, 250.0), )}),
+    ("SELECT timestamp, value FROM voltage "
+     "WHERE timestamp >= %s STEP '10 seconds' minmax", [1],
+     {'step': datetime.timedelta(seconds=10), 'downsample_mode': 'minmax'}),
+    ("SELECT timestamp, value FROM voltage", None,
+     {'position_start': None, 'position_end': None}),
+])
+def test_select_template_fields(operation, params, expected):
+    template, _ = parse_select(operation, params)
+
+    assert {field: getattr(template, field)
+            for field in expected} == expected
+
+
+@pytest.mark.parametrize('operation', [
+    "SELECT timestamp, value FROM v WHERE timestamp >= %s OR value > 1",
+    "SELECT avg(value) FROM v WHERE timestamp >= %s STEP '10 seconds'",
+])
+def test_select_unsupported(operation):
+    with pytest.raises(NotImplementedError):
+        parse_select(operation, [1])
+
+
+def test_select_literals_and_params_not_mixed():
+    with pytest.raises(ValueError):
+        parse_select("SELECT timestamp, value FROM v "
+                     "WHERE timestamp >= '2022-06-01 00:00:00' "
+                     "AND timestamp <= %s", [1])
+
+
+@pytest.mark.parametrize('operation', ["USE `MyDb`", "use MyDb;"])
+def test_use_keeps_case(operation):
+    assert stmt_parser.parse_use(operation) == 'MyDb'